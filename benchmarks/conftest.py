@@ -0,0 +1,60 @@
+""" Fixtures for benchmarks against a local moto server """
+# pylint: disable=redefined-outer-name
+import copy
+import urllib.request
+
+import pytest
+
+from .fleet import FLEET_SPEC, Fleet, moto_server, seed
+
+
+DEFAULT_FLEETS = ("2x1x1x20", "4x2x3x20x4")
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--fleet",
+        action="append",
+        metavar=FLEET_SPEC,
+        help=f"Synthetic fleet to benchmark, may be repeated. Default {' '.join(DEFAULT_FLEETS)}",
+    )
+    parser.addoption("--rounds", type=int, default=3, help="Rounds per pipeline benchmark")
+
+
+def pytest_generate_tests(metafunc):
+    if "fleet" in metafunc.fixturenames:
+        specs = metafunc.config.getoption("fleet") or DEFAULT_FLEETS
+        metafunc.parametrize(
+            "fleet", list(map(Fleet.parse, specs)), ids=str, indirect=True, scope="session"
+        )
+
+
+@pytest.fixture(scope="session")
+def rounds(request):
+    return request.config.getoption("rounds")
+
+
+@pytest.fixture(scope="session")
+def moto_endpoint(tmp_path_factory):
+    with moto_server(tmp_path_factory.mktemp("aws")) as endpoint:
+        yield endpoint
+
+
+@pytest.fixture(scope="session")
+def fleet(request):
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def fleet_settings(fleet, moto_endpoint, tmp_path_factory):
+    """ Sweeper settings of a freshly seeded fleet """
+    urllib.request.urlopen(  # nosec
+        urllib.request.Request(f"{moto_endpoint}/moto-api/reset", method="POST")
+    ).close()
+    return seed(fleet, tmp_path_factory.mktemp(f"fleet-{fleet}"))
+
+
+@pytest.fixture()
+def settings(fleet_settings):
+    """ Copy of the fleet settings, c7n configs are created in place """
+    return copy.deepcopy(fleet_settings)
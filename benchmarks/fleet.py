@@ -0,0 +1,187 @@
+""" Synthetic fleets of accounts served by a local moto server """
+import contextlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, Sequence
+
+import boto3
+import yaml
+from moto.server import ThreadedMotoServer
+
+
+REGIONS = ("us-east-1", "us-west-2", "eu-west-1", "ap-southeast-2")
+# Policy name: (resource type, filters)
+# moto has its own snapshots in every account, seeded snapshots are tagged.
+POLICIES = {
+    "unattached": ("ebs", [{"State": "available"}]),
+    "stopped": ("ec2", [{"State.Name": "stopped"}]),
+    "snapshots": ("ebs-snapshot", [{"tag:broom": "present"}]),
+}
+ACCOUNT_ID_BASE = 100000000000
+FLEET_SPEC = "ACCOUNTSxREGIONSxPOLICIESxRESOURCES[xSKEW]"
+
+
+@dataclass(frozen=True)
+class Fleet:
+    """
+    accounts x regions x policies x resources per policy and region.
+    The first account has skew times the resources of the others.
+    """
+
+    accounts: int = 2
+    regions: int = 1
+    policies: int = 1
+    resources: int = 10
+    skew: float = 1.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Fleet":
+        """ From ACCOUNTSxREGIONSxPOLICIESxRESOURCES[xSKEW], e.g. 4x2x3x50 or 4x2x3x50x10 """
+        values = spec.lower().split("x")
+        if len(values) not in (4, 5):
+            raise ValueError(f"Invalid fleet {spec}, expected {FLEET_SPEC}")
+        fleet = cls(*map(int, values[:4]), *map(float, values[4:]))
+        if not 0 < fleet.regions <= len(REGIONS) or not 0 < fleet.policies <= len(POLICIES):
+            raise ValueError(
+                f"Invalid fleet {spec}, "
+                f"at most {len(REGIONS)} regions and {len(POLICIES)} policies"
+            )
+        return fleet
+
+    def __str__(self):
+        values = [self.accounts, self.regions, self.policies, self.resources]
+        if self.skew != 1:
+            values.append(f"{self.skew:g}")
+        return "x".join(map(str, values))
+
+    @property
+    def profiles(self) -> Dict[str, str]:
+        """ Profile name to account id """
+        return {f"account{idx_}": str(ACCOUNT_ID_BASE + idx_) for idx_ in range(self.accounts)}
+
+    @property
+    def region_names(self) -> Sequence[str]:
+        """ Regions in the fleet """
+        return REGIONS[: self.regions]
+
+    @property
+    def policy_names(self) -> Sequence[str]:
+        """ Policies in the fleet """
+        return tuple(POLICIES)[: self.policies]
+
+    def account_resources(self, idx: int) -> int:
+        """ Resources per policy and region of an account """
+        return int(self.resources * self.skew) if idx == 0 else self.resources
+
+    @property
+    def total_resources(self) -> int:
+        """ Resources matched by all policies across the fleet """
+        per_region = sum(map(self.account_resources, range(self.accounts)))
+        return per_region * self.regions * self.policies
+
+
+@contextlib.contextmanager
+def moto_server(path: Path) -> Iterator[str]:
+    """
+    Serve AWS from a local moto server.
+    Profiles assume a role into their own account so every account has its own resources.
+    Environment variables are inherited by worker processes.
+    """
+    server = ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint = f"http://{host}:{port}"
+    path.mkdir(parents=True, exist_ok=True)
+    path.joinpath("credentials").write_text(
+        "[moto]\naws_access_key_id = testing\naws_secret_access_key = testing\n"
+    )
+    environ = {
+        "AWS_ENDPOINT_URL": endpoint,
+        "AWS_CONFIG_FILE": str(path.joinpath("config")),
+        "AWS_SHARED_CREDENTIALS_FILE": str(path.joinpath("credentials")),
+    }
+    previous = {key_: os.environ.get(key_) for key_ in (*environ, "AWS_PROFILE")}
+    os.environ.update(environ)
+    os.environ.pop("AWS_PROFILE", None)
+    try:
+        yield endpoint
+    finally:
+        server.stop()
+        for key_, value_ in previous.items():
+            if value_ is None:
+                os.environ.pop(key_, None)
+            else:
+                os.environ[key_] = value_
+
+
+def _seed_region(session, region: str, policies: Sequence[str], count: int):
+    ec2 = session.client("ec2", region_name=region)
+    zone = f"{region}a"
+    if "unattached" in policies:
+        for _ in range(count):
+            ec2.create_volume(Size=8, AvailabilityZone=zone, VolumeType="gp2")
+    if "stopped" in policies:
+        image_id = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+        instances = ec2.run_instances(
+            ImageId=image_id, InstanceType="t3.micro", MinCount=count, MaxCount=count
+        )["Instances"]
+        ec2.stop_instances(InstanceIds=[instance_["InstanceId"] for instance_ in instances])
+    if "snapshots" in policies:
+        volume_id = ec2.create_volume(Size=8, AvailabilityZone=zone)["VolumeId"]
+        for _ in range(count):
+            ec2.create_snapshot(
+                VolumeId=volume_id,
+                TagSpecifications=[
+                    {"ResourceType": "snapshot", "Tags": [{"Key": "broom", "Value": "bench"}]}
+                ],
+            )
+        ec2.delete_volume(VolumeId=volume_id)
+
+
+def seed(fleet: Fleet, path: Path) -> Dict[str, Any]:
+    """
+    Create the fleet's profiles and resources, and policy files under path.
+    Returns Sweeper settings for the fleet.
+    """
+    Path(os.environ["AWS_CONFIG_FILE"]).write_text(
+        "".join(
+            f"[profile {profile_}]\nregion = us-east-1\n"
+            f"role_arn = arn:aws:iam::{account_id}:role/broom\nsource_profile = moto\n"
+            for profile_, account_id in fleet.profiles.items()
+        )
+    )
+    for idx_, profile_ in enumerate(fleet.profiles):
+        session = boto3.Session(profile_name=profile_)
+        for region_ in fleet.region_names:
+            _seed_region(session, region_, fleet.policy_names, fleet.account_resources(idx_))
+
+    policy_dir = path.joinpath("policies")
+    policy_dir.mkdir(exist_ok=True)
+    for name_ in fleet.policy_names:
+        resource_type, filters = POLICIES[name_]
+        policy_dir.joinpath(f"{name_}.yml").write_text(
+            yaml.safe_dump(
+                {"policies": [{"name": name_, "resource": resource_type, "filters": filters}]}
+            )
+        )
+
+    return {
+        "global": {
+            "policies": {"path": str(policy_dir), "include": list(fleet.policy_names)},
+            "c7n": {
+                "regions": list(fleet.region_names),
+                "cache_period": 0,
+                "output_dir": str(path.joinpath("c7n")),
+            },
+        },
+        "accounts": {
+            profile_: {"c7n": {"account_id": account_id}}
+            for profile_, account_id in fleet.profiles.items()
+        },
+        "broom": {
+            "auth_check": False,
+            "data_dir": str(path.joinpath("data", "query")),
+            "report_dir": str(path.joinpath("data", "reports")),
+        },
+    }
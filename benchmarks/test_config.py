@@ -0,0 +1,77 @@
+""" Time to resolve jobs from a config file of many accounts """
+# pylint: disable=missing-function-docstring,redefined-outer-name,protected-access
+import pytest
+import yaml
+
+import c7n_broom
+from c7n_broom.config.create import c7nconfigs, policies
+
+
+ACCOUNTS = 500
+POLICIES = 10
+RESOURCE_TYPES = ("ebs", "ebs-snapshot", "ami", "ec2", "rds-snapshot")
+
+
+@pytest.fixture(scope="module")
+def config_path(tmp_path_factory):
+    """
+    Accounts mostly inheriting the global policies,
+    every 25th includes an extra policy and every 50th excludes one
+    """
+    path = tmp_path_factory.mktemp("config")
+    policy_path = path.joinpath("policies")
+    policy_path.mkdir()
+    names = [f"policy{idx_}" for idx_ in range(POLICIES)]
+    for idx_, name_ in enumerate(names):
+        policy = {"name": name_, "resource": RESOURCE_TYPES[idx_ % len(RESOURCE_TYPES)]}
+        policy_path.joinpath(f"{name_}.yml").write_text(yaml.safe_dump({"policies": [policy]}))
+
+    accounts = dict()
+    for idx_ in range(ACCOUNTS):
+        accounts[f"account{idx_}"] = None
+        if idx_ % 50 == 0:
+            accounts[f"account{idx_}"] = {"policies": {"exclude": [names[0]]}}
+        elif idx_ % 25 == 0:
+            accounts[f"account{idx_}"] = {
+                "policies": {"include": [names[-1]]},
+                "c7n": {"regions": ["us-east-1"]},
+            }
+    config = {
+        "global": {
+            "policies": {"include": names[:-1], "exclude": [names[1]], "path": str(policy_path)},
+            "c7n": {"regions": ["us-east-1", "us-west-2"]},
+        },
+        "accounts": accounts,
+    }
+    path.joinpath("config.yaml").write_text(yaml.safe_dump(config))
+    return path
+
+
+def _clear_caches():
+    c7n_broom.config.main._read_config.cache_clear()
+    c7n_broom.config.main._read_policy_resources.cache_clear()
+    policies._merge_policies.cache_clear()
+    policies._policy_paths.cache_clear()
+
+
+def _jobs(config_path):
+    config = c7n_broom.config.get_config("config", path=config_path)
+    return list(c7nconfigs(config, skip_auth_check=True, lookup_account_id=False))
+
+
+@pytest.mark.parametrize("caches", ["cold", "warm"])
+def test_c7nconfigs(benchmark, config_path, caches):
+    """
+    cold: first Sweeper of a process, config and policy files are read
+    warm: later Sweepers of the same config
+    """
+    if caches == "cold":
+        jobs = benchmark.pedantic(
+            _jobs, args=(config_path,), setup=_clear_caches, rounds=5, iterations=1
+        )
+    else:
+        _jobs(config_path)
+        jobs = benchmark(_jobs, config_path)
+    # 8 policies each, the extra policies of every 25th account offset the exclusions
+    assert len(jobs) == ACCOUNTS * 8
+    assert {job_.resource_type for job_ in jobs} == set(RESOURCE_TYPES)
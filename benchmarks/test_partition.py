@@ -0,0 +1,96 @@
+""" Simulated makespan of account batching against sharded partitioning """
+# pylint: disable=missing-function-docstring
+import heapq
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from c7n_broom import partition
+from c7n_broom.actions.report import datafile_path
+
+
+WORKERS = 8
+# Seconds to dispatch a task to a worker process
+DISPATCH_OVERHEAD = 1.0
+RESOURCE_TYPES = ("ebs", "ebs-snapshot", "ami", "ec2", "rds-snapshot")
+# Bytes of query data per job of an account with a scale of 1
+DATA_SIZE = 20 * 1024 * 1024
+
+
+def _fleet(accounts=40, seed=0):
+    """ Mostly small accounts, a few medium ones and one 10x account """
+    rng = random.Random(seed)
+    jobs, actual = list(), dict()
+    for idx_ in range(accounts):
+        scale = 10.0 if idx_ == 0 else (3.0 if idx_ % 10 == 0 else rng.uniform(0.2, 1.0))
+        for resource_type in RESOURCE_TYPES:
+            job = SimpleNamespace(
+                get_str=f"account{idx_}:{resource_type}",
+                profile=f"account{idx_}",
+                configs=(f"{resource_type}.yml",),
+                account_id=str(idx_),
+                resource_type=resource_type,
+                regions={"us-east-1", "us-west-2"},
+            )
+            jobs.append(job)
+            actual[job.get_str] = partition.heuristic_cost(job) * scale
+    return jobs, actual
+
+
+def _previous_data(jobs, actual, data_path):
+    """ Sparse query data files sized in proportion to the resources of each job """
+    for job_ in jobs:
+        scale = actual[job_.get_str] / partition.heuristic_cost(job_)
+        with datafile_path(job_, data_path).open(mode="wb") as file_:
+            file_.truncate(int(DATA_SIZE * scale))
+
+
+def _list_schedule(tasks, workers):
+    """ Makespan of tasks run in order on the first free worker """
+    free = [0.0] * workers
+    for task in tasks:
+        heapq.heappush(free, heapq.heappop(free) + DISPATCH_OVERHEAD + task)
+    return max(free)
+
+
+def _account_batches(jobs, actual):
+    return [
+        sum(actual[job_.get_str] for job_ in jobs_)
+        for jobs_ in partition.by_account(jobs).values()
+    ]
+
+
+def _shards(jobs, actual, cost):
+    return [
+        sum(actual[job_.get_str] for job_ in shard_)
+        for shard_ in partition.partition(jobs, WORKERS, cost=cost)
+    ]
+
+
+@pytest.mark.parametrize("estimate", ["history", "data_size", "cold"])
+def test_makespan(benchmark, tmp_path, estimate):
+    """
+    history: durations recorded by previous runs
+    data_size: no durations, previous query data sizes
+    cold: no durations or data, resource type heuristics only
+    """
+    jobs, actual = _fleet()
+    if estimate == "history":
+        cost = lambda job_: actual[job_.get_str]  # pylint: disable=unnecessary-lambda-assignment
+    else:
+        if estimate == "data_size":
+            _previous_data(jobs, actual, tmp_path)
+        cost = partition.JobStats(tmp_path.joinpath("stats.json"), data_path=tmp_path).estimate
+
+    baseline = _list_schedule(_account_batches(jobs, actual), WORKERS)
+    sharded = _list_schedule(benchmark(_shards, jobs, actual, cost), WORKERS)
+
+    benchmark.extra_info["baseline_makespan"] = baseline
+    benchmark.extra_info["sharded_makespan"] = sharded
+    benchmark.extra_info["speedup"] = baseline / sharded
+    if estimate == "cold":
+        # Without any history the skew is unknown, sharding should not be worse
+        assert sharded <= baseline * 1.1
+    else:
+        assert sharded < baseline
@@ -0,0 +1,90 @@
+""" Query, report and counts of synthetic fleets against a local moto server """
+# pylint: disable=missing-function-docstring,redefined-outer-name
+import copy
+import resource
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from c7n_broom import Sweeper
+
+
+def _peak_memory(func, *args, **kwargs):
+    """
+    Peak Python allocations of this process while running func,
+    and the high-water mark of resident set size of this or any worker process so far.
+    The moto server runs in this process.
+    """
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # Kilobytes on Linux
+    maxrss = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return {"peak_traced_mib": peak / 2 ** 20, "max_rss_mib": maxrss / 2 ** 10}
+
+
+def _record(benchmark, fleet, func, *args, **kwargs):
+    """ Add throughput and peak memory of an extra, untimed, run of func """
+    benchmark.extra_info["fleet"] = str(fleet)
+    benchmark.extra_info["resources"] = fleet.total_resources
+    benchmark.extra_info["resources_per_second"] = (
+        fleet.total_resources / benchmark.stats.stats.mean
+    )
+    benchmark.extra_info.update(_peak_memory(func, *args, **kwargs))
+
+
+def _data_bytes(settings):
+    return sum(
+        path_.stat().st_size for path_ in Path(settings["broom"]["data_dir"]).glob("*.json")
+    )
+
+
+@pytest.fixture(scope="session")
+def queried_settings(fleet_settings):
+    """ Fleet settings with query data """
+    Sweeper(settings=copy.deepcopy(fleet_settings)).query()
+    return fleet_settings
+
+
+def _pipeline(settings):
+    sweeper = Sweeper(settings=settings)
+    sweeper.query()
+    sweeper.gen_reports()
+    return sweeper.counts()
+
+
+def test_pipeline(benchmark, fleet, settings, rounds):
+    counts = benchmark.pedantic(_pipeline, args=(settings,), rounds=rounds, iterations=1)
+    assert sum(counts.values()) == fleet.total_resources
+    _record(benchmark, fleet, _pipeline, settings)
+
+
+@pytest.mark.parametrize("narrowed", [False, True], ids=["full", "narrowed"])
+def test_query(benchmark, fleet, settings, rounds, narrowed):
+    """ narrowed: policy filters pushed down to describe calls and data projected """
+    sweeper = Sweeper(settings=settings, pushdown=narrowed, projection=narrowed)
+    benchmark.pedantic(sweeper.query, rounds=rounds, iterations=1)
+    assert sum(sweeper.counts().values()) == fleet.total_resources
+    benchmark.extra_info["data_bytes"] = _data_bytes(settings)
+    _record(benchmark, fleet, sweeper.query)
+
+
+def test_report(benchmark, fleet, queried_settings):
+    sweeper = Sweeper(settings=copy.deepcopy(queried_settings), offline=True)
+    reports = benchmark(sweeper.gen_reports)
+    assert len(reports) == fleet.accounts * fleet.policies
+    _record(benchmark, fleet, sweeper.gen_reports)
+
+
+def test_counts(benchmark, fleet, queried_settings):
+    sweeper = Sweeper(settings=copy.deepcopy(queried_settings), offline=True)
+    benchmark(sweeper.counts, grouped=True)
+    assert sum(sweeper.counts().values()) == fleet.total_resources
+    _record(benchmark, fleet, sweeper.counts, grouped=True)
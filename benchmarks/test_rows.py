@@ -0,0 +1,95 @@
+""" Memory and time of compact rows against dicts of query data """
+# pylint: disable=missing-function-docstring,redefined-outer-name
+import gc
+import json
+import random
+import tracemalloc
+from types import SimpleNamespace
+
+import jmespath
+import pytest
+
+from c7n_broom.actions.report import datafile_path, get_data_map, normalize_row
+from c7n_broom.data import count
+from c7n_broom.resource_keys import registry
+
+
+RESOURCES = 100_000
+JOB = SimpleNamespace(profile="prod", configs=("unattached.yml",), resource_type="ebs")
+REGIONS = ("us-east-1", "us-west-2", "eu-west-1")
+OWNERS = ("alice", "bob", "carol", "dave")
+
+
+@pytest.fixture(scope="module")
+def data_path(tmp_path_factory):
+    """ Query data of unattached volumes """
+    rng = random.Random(0)
+    path = tmp_path_factory.mktemp("rows")
+    volumes = [
+        {
+            "VolumeId": f"vol-{idx_:017x}",
+            "VolumeType": rng.choice(("gp2", "gp3", "io1")),
+            "Size": rng.randint(1, 1000),
+            "CreateTime": f"2020-{rng.randint(1, 12):02}-{rng.randint(1, 28):02}T00:00:00+00:00",
+            "State": "available",
+            "Attachments": [],
+            "region": rng.choice(REGIONS),
+            "Tags": [
+                {"Key": "Owner", "Value": rng.choice(OWNERS)},
+                {"Key": "Environment", "Value": "production"},
+                {"Key": "CostCenter", "Value": str(rng.randint(1, 10))},
+            ],
+        }
+        for idx_ in range(RESOURCES)
+    ]
+    datafile_path(JOB, path).write_text(json.dumps(volumes, indent=2))
+    return path
+
+
+def _dict_rows(c7n_config, data_path):
+    """ Dicts with a tags dict per resource, as get_data_map returned before compact rows """
+    resource_key = registry()["ebs"]
+    expression = jmespath.compile(f"[].{{{resource_key.data}}}")
+    rawdata = expression.search(json.loads(datafile_path(c7n_config, data_path).read_bytes()))
+    for item in rawdata:
+        normalize_row(item)
+    return sorted(rawdata, key=lambda item_: item_["date"])
+
+
+LOADERS = {"dict": _dict_rows, "row": get_data_map}
+
+
+def _memory(loader, data_path):
+    """ Memory held by the rows, and peak memory while loading them """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        rows = loader(JOB, data_path)
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(rows), held, peak
+
+
+@pytest.mark.parametrize("representation", list(LOADERS))
+def test_load(benchmark, data_path, representation):
+    rows = benchmark.pedantic(LOADERS[representation], args=(JOB, data_path), rounds=3)
+    assert len(rows) == RESOURCES
+    _, held, peak = _memory(LOADERS[representation], data_path)
+    benchmark.extra_info["held_mib"] = held / 2 ** 20
+    benchmark.extra_info["peak_mib"] = peak / 2 ** 20
+    benchmark.extra_info["bytes_per_row"] = held / RESOURCES
+
+
+@pytest.mark.parametrize("representation", list(LOADERS))
+def test_count(benchmark, data_path, representation):
+    rows = LOADERS[representation](JOB, data_path)
+    counts = benchmark(count, rows)
+    assert sum(map(sum, map(dict.values, counts.values()))) == RESOURCES
+
+
+def test_memory(data_path):
+    """ Compact rows hold less than half the memory of dicts """
+    _, dict_held, _ = _memory(_dict_rows, data_path)
+    _, row_held, _ = _memory(get_data_map, data_path)
+    assert row_held < dict_held / 2
@@ -1,21 +1,69 @@
 """ c7n Broom top level """
+import importlib as _importlib
 import logging as _logging
+from typing import TYPE_CHECKING as _TYPE_CHECKING
 
-import pkg_resources
 
-from c7n_broom.config import C7nCfg
-from c7n_broom.main import Sweeper
+if _TYPE_CHECKING:  # pragma: no cover
+    from c7n_broom.config import C7nCfg
+    from c7n_broom.main import Sweeper
 
-from . import actions, config, data
+__all__ = ["C7nCfg", "Sweeper"]
 
+# Loaded on first access, so importing c7n_broom does not import c7n, boto or vyper.
+_LAZY_ATTRS = {
+    "C7nCfg": "c7n_broom.config",
+    "Sweeper": "c7n_broom.main",
+}
+_LAZY_MODULES = frozenset(
+    (
+        "actions",
+        "cli",
+        "config",
+        "dashboard",
+        "data",
+        "history",
+        "index",
+        "main",
+        "metrics",
+        "partition",
+        "resource_keys",
+        "rows",
+        "sessions",
+        "storage",
+        "util",
+    )
+)
 
-try:
-    __version__ = pkg_resources.get_distribution(__name__).version
-except pkg_resources.DistributionNotFound:
-    __version__ = ""
 
+def _get_version() -> str:
+    try:
+        from importlib import metadata  # pylint: disable=import-outside-toplevel
+    except ImportError:  # Python 3.7
+        import importlib_metadata as metadata  # pylint: disable=import-outside-toplevel
+
+    try:
+        return metadata.version(__name__)
+    except metadata.PackageNotFoundError:
+        return ""
+
+
+def __getattr__(name: str):
+    if name == "__version__":
+        value = _get_version()
+    elif name in _LAZY_ATTRS:
+        value = getattr(_importlib.import_module(_LAZY_ATTRS[name]), name)
+    elif name in _LAZY_MODULES:
+        value = _importlib.import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()).union(_LAZY_ATTRS, _LAZY_MODULES, ("__version__",)))
 
-__all__ = ["C7nCfg", "Sweeper"]
 
 _logging.getLogger(__name__).addHandler(_logging.NullHandler())
 _logging.getLogger("custodian").setLevel(_logging.INFO)
@@ -0,0 +1,7 @@
+""" Run c7n_broom as a module """
+import sys
+
+from c7n_broom.cli import main
+
+
+sys.exit(main())
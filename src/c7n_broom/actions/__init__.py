@@ -1,4 +1,5 @@
 """ c7n_broom.actions """
 
-from .main import execute, query
+from .diff import write as write_diff
+from .main import execute, execute_reviewed, query
 from .report import write as write_report
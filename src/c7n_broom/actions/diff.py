@@ -0,0 +1,123 @@
+""" Compare query data between runs """
+import dataclasses
+import hashlib
+import json
+import logging
+from os import PathLike
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from c7n_broom.actions.helper import account_profile_policy_str
+from c7n_broom.actions.report import (
+    FileFormat,
+    _get_resourcekey,
+    datafile_path,
+    normalize_row,
+)
+from c7n_broom.resource_keys import compile_key
+from c7n_broom.storage import atomic_write_text, iter_records
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass()
+class JobDiff:
+    """ Resources added, removed and changed between two runs of a job """
+
+    added: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+    removed: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+    changed: List[Dict[str, Any]] = dataclasses.field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """ Returns all rows with the kind of change as the first column """
+        for change_, rows_ in dataclasses.asdict(self).items():
+            for row_ in rows_:
+                yield dict(change=change_, **row_)
+
+
+def _projector(c7n_config) -> Callable[[Any], Dict[str, Any]]:
+    """ Returns a function projecting a raw resource to the fields of its resource key """
+    expression = compile_key(_get_resourcekey(c7n_config.resource_type)).item
+    return lambda item_: normalize_row(expression.search(item_))
+
+
+def _digest(row: Dict[str, Any]) -> bytes:
+    return hashlib.blake2b(
+        json.dumps(row, sort_keys=True, default=str).encode(), digest_size=16
+    ).digest()
+
+
+def _hashed_rows(datafile: Path, project) -> Iterator[Tuple[str, bytes, Dict[str, Any]]]:
+    if not datafile.is_file():
+        _LOGGER.warning("File not found %s", datafile)
+        return
+    for _, item_ in iter_records(datafile):
+        row_ = project(item_)
+        yield str(row_["id"]), _digest(row_), row_
+
+
+def diff(c7n_config, base_path: PathLike, head_path: PathLike) -> JobDiff:
+    """
+    Compare the query data of a job between two data directories.
+    Only resource ids and digests of the base run are held in memory.
+    """
+    project = _projector(c7n_config)
+    base_file = datafile_path(c7n_config, base_path)
+    head_file = datafile_path(c7n_config, head_path)
+
+    base = {id_: digest_ for id_, digest_, _ in _hashed_rows(base_file, project)}
+    rtn = JobDiff()
+    for id_, digest_, row_ in _hashed_rows(head_file, project):
+        base_digest = base.pop(id_, None)
+        if base_digest is None:
+            rtn.added.append(row_)
+        elif base_digest != digest_:
+            rtn.changed.append(row_)
+
+    if base:
+        rtn.removed.extend(
+            row_ for id_, _, row_ in _hashed_rows(base_file, project) if id_ in base
+        )
+    _LOGGER.debug(
+        "%s: %s added, %s removed, %s changed",
+        c7n_config.get_str,
+        len(rtn.added),
+        len(rtn.removed),
+        len(rtn.changed),
+    )
+    return rtn
+
+
+def write(
+    c7n_config,
+    base_path: PathLike,
+    head_path: PathLike,
+    fmt: str = "md",
+    output_path: PathLike = "reports",
+) -> Optional[PathLike]:
+    """ Write a report of only the changes between two runs of a job """
+    job_diff = diff(c7n_config, base_path, head_path)
+    reportfile = Path(output_path).joinpath(
+        f"{account_profile_policy_str(c7n_config)}.diff.{fmt}"
+    )
+    if not job_diff:
+        _LOGGER.debug("No changes to write %s", reportfile)
+        return None
+
+    if fmt == "json":
+        content = json.dumps(dataclasses.asdict(job_diff), indent=2, default=str)
+    else:
+        from tabulate import tabulate  # pylint: disable=import-outside-toplevel
+
+        content = tabulate(
+            list(job_diff.rows()),
+            headers="keys",
+            showindex=True,
+            tablefmt=getattr(FileFormat, fmt),
+        )
+    atomic_write_text(reportfile, content)
+    return reportfile
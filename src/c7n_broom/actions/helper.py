@@ -2,15 +2,15 @@
 from pathlib import Path
 
 
+def policy_str(c7n_config):
+    """ Returns a string of the policy names for the c7n_config. """
+    return ", ".join(map(lambda policy: Path(policy).stem, c7n_config.configs))
+
+
 def account_profile_policy_str(c7n_config):
     """
     Returns a string for the c7n_config.
     Used for creating files names.
     """
-    profile_policies_str = ":".join(
-        [
-            c7n_config.profile,
-            ", ".join(map(lambda policy: Path(policy).stem, c7n_config.configs)),
-        ]
-    )
+    profile_policies_str = ":".join([c7n_config.profile, policy_str(c7n_config)])
     return profile_policies_str
@@ -1,14 +1,20 @@
 """ main package for c7n_broom.actions """
 import json
 import logging
+import tempfile
+from collections import defaultdict
+from functools import partial
 from os import PathLike
 from pathlib import Path
-from typing import Any, Dict, Iterator, Optional
-
-import c7n.commands
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
+from c7n_broom import sessions
+from c7n_broom.actions import ratelimit
 from c7n_broom.actions.helper import account_profile_policy_str
+from c7n_broom.actions.pushdown import POLICY_DIR, pushdown_config
+from c7n_broom.actions.report import iter_project
 from c7n_broom.config import C7nCfg
+from c7n_broom.storage import atomic_open, file_lock, iter_records, resolve_data_dir
 
 
 _LOGGING = logging.getLogger(__name__)
@@ -21,6 +27,10 @@ def run(
     telemetry_disabled: bool = True,
     report_minutes=5,
     regions_override: Optional[Iterator] = None,
+    lock: bool = False,
+    pushdown: bool = False,
+    projection: bool = False,
+    quiet: bool = False,
 ):  # pylint: disable = too-many-arguments
     """
 
@@ -28,15 +38,23 @@ def run(
     telemetry_disabled Sometimes we just want to query w/ sending data
     report_minutes:
     regions_override: For debugging
+    lock: Hold a lock on the data file while writing it
+    pushdown: Narrow describe calls with query filters derived from the policy filters
+    projection: Only write the fields of resources used in reports to the data file
+    quiet: Do not print when starting and completing, for live progress
 
     """
-    MINUTES_IN_DAY = 1440  # pylint: disable=invalid-name
+    import c7n.commands  # pylint: disable=import-outside-toplevel
+
     profile_policies_str = account_profile_policy_str(c7n_config)
 
     Path(data_dir).mkdir(parents=True, exist_ok=True)
+    if pushdown:
+        c7n_config = pushdown_config(c7n_config, Path(data_dir).joinpath(POLICY_DIR))
 
     _LOGGING.info("STARTING %s", profile_policies_str)
-    print(f"STARTING: {profile_policies_str}")
+    if not quiet:
+        print(f"STARTING: {profile_policies_str}")
 
     c7n_config.dryrun = dryrun
     c7n_config.no_default_fields = True
@@ -48,28 +66,70 @@ def run(
 
     c7n.commands.run(c7n_config.c7n)  # pylint: disable=no-value-for-parameter
 
-    report_settings = c7n_config.c7n
-    report_settings.days = report_minutes / MINUTES_IN_DAY
     datafile = Path(data_dir).joinpath(profile_policies_str).with_suffix(".json")
-    with datafile.open(mode="wt") as data_fd:
-        report_settings.raw = data_fd
-        c7n.commands.report(report_settings)  # pylint: disable=no-value-for-parameter
+    _write_data(c7n_config, datafile, report_minutes, lock=lock, projection=projection)
 
-    print(f"COMPLETED: {profile_policies_str}")
+    if not quiet:
+        print(f"COMPLETED: {profile_policies_str}")
     _LOGGING.info("COMPLETED %s", profile_policies_str)
     _LOGGING.debug("Data file writen %s", datafile)
 
     return datafile
 
 
+def _write_data(c7n_config: C7nCfg, datafile: Path, report_minutes, lock: bool, projection: bool):
+    """
+    Write the resources of the last run of c7n_config to datafile.
+    Projected resources are read back from c7n's report one at a time, so they are never all
+    held as JSON text in memory.
+    """
+    import c7n.commands  # pylint: disable=import-outside-toplevel
+
+    MINUTES_IN_DAY = 1440  # pylint: disable=invalid-name
+    report_settings = c7n_config.c7n
+    report_settings.days = report_minutes / MINUTES_IN_DAY
+    with file_lock(datafile, enabled=lock), atomic_open(datafile, mode="wt") as data_fd:
+        if not projection:
+            report_settings.raw = data_fd
+            c7n.commands.report(report_settings)  # pylint: disable=no-value-for-parameter
+            return
+        with tempfile.TemporaryDirectory(prefix=".raw", dir=datafile.parent) as tmp_dir:
+            raw_file = Path(tmp_dir).joinpath(datafile.name)
+            with raw_file.open(mode="wt") as raw_fd:
+                report_settings.raw = raw_fd
+                c7n.commands.report(report_settings)  # pylint: disable=no-value-for-parameter
+            resources = (item_ for _, item_ in iter_records(raw_file))
+            _dump_records(iter_project(c7n_config, resources), data_fd)
+
+
+def _dump_records(records: Iterable[Any], data_fd):
+    """ Write records as a JSON array, one at a time """
+    data_fd.write("[")
+    for idx_, record_ in enumerate(records):
+        data_fd.write(",\n" if idx_ else "\n")
+        json.dump(record_, data_fd, indent=2)
+    data_fd.write("\n]")
+
+
 def query(
     c7n_config: C7nCfg,
     data_dir: PathLike = Path("data").joinpath("query"),
     telemetry_disabled: bool = True,
-):
+    lock: bool = False,
+    pushdown: bool = False,
+    projection: bool = False,
+    quiet: bool = False,
+):  # pylint: disable = too-many-arguments
     """ Run without actions. Dryrun true. """
     run(
-        c7n_config, data_dir=data_dir, telemetry_disabled=telemetry_disabled, dryrun=True,
+        c7n_config,
+        data_dir=data_dir,
+        telemetry_disabled=telemetry_disabled,
+        dryrun=True,
+        lock=lock,
+        pushdown=pushdown,
+        projection=projection,
+        quiet=quiet,
     )
 
 
@@ -77,13 +137,147 @@ def execute(
     c7n_config: C7nCfg,
     data_dir: PathLike = Path("data").joinpath("query"),
     telemetry_disabled: bool = True,
-):
-    """ Run actions. Dryrun false. """
+    lock: bool = False,
+    pushdown: bool = False,
+    projection: bool = False,
+    rate: Optional[float] = None,
+    burst: Optional[int] = None,
+    quiet: bool = False,
+):  # pylint: disable = too-many-arguments
+    """
+    Run actions. Dryrun false.
+    Mutating calls are limited to rate per second per account and region, in bursts of burst,
+    and the outcome of each is appended to outcomes.jsonl in data_dir.
+    """
+    Path(data_dir).mkdir(parents=True, exist_ok=True)
+    ratelimit.install(
+        rate=rate, burst=burst, outcomes=Path(data_dir).joinpath(ratelimit.OUTCOMES_FILE)
+    )
+    sessions.set_account(c7n_config.profile, str(c7n_config.account_id or c7n_config.profile))
     run(
-        c7n_config, data_dir=data_dir, telemetry_disabled=telemetry_disabled, dryrun=False,
+        c7n_config,
+        data_dir=data_dir,
+        telemetry_disabled=telemetry_disabled,
+        dryrun=False,
+        lock=lock,
+        pushdown=pushdown,
+        projection=projection,
+        quiet=quiet,
     )
 
 
+def _reviewed_resources(manager, ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Returns the current state of the resources with ids.
+    Resources which no longer exist are dropped.
+    """
+    from botocore.exceptions import ClientError  # pylint: disable=import-outside-toplevel
+
+    if not ids:
+        return list()
+    try:
+        resources = manager.get_resources(ids)
+    except (ClientError, ValueError):
+        resources = list()
+    if resources or len(ids) == 1:
+        if len(resources) < len(ids):
+            _LOGGING.info("Skipping %s resources, not found", len(ids) - len(resources))
+        return resources
+    # c7n returns no resources when describing several ids fails because one does not exist
+    _LOGGING.debug("Describing %s resources in halves", len(ids))
+    half = len(ids) // 2
+    return _reviewed_resources(manager, ids[:half]) + _reviewed_resources(manager, ids[half:])
+
+
+def _act_on_reviewed(targets, revalidate: bool, options, policies):
+    """ Runs the actions of policies on the target resources of their name and region """
+    from c7n.utils import dumps  # pylint: disable=import-outside-toplevel
+
+    for policy_ in policies:
+        reviewed = targets.get((policy_.name, policy_.options.region))
+        if not reviewed or not policy_.is_runnable():
+            continue
+        manager = policy_.resource_manager
+        id_key = manager.resource_type.id
+        ids = [item_[id_key] for item_ in reviewed if item_.get(id_key)]
+        if len(ids) < len(reviewed):
+            _LOGGING.warning(
+                "%s of %s reviewed resources of %s have no %s",
+                len(reviewed) - len(ids),
+                len(reviewed),
+                policy_.name,
+                id_key,
+            )
+        with policy_.ctx as ctx:
+            resources = _reviewed_resources(manager, ids)
+            if revalidate:
+                resources = manager.filter_resources(resources)
+            _LOGGING.info(
+                "policy:%s region:%s reviewed:%s acting on:%s",
+                policy_.name,
+                policy_.options.region,
+                len(reviewed),
+                len(resources),
+            )
+            ctx.output.write_file("resources.json", dumps(resources, indent=2))
+            if not resources or options.dryrun:
+                continue
+            for action_ in manager.actions:
+                results = action_.process(resources)
+                if results:
+                    ctx.output.write_file(f"action-{action_.name}", dumps(results))
+
+
+def execute_reviewed(
+    c7n_config: C7nCfg,
+    data_dir: PathLike = Path("data").joinpath("query"),
+    telemetry_disabled: bool = True,
+    revalidate: bool = False,
+    rate: Optional[float] = None,
+    burst: Optional[int] = None,
+    quiet: bool = False,
+):  # pylint: disable = too-many-arguments
+    """
+    Run actions on the resources in the query data of c7n_config only. Dryrun false.
+    Policies only describe those resources again, by id, and only in their regions.
+    revalidate: Also apply the filters of the policies, skipping resources which no longer match.
+    rate, burst: See execute.
+    quiet: See run.
+    Outcomes are appended to outcomes.jsonl in data_dir.
+    """
+    from c7n.commands import policy_command  # pylint: disable=import-outside-toplevel
+
+    profile_policies_str = account_profile_policy_str(c7n_config)
+    datafile = Path(data_dir).joinpath(profile_policies_str).with_suffix(".json")
+    targets = defaultdict(list)
+    if datafile.is_file():
+        for _, item_ in iter_records(datafile):
+            targets[(item_.get("policy"), item_.get("region"))].append(item_)
+    if not targets:
+        _LOGGING.info("No reviewed resources %s", profile_policies_str)
+        return None
+
+    ratelimit.install(
+        rate=rate, burst=burst, outcomes=Path(data_dir).joinpath(ratelimit.OUTCOMES_FILE)
+    )
+    sessions.set_account(c7n_config.profile, str(c7n_config.account_id or c7n_config.profile))
+
+    _LOGGING.info("STARTING %s", profile_policies_str)
+    if not quiet:
+        print(f"STARTING: {profile_policies_str}")
+    options = c7n_config.c7n
+    options.dryrun = False
+    options.regions = sorted({region_ for _, region_ in targets if region_})
+    if telemetry_disabled:
+        options.metrics = None
+        options.metrics_enabled = False
+    policy_command(partial(_act_on_reviewed, targets, revalidate))(options)
+    if not quiet:
+        print(f"COMPLETED: {profile_policies_str}")
+    _LOGGING.info("COMPLETED %s", profile_policies_str)
+    return datafile
+
+
 def read_data(
     c7n_config: C7nCfg, data_dir: PathLike = Path("data").joinpath("query"),
 ) -> Optional[Dict[str, Any]]:
@@ -91,5 +285,5 @@ def read_data(
         Return data from query data.
         Return None if data dne
         """
-    datafile = Path(data_dir).joinpath(c7n_config.get_str).with_suffix(".json")
+    datafile = resolve_data_dir(data_dir).joinpath(c7n_config.get_str).with_suffix(".json")
     return json.loads(datafile.read_bytes())
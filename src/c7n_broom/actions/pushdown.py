@@ -0,0 +1,180 @@
+""" Push policy filters down to the describe calls of c7n as query filters """
+import copy
+import importlib
+import logging
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from c7n_broom.config import C7nCfg
+from c7n_broom.storage import atomic_write_text
+
+
+_LOGGER = logging.getLogger(__name__)
+
+POLICY_DIR = "policies"
+
+# Resource attribute to API filter name, for resources which accept query filters.
+# Only attributes compared exactly by both c7n and the API are listed.
+SERVER_FILTERS = {
+    "ami": {
+        "Architecture": "architecture",
+        "ImageId": "image-id",
+        "Name": "name",
+        "OwnerId": "owner-id",
+        "Public": "is-public",
+        "State": "state",
+    },
+    "ebs": {
+        "AvailabilityZone": "availability-zone",
+        "Encrypted": "encrypted",
+        "SnapshotId": "snapshot-id",
+        "State": "status",
+        "VolumeId": "volume-id",
+        "VolumeType": "volume-type",
+    },
+    "ebs-snapshot": {
+        "Description": "description",
+        "OwnerId": "owner-id",
+        "SnapshotId": "snapshot-id",
+        "State": "status",
+        "VolumeId": "volume-id",
+        "VolumeSize": "volume-size",
+    },
+    "ec2": {
+        "ImageId": "image-id",
+        "InstanceId": "instance-id",
+        "InstanceType": "instance-type",
+        "Placement.AvailabilityZone": "availability-zone",
+        "State.Name": "instance-state-name",
+        "VpcId": "vpc-id",
+    },
+}
+# c7n parsers validating query filters per resource type
+QUERY_PARSERS = {
+    "ebs": "c7n.resources.ebs.VolumeQueryParser",
+    "ebs-snapshot": "c7n.resources.ebs.SnapshotQueryParser",
+    "ec2": "c7n.resources.ec2.EC2QueryParser",
+}
+# Values matching absence or emptiness, which API filters cannot express
+_SENTINELS = frozenset(("absent", "empty", "not-null"))
+
+
+def _api_value(value) -> Optional[str]:
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (str, int)) and value not in _SENTINELS:
+        return str(value)
+    return None
+
+
+def _conditions(filters: Iterable[Any]) -> Iterable[Tuple[str, Any, Optional[str]]]:
+    """
+    Yields key, value and operator of the value filters which every resource must match.
+    Nested and blocks are flattened, or and not blocks are skipped.
+    """
+    for filter_ in filters:
+        if not isinstance(filter_, dict) or not filter_:
+            continue
+        if len(filter_) == 1:
+            ((key, value),) = filter_.items()
+            if key == "and":
+                yield from _conditions(value)
+            elif key not in ("or", "not", "type"):
+                yield key, value, None
+        elif filter_.get("type") == "value" and not set(filter_).difference(
+            ("type", "key", "value", "op")
+        ):
+            yield filter_.get("key"), filter_.get("value"), filter_.get("op")
+
+
+def server_filter(resource_type: str, key: str, value, op=None) -> Optional[Dict[str, Any]]:
+    """
+    Returns the API filter selecting a superset of the resources matching a value filter,
+    or None if it cannot be pushed down.
+    Age and other relative comparisons have no API filter.
+    """
+    if op in (None, "eq", "equal"):
+        values = [value]
+    elif op == "in" and isinstance(value, list):
+        values = value
+    else:
+        return None
+
+    if not isinstance(key, str):
+        return None
+    if key.startswith("tag:"):
+        if value == "present" and op is None:
+            return {"Name": "tag-key", "Values": [key[len("tag:") :]]}
+        name = key
+    else:
+        name = SERVER_FILTERS.get(resource_type, dict()).get(key)
+    api_values = list(map(_api_value, values))
+    if not name or not api_values or None in api_values or "present" in values:
+        return None
+    return {"Name": name, "Values": api_values}
+
+
+def _is_valid(resource_type: str, query_filter: Dict[str, Any]) -> bool:
+    """ Validate a query filter with the c7n parser for the resource type """
+    parser_path = QUERY_PARSERS.get(resource_type)
+    if not parser_path:
+        return True
+    module, name = parser_path.rsplit(".", 1)
+    parser = getattr(importlib.import_module(module), name)
+    try:
+        parser.parse([{"Filters": [query_filter]}])
+    except Exception:  # pylint: disable=broad-except
+        return False
+    return True
+
+
+def pushdown_policy(policy: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns a copy of the policy with a query narrowing the describe calls to
+    the resources its filters could match. The filters are kept and still applied by c7n.
+    Policies which already have a query are returned unchanged.
+    """
+    resource_type = policy.get("resource", "").replace("aws.", "", 1)
+    if "query" in policy or resource_type not in SERVER_FILTERS:
+        return policy
+    query_filters: List[Dict[str, Any]] = list()
+    for key_, value_, op_ in _conditions(policy.get("filters", list())):
+        query_filter = server_filter(resource_type, key_, value_, op_)
+        if query_filter and _is_valid(resource_type, query_filter):
+            query_filters.append(query_filter)
+    if not query_filters:
+        return policy
+    _LOGGER.debug("Pushing down %s for policy %s", query_filters, policy.get("name"))
+    rtn = copy.deepcopy(policy)
+    rtn["query"] = [{"Filters": query_filters}]
+    return rtn
+
+
+def pushdown_config(c7n_config: C7nCfg, policy_dir: PathLike) -> C7nCfg:
+    """
+    Returns a copy of c7n_config running derived policy files, written to policy_dir,
+    with filters pushed down. Policy files keep their names so data files are unchanged.
+    c7n_config is returned if no filters can be pushed down.
+    """
+    import yaml  # pylint: disable=import-outside-toplevel
+
+    configs = list()
+    changed = False
+    for config_file, data_ in zip(c7n_config.configs, c7n_config.get_config_data()):
+        policies = data_.get("policies") or list()
+        derived = list(map(pushdown_policy, policies))
+        if all(map(lambda pair_: pair_[0] is pair_[1], zip(policies, derived))):
+            configs.append(config_file)
+            continue
+        changed = True
+        derived_file = Path(policy_dir).joinpath(Path(config_file).name)
+        derived_file.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(derived_file, yaml.safe_dump(dict(data_, policies=derived)))
+        configs.append(derived_file)
+    if not changed:
+        return c7n_config
+
+    rtn = copy.copy(c7n_config)
+    rtn.configs = tuple(configs)
+    return rtn
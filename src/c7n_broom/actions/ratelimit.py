@@ -0,0 +1,262 @@
+"""
+Safety rails for running actions.
+Caps mutating API calls per account and region, and records the outcome of each call.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from os import PathLike
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from c7n_broom import sessions
+
+
+_LOGGER = logging.getLogger(__name__)
+
+OUTCOMES_FILE = "outcomes.jsonl"
+# Log progress every so many mutating calls per account and region
+PROGRESS_EVERY = 100
+# Operations with these prefixes only read, all others are rate limited
+READ_PREFIXES = (
+    "BatchGet",
+    "Check",
+    "Describe",
+    "Estimate",
+    "Filter",
+    "Get",
+    "Head",
+    "List",
+    "Lookup",
+    "Preview",
+    "Query",
+    "Scan",
+    "Search",
+    "Select",
+    "Simulate",
+    "Validate",
+)
+# Services only called for credentials
+CREDENTIAL_SERVICES = frozenset(("sts",))
+# Parameters naming the resources a call acts on
+ID_SUFFIXES = ("Id", "Ids", "Identifier", "Identifiers", "Arn", "Arns", "Name", "Names", "Url")
+ID_PARAMS = frozenset(("Bucket", "Resources"))
+_CONTEXT_KEY = "c7n_broom_ids"
+
+
+def is_mutating(operation_name: str, service_name: str = "") -> bool:
+    """ Returns True unless the operation only reads or gets credentials """
+    if service_name in CREDENTIAL_SERVICES:
+        return False
+    return not operation_name.startswith(READ_PREFIXES)
+
+
+def resource_ids(params: Dict[str, Any]) -> List[str]:
+    """ Returns the ids of the resources in the parameters of a call """
+    rtn = list()
+    for key_, value_ in params.items():
+        if key_ not in ID_PARAMS and not key_.endswith(ID_SUFFIXES):
+            continue
+        if isinstance(value_, str):
+            rtn.append(value_)
+        elif isinstance(value_, (list, tuple)):
+            rtn.extend(filter(lambda item_: isinstance(item_, str), value_))
+    return rtn
+
+
+class TokenBucket:  # pylint: disable=too-few-public-methods
+    """
+    Allows rate calls per second on average, and bursts of up to burst calls.
+    Callers reserve a token and sleep until it is available, outside of the lock.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, not {rate}")
+        self.rate = rate
+        self.burst = max(1, burst or 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """ Take a token, waiting until one is available. Returns the seconds waited. """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """
+    Rate limits mutating calls of boto3 sessions per account and region,
+    and appends the outcome of each to a JSON lines file.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        outcomes: Optional[Union[PathLike, str]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = time.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.outcomes = Path(outcomes) if outcomes else None
+        self._new_bucket = functools.partial(TokenBucket, rate, burst, clock=clock, sleep=sleep)
+        self.counts: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> Tuple[Optional[float], Optional[int], Optional[Path]]:
+        """ Settings the limiter was created with """
+        return self.rate, self.burst, self.outcomes
+
+    def bucket(self, account: str, region: str) -> Optional[TokenBucket]:
+        """ Returns the token bucket of account and region, None if not rate limited """
+        if not self.rate:
+            return None
+        with self._lock:
+            key = (account, region)
+            if key not in self._buckets:
+                self._buckets[key] = self._new_bucket()
+            return self._buckets[key]
+
+    def attach(self, session, profile: str):
+        """
+        Register handlers on the events of a boto3 session, replacing those of any limiter.
+        c7n updates cached sessions for every policy, so each call is only limited once,
+        by the limiter attached last.
+        """
+        account = sessions.account(profile)
+        # As specific as the handlers of clients, which run before less specific ones
+        for event_, handler_ in (
+            ("before-parameter-build.*.*", _capture_ids),
+            ("before-call.*.*", functools.partial(self._before_call, account=account)),
+            ("after-call.*.*", functools.partial(self._after_call, account)),
+            ("after-call-error.*.*", functools.partial(self._after_call_error, account)),
+        ):
+            unique_id = f"{__name__}.{event_}"
+            session.events.unregister(event_, unique_id=unique_id)
+            session.events.register(event_, handler_, unique_id=unique_id)
+        return session
+
+    def _before_call(self, model, request_signer, context, account, **_):
+        if not is_mutating(model.name, model.service_model.service_name):
+            return
+        region = request_signer.region_name or ""
+        bucket = self.bucket(account(), region)
+        context[_CONTEXT_KEY] = dict(
+            context.get(_CONTEXT_KEY, dict()),
+            region=region,
+            waited=bucket.acquire() if bucket else 0.0,
+        )
+
+    def _after_call(self, account, model, parsed, context, **_):
+        if _CONTEXT_KEY not in context or "region" not in context[_CONTEXT_KEY]:
+            return
+        error = (parsed or dict()).get("Error") or dict()
+        self._record(account(), model, context[_CONTEXT_KEY], error.get("Code"))
+
+    def _after_call_error(self, account, model, context, exception, **_):
+        if _CONTEXT_KEY not in context or "region" not in context[_CONTEXT_KEY]:
+            return
+        self._record(account(), model, context[_CONTEXT_KEY], type(exception).__name__)
+
+    def _record(self, account: str, model, call: Dict[str, Any], error: Optional[str]):
+        region = call["region"]
+        outcome = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "account": account,
+            "region": region,
+            "operation": f"{model.service_model.service_name}.{model.name}",
+            "ids": call.get("ids", list()),
+            "status": "error" if error else "ok",
+            "error": error,
+            "waited": round(call["waited"], 3),
+        }
+        with self._lock:
+            counts = self.counts[(account, region)]
+            counts.update(("calls", "errors") if error else ("calls",))
+            if self.outcomes:
+                # One write per line, so lines of other processes appending are not interleaved
+                with self.outcomes.open("a") as outcomes_fd:
+                    outcomes_fd.write(json.dumps(outcome) + "\n")
+        if error:
+            _LOGGER.warning("%s %s %s %s: %s", account, region, model.name, outcome["ids"], error)
+        if counts["calls"] % PROGRESS_EVERY == 0:
+            _LOGGER.info(
+                "%s %s: %s calls, %s errors", account, region, counts["calls"], counts["errors"]
+            )
+
+
+def _capture_ids(params, model, context, **_):
+    if is_mutating(model.name, model.service_model.service_name):
+        context[_CONTEXT_KEY] = dict(ids=resource_ids(params))
+
+
+_LIMITER: Optional[RateLimiter] = None
+_INSTALL_LOCK = threading.Lock()
+
+
+def install(
+    rate: Optional[float] = None,
+    burst: Optional[int] = None,
+    outcomes: Optional[Union[PathLike, str]] = None,
+) -> RateLimiter:
+    """
+    Attach a rate limiter to every session c7n creates in this process.
+    The limiter is shared by all threads, and replaced if the settings change.
+    """
+    global _LIMITER  # pylint: disable=global-statement
+    with _INSTALL_LOCK:
+        settings = (rate, burst, Path(outcomes) if outcomes else None)
+        if _LIMITER is None or _LIMITER.settings != settings:
+            _LIMITER = RateLimiter(rate, burst, outcomes)
+        sessions.register(__name__, _LIMITER.attach)
+        return _LIMITER
+
+
+def uninstall():
+    """ Stop attaching the rate limiter to new sessions """
+    global _LIMITER  # pylint: disable=global-statement
+    with _INSTALL_LOCK:
+        sessions.unregister(__name__)
+        _LIMITER = None
+
+
+def summarize(outcomes: Union[PathLike, str], offset: int = 0) -> Counter:
+    """
+    Returns the number of resources acted on by status, and the number of calls.
+    offset: Only count outcomes appended after this position in the file.
+    """
+    rtn: Counter = Counter()
+    path = Path(outcomes)
+    if not path.is_file():
+        return rtn
+    with path.open() as outcomes_fd:
+        outcomes_fd.seek(offset)
+        records: Iterable[Dict[str, Any]] = map(json.loads, filter(str.strip, outcomes_fd))
+        for record_ in records:
+            rtn[record_["status"]] += len(record_["ids"]) or 1
+            rtn["calls"] += 1
+    return rtn
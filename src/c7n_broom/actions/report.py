@@ -1,160 +1,127 @@
 """ Generate reports """
 
 import dataclasses
-import json
 import logging
-from collections import UserDict
-from dataclasses import asdict
+from functools import lru_cache
 from os import PathLike
 from pathlib import Path
-from typing import Any, Dict, Optional, Sequence, Tuple
-
-import jmespath
-from boto_remora.pricing import AWSResourceKeys
-from tabulate import tabulate
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, Optional, Sequence, Type
 
+from c7n_broom import resource_keys
 from c7n_broom.actions.helper import account_profile_policy_str
+from c7n_broom.resource_keys import (  # pylint: disable=unused-import
+    PROJECTED_FIELDS,
+    ResourceKey,
+    ResourceKeyDict,
+)
+from c7n_broom.rows import RowMixin
+from c7n_broom.storage import atomic_write_text, iter_records, resolve_data_dir
 from c7n_broom.util import ExtendedEnum
 
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def _cap_1letter(string: str) -> str:
-    return string[0].capitalize() + string[1:]
+@dataclasses.dataclass(frozen=True, eq=True)
+class FileFormat:
+    """ File extensions and formats for writing reports """
 
+    html = "html"
+    md = "github"  # pylint: disable=invalid-name
+    txt = "simple"
+    rst = "rst"
 
-class ResourceKeyDict(UserDict):  # pylint: disable=too-many-ancestors
-    """ Custom dict for ResourceKey """
 
-    def __str__(self) -> str:
-        """ Formatted to be passed into jmespath """
-        return ", ".join(map(lambda item: f"{item[0]}: {item[1]}", self.items()))
+def __getattr__(name: str):
+    """ ResourceKeys, the enum of resource keys by type before the registry, is kept """
+    if name == "ResourceKeys":
+        return _resource_keys_enum()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-@dataclasses.dataclass(eq=True, frozen=True)
-class ResourceKey:  # pylint: disable=too-many-instance-attributes
-    """ Data structure for descriptions of resources used in report generation """
+@lru_cache(maxsize=None)
+def _resource_keys_enum() -> Type[ExtendedEnum]:
+    """ Enum of the resource keys of the registry on first use, named as types with _ for - """
+    return ExtendedEnum(
+        "ResourceKeys",
+        [
+            (resource_type_.replace("-", "_"), resource_keys.registry()[resource_type_])
+            for resource_type_ in resource_keys.registry()
+        ],
+    )
 
-    id: str  # pylint: disable=invalid-name
-    name: str = "SKIP"
-    type: str = "SKIP"
-    size: str = "SKIP"
-    region: str = "region"
-    date: str = "SKIP"
-    tags: str = "Tags"
-    extras: Tuple[Tuple[str, str], ...] = dataclasses.field(default_factory=tuple)
 
-    @property
-    def data(self) -> ResourceKeyDict:
-        """ Return an "expanded" version of the resource key """
-        rtn_data = dict(filter(lambda item_: item_[1] != "SKIP", asdict(self).items()))
-        rtn_data.update(rtn_data.pop("extras"))
-        return ResourceKeyDict(rtn_data)
+def _get_resourcekey(resource_type) -> ResourceKey:
+    resource_key = resource_keys.registry().get(resource_type)
+    if not resource_key:
+        raise RuntimeError(f"Not defined {resource_type}")
+    return resource_key
 
 
-# TODO: Move to external definition file
-class ResourceKeys(ExtendedEnum):
-    """ Descriptions of resources used in report generation """
+def projected_fields(resource_key: ResourceKey) -> Optional[FrozenSet[str]]:
+    """
+    Returns the top level fields of a resource used by resource_key,
+    or None if an expression cannot be projected.
+    """
+    return resource_keys.compile_key(resource_key).fields
 
-    ami = ResourceKey(
-        id="ImageId",
-        name="Name",
-        date="CreationDate",
-        # extras=(("BlockDeviceMappings", "BlockDeviceMappings"),)
-    )
-    asg = ResourceKey(
-        id="AutoScalingGroupARN", name="AutoScalingGroupName", date="CreatedTime", region="SKIP"
-    )
-    launch_config = ResourceKey(
-        id="LaunchConfigurationARN",
-        name="LaunchConfigurationName",
-        date="CreatedTime",
-        region="SKIP",
-    )
-    ebs = ResourceKey(
-        id="VolumeId",
-        type=_cap_1letter(AWSResourceKeys.EBS.value.key),  # pylint: disable=no-member
-        size="Size",
-        date="CreateTime",
-    )
-    ebs_snapshot = ResourceKey(
-        id="SnapshotId", name="VolumeId", size="VolumeSize", date="StartTime",
-    )
-    ec2 = ResourceKey(
-        id="InstanceId",
-        type=_cap_1letter(AWSResourceKeys.EC2.value.key),  # pylint: disable=no-member
-        name="ImageId",
-        date="LaunchTime",
-    )
-    rds = ResourceKey(
-        id="DBInstanceArn",
-        name="DBInstanceIdentifier",
-        size="AllocatedStorage",
-        date="InstanceCreateTime",
-    )
-    rds_cluster_snapshot = ResourceKey(
-        id="DBClusterSnapshotArn",
-        name="DBClusterSnapshotIdentifier",
-        size="AllocatedStorage",
-        date="SnapshotCreateTime",
-    )
-    rds_snapshot = ResourceKey(
-        id="DBSnapshotArn",
-        name="DBSnapshotIdentifier",
-        size="AllocatedStorage",
-        date="SnapshotCreateTime",
-    )
-    test = ResourceKey(
-        id="key",
-        name="label",
-        size="",
-        # date="datetime",
-        # extras=(("Key", "keyname"),),
-    )
 
+def iter_project(c7n_config, resources: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """ Drop fields of resources not used in reports, keeping the resource id, one at a time """
+    try:
+        fields = projected_fields(_get_resourcekey(c7n_config.resource_type))
+    except (AttributeError, RuntimeError):
+        fields = None
+    if fields is None:
+        yield from resources
+        return
+    for item_ in resources:
+        yield {key_: value_ for key_, value_ in item_.items() if key_ in fields}
 
-@dataclasses.dataclass(frozen=True, eq=True)
-class FileFormat:
-    """ File extensions and formats for writing reports """
 
-    html = "html"
-    md = "github"  # pylint: disable=invalid-name
-    txt = "simple"
-    rst = "rst"
+def project(c7n_config, resources: Iterable[Dict[str, Any]]) -> Sequence[Dict[str, Any]]:
+    """ Drop fields of resources not used in reports, keeping the resource id """
+    return list(iter_project(c7n_config, resources))
 
 
-def _get_resourcekey(resource_type) -> ResourceKey:
-    key = getattr(ResourceKeys, resource_type, None)
-    if not key:
-        raise RuntimeError(f"Not defined {resource_type}")
-    return key.value
+def datafile_path(c7n_config, data_path="data") -> Path:
+    """ Returns the path of the query data file for c7n_config """
+    return (
+        resolve_data_dir(data_path)
+        .joinpath(account_profile_policy_str(c7n_config))
+        .with_suffix(".json")
+    )
 
 
-def get_data_map(c7n_config, data_path="data") -> Sequence[Dict[str, Any]]:
-    """ Queries data for resource key """
-    resource_key = _get_resourcekey(c7n_config.resource_type.replace("-", "_"))
-    datafile = (
-        Path(data_path).joinpath(account_profile_policy_str(c7n_config)).with_suffix(".json")
+def normalize_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """ Convert the tags of a projected resource from a list of Key/Value pairs to a dict """
+    row["tags"] = (
+        dict((tag["Key"], tag["Value"]) for tag in row["tags"]) if row.get("tags") else dict()
     )
-    expression = jmespath.compile(f"[].{{{resource_key.data}}}")
+    return row
+
+
+def get_data_map(c7n_config, data_path="data") -> Sequence[RowMixin]:
+    """
+    Queries data for resource key.
+    Returns compact rows, see c7n_broom.rows, sorted by date.
+    """
+    compiled = resource_keys.compile_key(_get_resourcekey(c7n_config.resource_type))
+    datafile = datafile_path(c7n_config, data_path)
     if not datafile.is_file():
         _LOGGER.error("File not found %s", datafile)
         return list()
 
-    rawdata = expression.search(json.loads(datafile.read_bytes()))
-    for item in rawdata:
-        item["tags"] = (
-            dict((tag["Key"], tag["Value"]) for tag in item["tags"])
-            if item.get("tags")
-            else dict()
-        )
-
-    return sorted(rawdata, key=lambda item_: item_["date"])
+    rows = [compiled.to_row(item_) for _, item_ in iter_records(datafile)]
+    if compiled.sort_key:
+        rows.sort(key=compiled.sort_key)
+    return rows
 
 
 def get_table(c7n_config, fmt: str = "simple", data_path: str = "data") -> str:
     """ Generate table str """
+    from tabulate import tabulate  # pylint: disable=import-outside-toplevel
+
     data = get_data_map(c7n_config, data_path)
     return tabulate(data, headers="keys", showindex=True, tablefmt=fmt)
 
@@ -171,7 +138,7 @@ def write(
     filefmt = getattr(FileFormat, fmt)
     table = get_table(c7n_config, fmt=filefmt, data_path=data_path)
     if table:
-        reportfile.write_text(get_table(c7n_config, fmt=filefmt, data_path=data_path))
+        atomic_write_text(reportfile, table)
     else:
         _LOGGER.debug("No data to write %s", reportfile)
         reportfile = None
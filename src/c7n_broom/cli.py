@@ -0,0 +1,297 @@
+""" Command line interface for c7n_broom """
+import argparse
+import json
+import logging
+import sys
+import time
+from datetime import timedelta
+from typing import Optional, Sequence
+
+
+_LOGGER = logging.getLogger(__name__)
+
+REPORT_FORMATS = ("md", "html", "txt", "rst")
+LOOKUP_COLUMNS = ("resource_id", "profile", "account", "region", "policy", "datafile")
+
+
+def _sweeper(args, offline: bool = False):
+    """
+    Create a Sweeper from the global arguments.
+    Offline sweepers only read existing data and do not import c7n or boto.
+    """
+    from c7n_broom.main import Sweeper  # pylint: disable=import-outside-toplevel
+
+    kwargs = {
+        "config_file": args.config,
+        "process_workers": args.workers,
+        "thread_workers": args.threads,
+        "offline": offline,
+    }
+    if args.data_dir:
+        kwargs["data_dir"] = args.data_dir
+    if args.no_auth_check:
+        kwargs["auth_check"] = False
+    if args.skip_unauthed:
+        kwargs["skip_unauthed"] = True
+    return Sweeper(**kwargs).select(
+        accounts=args.account, regions=args.region, policies=args.policy
+    )
+
+
+def _live_metrics(sweeper, args):
+    """ Live metrics arguments, which take precedence over the config file """
+    if args.metrics_port is not None:
+        sweeper.metrics_port = args.metrics_port
+    if args.progress:
+        sweeper.progress = True
+    return sweeper
+
+
+def _sweep_kwargs(args):
+    return {
+        "telemetry": args.telemetry,
+        "resume": args.resume,
+        "skip_fresh": timedelta(minutes=args.skip_fresh) if args.skip_fresh else None,
+    }
+
+
+def _run_str(sweeper, complete: bool) -> str:
+    """ The run of versioned sweeps """
+    if not sweeper.versioned:
+        return ""
+    return f", run {sweeper.last_run_id}" + ("" if complete else " incomplete, not promoted")
+
+
+def _query(args) -> int:
+    """ Run policies without actions """
+    sweeper = _live_metrics(_sweeper(args), args)
+    complete = sweeper.query(**_sweep_kwargs(args))
+    print(f"Queried {len(sweeper.jobs)} jobs{_run_str(sweeper, complete)}.")
+    return 0
+
+
+def _execute(args) -> int:
+    """ Run policies with actions """
+    if not args.yes:
+        print("Refusing to run actions without --yes.", file=sys.stderr)
+        return 2
+    sweeper = _live_metrics(_sweeper(args), args)
+    if args.rate:
+        sweeper.execute_rate = args.rate
+    if args.burst:
+        sweeper.execute_burst = args.burst
+    if args.reviewed:
+        outcomes = sweeper.execute_reviewed(telemetry=args.telemetry, revalidate=args.revalidate)
+        print(
+            f"Executed {len(sweeper.jobs)} jobs on reviewed resources, acted on {outcomes['ok']}"
+            f" resources, {outcomes['error']} failed."
+        )
+    else:
+        complete = sweeper.execute(**_sweep_kwargs(args))
+        print(f"Executed {len(sweeper.jobs)} jobs{_run_str(sweeper, complete)}.")
+    return 0
+
+
+def _report(args) -> int:
+    """ Write reports from query data """
+    sweeper = _sweeper(args, offline=True)
+    if args.diff:
+        files = sweeper.gen_diff_reports(
+            base=args.base, head=args.head, fmt=args.format, report_dir=args.report_dir
+        )
+    else:
+        files = sweeper.gen_reports(fmt=args.format, report_dir=args.report_dir)
+    print("\n".join(files))
+    return 0
+
+
+def _dashboard(args) -> int:
+    """ Write the HTML dashboard of query data """
+    files = _sweeper(args, offline=True).gen_html(html_dir=args.html_dir, full=args.full)
+    print(f"Wrote {len(files)} pages to {args.html_dir}.")
+    return 0
+
+
+def _counts(args) -> int:
+    """ Print resource counts from query data """
+    counts = _sweeper(args, offline=True).counts(grouped=args.grouped)
+    if args.json:
+        print(json.dumps(counts, indent=2))
+    else:
+        for job_str, count_ in counts.items():
+            print(f"{job_str}\t{count_}")
+    return 0
+
+
+def _lookup(args) -> int:
+    """ Print where resources were found """
+    from c7n_broom.index import ResourceIndex  # pylint: disable=import-outside-toplevel
+
+    found = False
+    with ResourceIndex(_sweeper(args, offline=True).index_file) as index:
+        for resource_id in args.resource_ids:
+            for entry in index.lookup(resource_id):
+                found = True
+                if args.show:
+                    entry["resource"] = index.read(entry)
+                if args.json:
+                    print(json.dumps(entry, default=str))
+                else:
+                    print("\t".join(str(entry[key_]) for key_ in LOOKUP_COLUMNS))
+                    if args.show:
+                        print(json.dumps(entry["resource"], indent=2, default=str))
+    return 0 if found else 1
+
+
+def _index(args) -> int:
+    """ Update the resource index """
+    indexed, removed = _sweeper(args, offline=True).update_index()
+    print(f"Indexed {indexed} files, removed {removed} files.")
+    return 0
+
+
+def _add_sweep_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--telemetry", action="store_true", help="Send c7n metrics")
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const=True,
+        default=False,
+        metavar="RUN_ID",
+        help="Continue a versioned run, the newest unfinished run by default",
+    )
+    parser.add_argument(
+        "--skip-fresh",
+        type=float,
+        metavar="MINUTES",
+        help="Skip jobs with data newer than MINUTES",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="Serve live metrics in Prometheus text format on PORT of localhost",
+    )
+    parser.add_argument(
+        "--progress", action="store_true", help="Show live progress instead of job lines"
+    )
+
+
+def get_parser() -> argparse.ArgumentParser:
+    """ Returns the argument parser """
+    parser = argparse.ArgumentParser(prog="c7n-broom", description="Cloud Custodian Broom")
+    parser.add_argument("--config", default="config", help="Config file name, without extension")
+    parser.add_argument("--data-dir", help="Query data directory")
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="c7n-broom.prof",
+        metavar="FILE",
+        help=(
+            "Write cProfile stats of the main thread to FILE and print a summary."
+            " Jobs run in worker threads and processes, which are not profiled"
+        ),
+    )
+
+    selection = parser.add_argument_group("job selection")
+    selection.add_argument(
+        "--account", action="append", help="Profile or account id, may be repeated"
+    )
+    selection.add_argument("--region", action="append", help="Region, may be repeated")
+    selection.add_argument("--policy", action="append", help="Policy name, may be repeated")
+    selection.add_argument("--no-auth-check", action="store_true")
+    selection.add_argument("--skip-unauthed", action="store_true")
+
+    workers = parser.add_argument_group("parallelism")
+    workers.add_argument("--workers", type=int, help="Number of worker processes")
+    workers.add_argument("--threads", type=int, help="Number of threads per worker process")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    query = subparsers.add_parser("query", help="Run policies without actions")
+    _add_sweep_arguments(query)
+    query.set_defaults(func=_query)
+
+    execute = subparsers.add_parser("execute", help="Run policies with actions")
+    _add_sweep_arguments(execute)
+    execute.add_argument("--yes", action="store_true", help="Confirm running actions")
+    execute.add_argument(
+        "--rate", type=float, help="Mutating calls per second per account and region"
+    )
+    execute.add_argument("--burst", type=int, help="Mutating calls allowed at once before --rate")
+    execute.add_argument(
+        "--reviewed", action="store_true", help="Only act on resources in the latest query data"
+    )
+    execute.add_argument(
+        "--revalidate",
+        action="store_true",
+        help="With --reviewed, skip resources which no longer match the policy filters",
+    )
+    execute.set_defaults(func=_execute)
+
+    report = subparsers.add_parser("report", help="Write reports from query data")
+    report.add_argument("--format", choices=REPORT_FORMATS, default="md")
+    report.add_argument("--report-dir")
+    report.add_argument("--diff", action="store_true", help="Only report changes between runs")
+    report.add_argument("--base", help="Run id or directory to compare from")
+    report.add_argument("--head", help="Run id or directory to compare to")
+    report.set_defaults(func=_report)
+
+    dashboard = subparsers.add_parser("dashboard", help="Write the HTML dashboard of query data")
+    dashboard.add_argument("--html-dir", default="public")
+    dashboard.add_argument(
+        "--full", action="store_true", help="Write all pages, not only those of changed jobs"
+    )
+    dashboard.set_defaults(func=_dashboard)
+
+    counts = subparsers.add_parser("counts", help="Count resources in query data")
+    counts.add_argument("--grouped", action="store_true", help="Count by region and type")
+    counts.add_argument("--json", action="store_true")
+    counts.set_defaults(func=_counts)
+
+    lookup = subparsers.add_parser("lookup", help="Find which jobs flagged resources")
+    lookup.add_argument("resource_ids", nargs="+", metavar="RESOURCE_ID")
+    lookup.add_argument("--json", action="store_true", help="Print JSON lines")
+    lookup.add_argument("--show", action="store_true", help="Print the resource data")
+    lookup.set_defaults(func=_lookup)
+
+    index = subparsers.add_parser("index", help="Update the resource index")
+    index.set_defaults(func=_index)
+
+    return parser
+
+
+def _profiled(func, args, outfile: str) -> int:
+    """ Run func under cProfile and write stats to outfile """
+    # pylint: disable=import-outside-toplevel
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    try:
+        return profiler.runcall(func, args)
+    finally:
+        elapsed = time.perf_counter() - start
+        profiler.dump_stats(outfile)
+        print(
+            f"{args.command} took {elapsed:.3f}s, profile written to {outfile}", file=sys.stderr
+        )
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(20)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """ Entry point for c7n-broom """
+    args = get_parser().parse_args(argv)
+    logging.basicConfig(
+        level=max(logging.WARNING - 10 * args.verbose, logging.DEBUG),
+        format="%(asctime)s %(name)s %(levelname)s %(message)s",
+    )
+    if args.profile:
+        return _profiled(args.func, args, args.profile)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
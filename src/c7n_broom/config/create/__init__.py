@@ -1,2 +1,2 @@
 """ c7n_broom.config.create """
-from .main import account_c7nconfigs, c7nconfigs
+from .main import account_c7nconfigs, c7nconfig_template, c7nconfigs
@@ -2,43 +2,63 @@
 import itertools
 import logging
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
-
-import botocore
-from boto_remora.aws import Ec2, Sts
-from vyper import Vyper
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
 
 from c7n_broom.config.create.policies import get_policy_files
 from c7n_broom.config.main import C7nCfg
 
 
+if TYPE_CHECKING:  # pragma: no cover
+    from vyper import Vyper
+
+
 _LOGGER = logging.getLogger(__name__)
 
 
+def c7nconfig_template(global_settings: Union["Vyper", Dict[str, Any]]) -> Dict[str, Any]:
+    """ C7nCfg kwargs from global settings, shared by every account """
+    global_settings = global_settings if global_settings else dict()
+    return {
+        "c7n_home": global_settings.get("c7n_home"),
+        "policies": global_settings.get("policies"),
+        "c7n": dict(global_settings.get("c7n") or dict()),
+    }
+
+
 def account_c7nconfigs(
     name: str,
-    account_settings: Union[Vyper, Dict[str, Any]],
-    global_settings: Optional[Union[Vyper, Dict[str, Any]]] = None,
+    account_settings: Union["Vyper", Dict[str, Any]],
+    global_settings: Optional[Union["Vyper", Dict[str, Any]]] = None,
     skip_regions: bool = False,
+    lookup_account_id: bool = True,
 ):
-    """ Create c7n config per policy for account. """
+    """
+    Create c7n config per policy for account.
+    global_settings: Global settings or their c7nconfig_template, to resolve them once for
+    all accounts.
+    """
     _LOGGER.info("Creating c7n configs for %s", name)
+    template = c7nconfig_template(global_settings)
     policies = get_policy_files(
-        account_settings.get("policies") if account_settings else dict(),
-        global_settings.get("policies") if global_settings else dict(),
+        account_settings.get("policies") if account_settings else dict(), template["policies"]
     )
     # TODO: remove skip regions in favor of setting regions in broom config
-    regions = Ec2(name).available_regions if not skip_regions else list()
+    regions = list()
+    if not skip_regions:
+        from boto_remora.aws import Ec2  # pylint: disable=import-outside-toplevel
+
+        regions = Ec2(name).available_regions
 
     # TODO: move to a more generalize factory and refrain from creating C7nCfg directly.
-    c7n_home = global_settings.get("c7n_home")
+    c7n_home = template["c7n_home"]
     c7nconfig_kwargs = {
         "profile": name,
         "regions": regions,
         "metrics_enabled": False,
         "output_dir": str(Path(c7n_home).joinpath(name)) if c7n_home else "",
+        "lookup_account_id": lookup_account_id,
     }
-    c7nconfig_kwargs.update(global_settings.get("c7n", dict()))
+    c7nconfig_kwargs.update(template["c7n"])
     c7nconfig_kwargs.update(account_settings.get("c7n", dict()))
 
     _LOGGER.info("Creating policies for profile %s", name)
@@ -48,16 +68,24 @@ def account_c7nconfigs(
 
 
 def c7nconfigs(
-    config: Union[Vyper, Dict[str, Any]],
+    config: Union["Vyper", Dict[str, Any]],
     skip_unauthed: Optional[bool] = None,
     skip_auth_check: Optional[bool] = None,
+    lookup_account_id: bool = True,
 ):
-    """ Create c7n configs for every policy and account """
+    """
+    Create c7n configs for every policy and account
+    lookup_account_id: Disable to avoid calling AWS when only reading existing data.
+    """
     global_settings = config.get("global")
     accounts = config.get("accounts")
     broom_settings = config.get("broom") if config.get("broom") else dict()
-    available_profiles = botocore.session.Session().available_profiles
-    accountids = {profile_: None for profile_ in available_profiles}
+    accountids = dict()
+
+    def available_profiles():
+        import botocore.session  # pylint: disable=import-outside-toplevel
+
+        return botocore.session.Session().available_profiles
 
     if skip_unauthed is None:
         skip_unauthed = broom_settings.get("skip_unauthed")
@@ -73,18 +101,23 @@ def c7nconfigs(
     ):
 
         _LOGGER.info("Loading all available profiles.")
-        accounts = {profile: None for profile in available_profiles}
+        accounts = {profile: None for profile in available_profiles()}
 
     if not skip_auth_check and accounts:
-        accountids = {sts_.profile_name: sts_.account for sts_ in map(Sts, available_profiles)}
+        from boto_remora.aws import Sts  # pylint: disable=import-outside-toplevel
+
+        accountids = {sts_.profile_name: sts_.account for sts_ in map(Sts, available_profiles())}
         authed_profiles = dict(filter(lambda aid_: aid_[1], accountids.items()))
         unauthed_profiles = set(accounts).difference(authed_profiles)
         msg = f"Not all accounts can access the AWS API {unauthed_profiles}."
         if skip_unauthed:
             if unauthed_profiles:
                 _LOGGER.info(msg)
-                for unauthed_ in unauthed_profiles:
-                    _ = accounts.pop(unauthed_)
+                accounts = {
+                    profile_: settings_
+                    for profile_, settings_ in accounts.items()
+                    if profile_ not in unauthed_profiles
+                }
         elif unauthed_profiles:
             raise RuntimeError(msg)
 
@@ -104,20 +137,24 @@ def c7nconfigs(
     if not accounts:
         _LOGGER.critical("No accounts to create c7n configs.")
 
-    for profile_ in accounts.keys():
-        if accounts[profile_] is None:
-            accounts[profile_] = dict()
-        data_ = accounts[profile_].get("c7n", dict())
-        accounts[profile_]["c7n"] = data_
-        accounts[profile_]["c7n"]["account_id"] = data_.get(
-            "account_id", accountids.get(profile_)
-        )
+    def with_account_id(profile_: str, settings_: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """ Copy of the settings of an account with its account id, settings may be shared """
+        settings_ = dict(settings_) if settings_ else dict()
+        data_ = dict(settings_.get("c7n") or dict())
+        data_["account_id"] = data_.get("account_id", accountids.get(profile_))
+        settings_["c7n"] = data_
+        return settings_
 
+    template = c7nconfig_template(global_settings)
     return itertools.chain.from_iterable(
         map(
             lambda kv_: account_c7nconfigs(
-                kv_[0], kv_[1], global_settings, skip_regions=skip_auth_check,
+                kv_[0],
+                with_account_id(*kv_),
+                template,
+                skip_regions=skip_auth_check,
+                lookup_account_id=lookup_account_id,
             ),
-            accounts.items(),
+            (accounts or dict()).items(),
         )
     )
@@ -1,14 +1,27 @@
 """ Policy package for c7n_broom.config """
 import logging
+from functools import lru_cache
 from os import PathLike
 from pathlib import Path
-from typing import Any, Dict, Iterable, Iterator, Optional, Set, Union
-
-from vyper import Vyper
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 from c7n_broom.util import ExtendedEnum
 
 
+if TYPE_CHECKING:  # pragma: no cover
+    from vyper import Vyper
+
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -24,39 +37,71 @@ def _create_dictset(data: Dict[str, Iterable[str]], keys: Iterable[str]) -> Dict
     return {key: set(data.get(key) if (data and data.get(key)) else set()) for key in keys}
 
 
+def _frozen_dictset(
+    data: Dict[str, Iterable[str]], keys: Iterable[str]
+) -> Tuple[Tuple[str, FrozenSet[str]], ...]:
+    """ Hashable _create_dictset, to memoize on """
+    return tuple(
+        sorted((key_, frozenset(val_)) for key_, val_ in _create_dictset(data, keys).items())
+    )
+
+
+@lru_cache(maxsize=None)
+def _merge_policies(
+    account_policies: Tuple[Tuple[str, FrozenSet[str]], ...],
+    default_policies: Tuple[Tuple[str, FrozenSet[str]], ...],
+) -> Tuple[str, ...]:
+    """ Included policies less excluded ones, for each distinct set of account overrides """
+    account_policies_, default_policies_ = dict(account_policies), dict(default_policies)
+    policies_sets = {
+        policy_key: account_policies_[policy_key].union(default_policies_[policy_key])
+        for policy_key in account_policies_
+    }
+    return tuple(
+        sorted(
+            policies_sets[PolicyKeys.INCLUDE.value].difference(  # pylint: disable=no-member
+                policies_sets[PolicyKeys.EXCLUDE.value]  # pylint: disable=no-member
+            )
+        )
+    )
+
+
 def filter_policies(
     account_policies, default_policies, keys=frozenset(PolicyKeys.values())
 ) -> Iterator[str]:
     """ Combine account and default included and excluded policies. """
-    account_policies_ = _create_dictset(account_policies, keys)
-    default_policies_ = _create_dictset(default_policies, keys)
+    return iter(
+        _merge_policies(
+            _frozen_dictset(account_policies, keys), _frozen_dictset(default_policies, keys)
+        )
+    )
 
-    policies_sets = {
-        policy_key: account_policies_[policy_key].union(default_policies_[policy_key])
-        for policy_key in keys
-    }
 
-    return filter(
-        lambda policy: policy
-        not in policies_sets[PolicyKeys.EXCLUDE.value],  # pylint: disable=no-member
-        policies_sets[PolicyKeys.INCLUDE.value],  # pylint: disable=no-member
+@lru_cache(maxsize=None)
+def _policy_paths(
+    policy_names: Tuple[str, ...], path: Path, file_suffix: str
+) -> Tuple[Path, ...]:
+    _LOGGER.debug('Looking for policies in "%s".', path)
+    return tuple(
+        map(
+            lambda policy: policy.with_suffix(f".{file_suffix}"),
+            map(path.joinpath, policy_names),
+        )
     )
 
 
 def get_policy_files(
-    account_settings: Union[Vyper, Dict[str, Any]],
-    global_settings: Optional[Union[Vyper, Dict[str, Any]]] = None,
+    account_settings: Union["Vyper", Dict[str, Any]],
+    global_settings: Optional[Union["Vyper", Dict[str, Any]]] = None,
     path: Union[PathLike, str] = "",
     file_suffix="yml",
 ) -> Iterator[PathLike]:
-    """ Returns an iterator of paths to policy files. """
-    policy_names = filter_policies(account_settings, global_settings)
+    """
+    Returns an iterator of paths to policy files.
+    Paths are memoized, accounts which inherit the global policies share them.
+    """
+    policy_names = tuple(filter_policies(account_settings, global_settings))
     if (not path) and global_settings and global_settings.get("path"):
         _LOGGER.info("Setting policy path to %s", path)
         path = global_settings.get("path")
-    path = Path(path)
-    _LOGGER.debug('Looking for policies in "%s".', path)
-
-    return map(
-        lambda policy: policy.with_suffix(f".{file_suffix}"), map(path.joinpath, policy_names),
-    )
+    return iter(_policy_paths(policy_names, Path(path), file_suffix))
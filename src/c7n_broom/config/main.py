@@ -6,23 +6,50 @@ import os
 from collections import abc, deque
 from contextlib import suppress
 from dataclasses import asdict, dataclass
+from functools import lru_cache
 from io import IOBase
 from os import PathLike
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
 
-import c7n.config
-import yaml
-from boto_remora.aws import Sts
-from botocore.exceptions import ProfileNotFound
-from vyper import Vyper
+
+if TYPE_CHECKING:  # pragma: no cover
+    import c7n.config
+    from vyper import Vyper
 
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def get_config(filename: str = "config", path: PathLike = Path(".")):
-    """ Read in config file """
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    """ Modification time and size of path, None if it is not a file """
+    with suppress(OSError):
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+    return None
+
+
+def get_config(filename: str = "config", path: PathLike = Path(".")) -> "Vyper":
+    """
+    Read in config file.
+    Configs are memoized until the config file changes, the returned config is shared.
+    """
+    from vyper import constants  # pylint: disable=import-outside-toplevel
+
+    location = Path(path).resolve()
+    signature = tuple(
+        (ext_, _file_signature(location.joinpath(f"{filename}.{ext_}")))
+        for ext_ in constants.SUPPORTED_EXTENSIONS
+    )
+    return _read_config(filename, Path(path), location, signature)
+
+
+@lru_cache(maxsize=16)
+def _read_config(
+    filename: str, path: Path, _location: Path, _signature: Tuple[Any, ...]
+) -> "Vyper":
+    from vyper import Vyper  # pylint: disable=import-outside-toplevel
+
     # TODO: Figure out why defaults does not work.
     default_path = "global.path"
     defaults = {
@@ -31,7 +58,7 @@ def get_config(filename: str = "config", path: PathLike = Path(".")):
     }
     config = Vyper(filename)
     config.set_default("global", defaults)
-    config.add_config_path(Path(path))
+    config.add_config_path(path)
     config.read_in_config()
     if not config.is_set(default_path):
         _LOGGER.info("Setting default path to %s", path)
@@ -39,6 +66,28 @@ def get_config(filename: str = "config", path: PathLike = Path(".")):
     return config
 
 
+@lru_cache(maxsize=16)
+def _read_policy_resources(
+    policy_file: Path, _signature: Tuple[int, int]
+) -> FrozenSet[Optional[str]]:
+    import yaml  # pylint: disable=import-outside-toplevel
+
+    data = yaml.safe_load(policy_file.read_bytes()) or dict()
+    return frozenset(map(lambda policy_: policy_.get("resource"), data.get("policies") or ()))
+
+
+def policy_resources(policy_file: Union[PathLike, str]) -> FrozenSet[Optional[str]]:
+    """
+    Returns the resource types of the policies in policy_file.
+    Memoized until the policy file changes, as every account shares the same policy files.
+    """
+    policy_file = Path(os.path.abspath(policy_file))
+    signature = _file_signature(policy_file)
+    if signature is None:
+        return frozenset()
+    return _read_policy_resources(policy_file, signature)
+
+
 @dataclass()
 class C7nCfg:  # pylint: disable=too-many-instance-attributes
     """ Configuration adopter for c7n."""
@@ -62,6 +111,7 @@ class C7nCfg:  # pylint: disable=too-many-instance-attributes
     no_default_fields: bool = False
     field: Iterable[str] = dataclasses.field(default_factory=list)
     raw: Optional[Path] = None
+    all_findings: bool = False
 
     region: str = os.environ.get("AWS_DEFAULT_REGION", "us-east-1")
     metrics_enabled: bool = True
@@ -79,11 +129,18 @@ class C7nCfg:  # pylint: disable=too-many-instance-attributes
     # IDK, but c7n will throw errors w/o it.
     vars: Optional[List] = None
 
+    # Not passed to c7n. Disable to avoid calling AWS when only reading existing data.
+    lookup_account_id: bool = dataclasses.field(default=True, repr=False, compare=False)
+
     def __post_init__(self):
         if not self.profile:
             raise TypeError("Profile must be set.")
 
-        if self.profile and not self.account_id:
+        if self.profile and not self.account_id and self.lookup_account_id:
+            # pylint: disable=import-outside-toplevel
+            from boto_remora.aws import Sts
+            from botocore.exceptions import ProfileNotFound
+
             with suppress(ProfileNotFound):
                 self.account_id = Sts(profile_name=self.profile).caller_identity.get("Account")
 
@@ -116,12 +173,10 @@ class C7nCfg:  # pylint: disable=too-many-instance-attributes
         Otherwise returns None
         """
 
-        policy_resources = set(
-            map(lambda policy_item: policy_item.get("resource"), self.get_policy_data())
-        )
-        rtn = policy_resources.pop() if len(policy_resources) == 1 else None
+        resources = set().union(*map(policy_resources, self.configs))
+        rtn = resources.pop() if len(resources) == 1 else None
         if not rtn:
-            _LOGGER.warning("%s resource types found.", len(policy_resources))
+            _LOGGER.warning("%s resource types found.", len(resources))
         return rtn
 
     @property
@@ -139,6 +194,8 @@ class C7nCfg:  # pylint: disable=too-many-instance-attributes
     def get_config_data(self) -> Iterable[Dict[str, Any]]:
         """ Returns iterable of dict for all files in self.config """
 
+        import yaml  # pylint: disable=import-outside-toplevel
+
         def get_policy_data(policy_file) -> Dict[str, Any]:
             policy_file = Path(policy_file)
             return yaml.safe_load(policy_file.read_bytes()) if policy_file.is_file() else dict()
@@ -156,8 +213,10 @@ class C7nCfg:  # pylint: disable=too-many-instance-attributes
         )
 
     @property
-    def c7n(self) -> c7n.config.Config:
+    def c7n(self) -> "c7n.config.Config":
         """ Cast to c7n Config and return new object """
+        import c7n.config  # pylint: disable=import-outside-toplevel,redefined-outer-name
+
         if isinstance(self.raw, IOBase):
             raise RuntimeError(f"Cannot serialize type IOBase. Raw is set to {self.raw}")
 
@@ -172,6 +231,7 @@ class C7nCfg:  # pylint: disable=too-many-instance-attributes
             tmpdata[key_] = tmp_ if tmp_ else val_
         # PosixPath is not JSON serializable
         tmpdata["configs"] = [str(cfg_) for cfg_ in self.configs]
+        del tmpdata["lookup_account_id"]
 
         rtn = c7n.config.Config().empty()
         rtn.update(tmpdata)
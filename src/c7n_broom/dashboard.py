@@ -0,0 +1,278 @@
+"""
+Static HTML dashboard of query data.
+One index, a page per resource type and paginated pages per job,
+regenerating only the pages of jobs whose query data changed.
+"""
+import hashlib
+import html
+import json
+import logging
+import re
+import shutil
+from collections import Counter, defaultdict
+from datetime import datetime
+from numbers import Number
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from c7n_broom.actions.helper import account_profile_policy_str, policy_str
+from c7n_broom.actions.report import datafile_path, get_data_map
+from c7n_broom.storage import atomic_write_text
+
+
+_LOGGER = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+PAGE_SIZE = 500
+INDEX_PAGE = "index.html"
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #ccc; padding: 0.2em 0.5em; }}
+nav {{ margin: 1em 0; }}
+</style>
+</head>
+<body>
+<nav>{nav}</nav>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+def _slug(text: str) -> str:
+    """ Safe file name of text, distinct texts with the same safe characters differ by hash """
+    digest = hashlib.blake2b(text.encode(), digest_size=4).hexdigest()
+    return f"{re.sub(r'[^A-Za-z0-9._-]+', '_', text)}-{digest}"
+
+
+def _link(href: str, text: Any) -> str:
+    return f'<a href="{html.escape(href)}">{html.escape(str(text))}</a>'
+
+
+def _page(title: str, body: str, depth: int = 0, nav: Sequence[str] = ()) -> str:
+    home = _link("../" * depth + INDEX_PAGE, "Dashboard") if depth else ""
+    return _PAGE.format(
+        title=html.escape(title), nav=" | ".join(filter(None, (home, *nav))), body=body
+    )
+
+
+def _table(rows: Sequence[Dict[str, Any]]) -> str:
+    """
+    HTML table of rows, values are already escaped.
+    Written directly, tabulate's column width and type inference is of no use in HTML.
+    """
+    if not rows:
+        return "<table></table>"
+    header = "".join(map(lambda key_: f"<th>{html.escape(str(key_))}</th>", rows[0].keys()))
+    body = "\n".join(
+        map(lambda row_: "<tr>" + "".join(map(_cell, row_.values())) + "</tr>", rows)
+    )
+    return f"<table>\n<thead>\n<tr>{header}</tr>\n</thead>\n<tbody>\n{body}\n</tbody>\n</table>"
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, Number):
+        return f'<td style="text-align: right;">{value}</td>'
+    return f"<td>{value}</td>"
+
+
+def _signature(datafile: Path, page_size: int) -> List[Any]:
+    """ Only what tells a change, the manifest is published with the pages """
+    stat = datafile.stat()
+    return [stat.st_mtime_ns, stat.st_size, page_size]
+
+
+def _total_size(rows) -> Number:
+    if not rows or "size" not in rows[0].keys():
+        return 0
+    return sum(filter(lambda size_: isinstance(size_, Number), map(lambda row_: row_.size, rows)))
+
+
+class Dashboard:
+    """ Static HTML dashboard of the query data of jobs, written to output_path """
+
+    def __init__(
+        self,
+        output_path: Union[PathLike, str] = "public",
+        data_path: Union[PathLike, str] = "data",
+        page_size: int = PAGE_SIZE,
+    ):
+        self.output_path = Path(output_path)
+        self.data_path = data_path
+        self.page_size = page_size
+        self.manifest_file = self.output_path.joinpath(MANIFEST_FILE)
+        self.manifest: Dict[str, Dict[str, Any]] = dict()
+        if self.manifest_file.is_file():
+            self.manifest = json.loads(self.manifest_file.read_text())
+
+    def _job_dir(self, summary: Dict[str, Any]) -> Path:
+        return self.output_path.joinpath(summary["resource_type"], _slug(summary["job"]))
+
+    def _is_current(self, job_str: str, signature: List[Any]) -> bool:
+        summary = self.manifest.get(job_str)
+        return bool(
+            summary
+            and summary["signature"] == signature
+            and self._job_dir(summary).joinpath("1.html").is_file()
+        )
+
+    def _write_job(self, c7n_config, job_str: str, signature: List[Any]) -> List[Path]:
+        """ Write the pages of a job and keep its summary in the manifest """
+        rows = get_data_map(c7n_config, data_path=self.data_path)
+        summary = {
+            "job": job_str,
+            "account": str(c7n_config.account_id or c7n_config.profile),
+            "profile": c7n_config.profile,
+            "policy": policy_str(c7n_config),
+            "resource_type": c7n_config.resource_type,
+            "count": len(rows),
+            "size": _total_size(rows),
+            "regions": dict(Counter(str(row_.get("region")) for row_ in rows)),
+            "pages": max(1, -(-len(rows) // self.page_size)),
+            "signature": signature,
+        }
+        job_dir = self._job_dir(summary)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        job_dir.mkdir(parents=True)
+        written = list()
+        for page_ in range(1, summary["pages"] + 1):
+            start = (page_ - 1) * self.page_size
+            nav = [_link("../index.html", summary["resource_type"])]
+            if page_ > 1:
+                nav.append(_link(f"{page_ - 1}.html", "Previous"))
+            if page_ < summary["pages"]:
+                nav.append(_link(f"{page_ + 1}.html", "Next"))
+            body = (
+                f"<p>{start + 1 if rows else 0}-{min(start + self.page_size, len(rows))}"
+                f" of {len(rows)} resources, page {page_} of {summary['pages']}</p>\n"
+                + _table_of_rows(rows[start : start + self.page_size])
+            )
+            written.append(
+                atomic_write_text(
+                    job_dir.joinpath(f"{page_}.html"),
+                    _page(job_str, body, depth=2, nav=nav),
+                )
+            )
+        self.manifest[job_str] = summary
+        return written
+
+    def _write_type(self, resource_type: str, summaries: Sequence[Dict[str, Any]]) -> Path:
+        rows = [
+            {
+                "Account": html.escape(summary_["account"]),
+                "Profile": html.escape(summary_["profile"]),
+                "Policy": _link(f"{_slug(summary_['job'])}/1.html", summary_["policy"]),
+                "Resources": summary_["count"],
+                "Size": summary_["size"],
+                "Regions": html.escape(
+                    ", ".join(f"{key_}: {val_}" for key_, val_ in summary_["regions"].items())
+                ),
+            }
+            for summary_ in sorted(summaries, key=lambda summary_: -summary_["count"])
+        ]
+        return atomic_write_text(
+            self.output_path.joinpath(resource_type, INDEX_PAGE),
+            _page(resource_type, _table(rows), depth=1),
+        )
+
+    def _write_index(self, by_type: Dict[str, List[Dict[str, Any]]]) -> Path:
+        rows = [
+            {
+                "Resource type": _link(f"{resource_type_}/{INDEX_PAGE}", resource_type_),
+                "Jobs": len(summaries_),
+                "Accounts": len({summary_["account"] for summary_ in summaries_}),
+                "Resources": sum(summary_["count"] for summary_ in summaries_),
+                "Size": sum(summary_["size"] for summary_ in summaries_),
+            }
+            for resource_type_, summaries_ in sorted(by_type.items())
+        ]
+        generated = html.escape(datetime.now().isoformat(timespec="seconds"))
+        return atomic_write_text(
+            self.output_path.joinpath(INDEX_PAGE),
+            _page("c7n Broom", f"<p>Generated {generated}</p>\n{_table(rows)}"),
+        )
+
+    def build(self, jobs: Iterable[Any], full: bool = False) -> List[Path]:
+        """
+        Write the dashboard of jobs in one pass over their query data.
+        Pages of jobs whose query data did not change since the last build are kept,
+        unless full. Pages of jobs and resource types which are gone are removed.
+        Returns the pages written, see save for keeping the summaries of jobs.
+        """
+        written: List[Path] = list()
+        current = dict()
+        for job_ in jobs:
+            job_str = account_profile_policy_str(job_)
+            datafile = datafile_path(job_, self.data_path)
+            if not job_.resource_type or not datafile.is_file():
+                _LOGGER.debug("Skipping %s, no query data or resource type", job_str)
+                continue
+            signature = _signature(datafile, self.page_size)
+            if full or not self._is_current(job_str, signature):
+                try:
+                    written.extend(self._write_job(job_, job_str, signature))
+                except RuntimeError as err:
+                    _LOGGER.warning("Skipping %s: %s", job_str, err)
+                    continue
+            current[job_str] = self.manifest[job_str]
+
+        for job_str_, summary_ in self.manifest.items():
+            if job_str_ not in current:
+                shutil.rmtree(self._job_dir(summary_), ignore_errors=True)
+
+        by_type = defaultdict(list)
+        for summary_ in current.values():
+            by_type[summary_["resource_type"]].append(summary_)
+        for resource_type_ in {summary_["resource_type"] for summary_ in self.manifest.values()}:
+            if resource_type_ not in by_type:
+                shutil.rmtree(self.output_path.joinpath(resource_type_), ignore_errors=True)
+        self.manifest = current
+        for resource_type_ in by_type:
+            written.append(self._write_type(resource_type_, by_type[resource_type_]))
+        written.append(self._write_index(by_type))
+        _LOGGER.info(
+            "Dashboard of %s jobs, %s pages written in %s",
+            len(current),
+            len(written),
+            self.output_path,
+        )
+        return written
+
+    def save(self):
+        """ Write the summaries of jobs to the manifest, for the next build """
+        atomic_write_text(self.manifest_file, json.dumps(self.manifest, indent=2))
+
+
+def _table_of_rows(rows) -> str:
+    """ HTML table of query data rows """
+    if not rows:
+        return "<p>No resources</p>"
+    return _table(
+        [
+            {key_: html.escape(str(value_)) for key_, value_ in row_.as_dict().items()}
+            for row_ in rows
+        ]
+    )
+
+
+def build(
+    jobs: Iterable[Any],
+    data_path: Union[PathLike, str] = "data",
+    output_path: Union[PathLike, str] = "public",
+    full: bool = False,
+    page_size: Optional[int] = None,
+) -> List[Path]:
+    """ Write the dashboard of jobs and save its manifest, see Dashboard.build """
+    dashboard = Dashboard(output_path, data_path=data_path, page_size=page_size or PAGE_SIZE)
+    written = dashboard.build(jobs, full=full)
+    dashboard.save()
+    return written
@@ -1,26 +1,34 @@
 """ Process pricing information """
 import itertools
 import logging
-from typing import Any, Dict, Sequence
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Dict, Sequence, Union
+
+from c7n_broom.rows import RowMixin
 
 
 _LOGGER = logging.getLogger(__name__)
 
+Row = Union[Dict[str, Any], RowMixin]
 
-def groupby(datamap: Sequence[Dict[str, Any]], attribute: str) -> Dict[str, Any]:
-    """ Group query data by attribute """
 
-    def sort_key(item_):
-        _LOGGER.debug("SORT KEY: %s", item_)
-        return item_[attribute]
+def _getter(datamap: Sequence[Row], attribute: str) -> Callable[[Row], Any]:
+    """ Returns a function getting attribute from dicts or compact rows """
+    if datamap and isinstance(datamap[0], RowMixin):
+        return attrgetter(attribute)
+    return itemgetter(attribute)
 
+
+def groupby(datamap: Sequence[Row], attribute: str) -> Dict[str, Any]:
+    """ Group query data by attribute """
+    sort_key = _getter(datamap, attribute)
     return {
         key_: tuple(val_)
         for key_, val_ in itertools.groupby(sorted(datamap, key=sort_key), key=sort_key)
     }
 
 
-def groupby_region1st(datamap: Sequence[Dict[str, Any]], attribute: str) -> Dict[str, Any]:
+def groupby_region1st(datamap: Sequence[Row], attribute: str) -> Dict[str, Any]:
     """ Group query data by region then attribute """
     return dict(
         map(
@@ -30,17 +38,17 @@ def groupby_region1st(datamap: Sequence[Dict[str, Any]], attribute: str) -> Dict
     )
 
 
-def countby(datamap: Sequence[Dict[str, Any]], attribute: str):
+def countby(datamap: Sequence[Row], attribute: str):
     """ Counts items by attribute """
     return dict(
         map(
-            lambda item_: (item_[0], sum(1 for _ in item_[1])),
+            lambda item_: (item_[0], len(item_[1])),
             dict(groupby(datamap, attribute=attribute)).items(),
         )
     )
 
 
-def countby_region1st(datamap: Sequence[Dict[str, Any]], attribute: str):
+def countby_region1st(datamap: Sequence[Row], attribute: str):
     """ Counts items by attribute grouped by region """
     return dict(
         map(
@@ -50,7 +58,7 @@ def countby_region1st(datamap: Sequence[Dict[str, Any]], attribute: str):
     )
 
 
-def count(datamap: Sequence[Dict[str, Any]]):
+def count(datamap: Sequence[Row]):
     """ Counts items by region and by type if type exists """
     if datamap and datamap[0].get("type"):
         return countby_region1st(datamap, attribute="type")
@@ -0,0 +1,196 @@
+""" Historical store of query results """
+import json
+import logging
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+
+_LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    run_id TEXT NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    policy TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    name TEXT,
+    size,
+    date TEXT,
+    tags TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_resources_trend
+    ON resources (account, resource_type, region, run_id);
+CREATE INDEX IF NOT EXISTS idx_resources_run
+    ON resources (run_id, account, policy);
+CREATE INDEX IF NOT EXISTS idx_resources_id
+    ON resources (resource_id, run_id);
+"""
+
+# Columns which may be used for filtering and grouping
+COLUMNS = ("run_id", "account", "region", "resource_type", "policy", "resource_id")
+
+
+def _where(filters: Mapping[str, Any]):
+    """ Returns a where clause and parameters for column filters """
+    unknown = set(filters).difference(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns {unknown}")
+    items = [(key_, val_) for key_, val_ in sorted(filters.items()) if val_ is not None]
+    if not items:
+        return "", list()
+    return (
+        "WHERE " + " AND ".join(f"{key_} = ?" for key_, _ in items),
+        [val_ for _, val_ in items],
+    )
+
+
+class History:
+    """
+    SQLite backed history of query data.
+    Rows are keyed by run, account, region, resource type and policy.
+    """
+
+    def __init__(self, path: Union[PathLike, str] = Path("data").joinpath("history.sqlite")):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(self.path))
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """ Close the database """
+        self.connection.close()
+
+    def ingest(
+        self,
+        run_id: str,
+        account: str,
+        resource_type: str,
+        policy: str,
+        rows: Iterable[Mapping[str, Any]],
+    ) -> int:
+        """
+        Store rows produced by report.get_data_map for a job.
+        Rows previously stored for the same run, account and policy are replaced.
+        """
+        data = [
+            (
+                run_id,
+                account,
+                row_.get("region") or "",
+                resource_type,
+                policy,
+                str(row_["id"]),
+                row_.get("name"),
+                row_.get("size"),
+                str(row_["date"]) if row_.get("date") is not None else None,
+                json.dumps(dict(row_.get("tags") or dict()), sort_keys=True),
+            )
+            for row_ in rows
+        ]
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO runs (run_id, created) VALUES (?, ?)",
+                (run_id, datetime.now(timezone.utc).isoformat()),
+            )
+            self.connection.execute(
+                "DELETE FROM resources WHERE run_id = ? AND account = ? AND policy = ?",
+                (run_id, account, policy),
+            )
+            self.connection.executemany(
+                "INSERT INTO resources VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", data
+            )
+        _LOGGER.debug("Stored %s rows for %s:%s in run %s", len(data), account, policy, run_id)
+        return len(data)
+
+    def runs(self) -> List[str]:
+        """ Returns run ids oldest first """
+        return [
+            row_[0] for row_ in self.connection.execute("SELECT run_id FROM runs ORDER BY run_id")
+        ]
+
+    def counts(self, by: Sequence[str] = ("account",), **filters) -> List[Dict[str, Any]]:
+        """
+        Count resources grouped by columns.
+        Filters are column equality matches, ie account="prod", resource_type="ebs".
+        """
+        unknown = set(by).difference(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns {unknown}")
+        where, params = _where(filters)
+        columns = ", ".join(by)
+        query = (
+            f"SELECT {columns}, COUNT(*) FROM resources {where} "
+            f"GROUP BY {columns} ORDER BY {columns}"
+        )
+        return [
+            dict(zip((*by, "count"), row_)) for row_ in self.connection.execute(query, params)
+        ]
+
+    def trend(self, **filters) -> List[Dict[str, Any]]:
+        """ Count resources per run, oldest first """
+        return self.counts(by=("run_id",), **filters)
+
+    def resource_ids(self, run_id: str, **filters) -> Iterable[str]:
+        """ Returns resource ids for a run """
+        where, params = _where(dict(filters, run_id=run_id))
+        return (
+            row_[0]
+            for row_ in self.connection.execute(
+                f"SELECT DISTINCT resource_id FROM resources {where}", params
+            )
+        )
+
+    def diff(self, base_run: str, head_run: str, **filters) -> Dict[str, List[str]]:
+        """ Returns resource ids added and removed between two runs """
+        base_where, base_params = _where(dict(filters, run_id=base_run))
+        head_where, head_params = _where(dict(filters, run_id=head_run))
+        base = f"SELECT resource_id FROM resources {base_where}"
+        head = f"SELECT resource_id FROM resources {head_where}"
+
+        def ids(query, params):
+            return sorted(row_[0] for row_ in self.connection.execute(query, params))
+
+        return {
+            "added": ids(f"{head} EXCEPT {base}", head_params + base_params),
+            "removed": ids(f"{base} EXCEPT {head}", base_params + head_params),
+        }
+
+    def compact(
+        self, keep_runs: Optional[int] = None, max_age: Optional[timedelta] = None
+    ) -> List[str]:
+        """ Remove runs beyond the newest keep_runs or older than max_age """
+        runs = self.runs()
+        expired = set(runs[:-keep_runs] if keep_runs else list())
+        if max_age is not None:
+            cutoff = (datetime.now(timezone.utc) - max_age).isoformat()
+            expired.update(
+                row_[0]
+                for row_ in self.connection.execute(
+                    "SELECT run_id FROM runs WHERE created < ?", (cutoff,)
+                )
+            )
+        if expired:
+            with self.connection:
+                self.connection.executemany(
+                    "DELETE FROM runs WHERE run_id = ?", [(run_,) for run_ in expired]
+                )
+            self.connection.execute("VACUUM")
+            _LOGGER.info("Removed %s runs from history", len(expired))
+        return sorted(expired)
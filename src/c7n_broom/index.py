@@ -0,0 +1,169 @@
+""" Index of resource ids across query data files """
+import logging
+import sqlite3
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from c7n_broom.actions.helper import policy_str
+from c7n_broom.actions.report import _get_resourcekey, datafile_path
+from c7n_broom.resource_keys import compile_key
+from c7n_broom.storage import iter_records, read_record, resolve_data_dir
+
+
+_LOGGER = logging.getLogger(__name__)
+
+INDEX_FILE = "index.sqlite"
+
+# Indexes of other versions are rebuilt
+_SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    datafile TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    resource_id TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    account TEXT NOT NULL,
+    region TEXT NOT NULL,
+    policy TEXT NOT NULL,
+    resource_type TEXT NOT NULL,
+    datafile TEXT NOT NULL REFERENCES files(datafile) ON DELETE CASCADE,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_id ON entries (resource_id);
+CREATE INDEX IF NOT EXISTS idx_entries_file ON entries (datafile);
+"""
+_DROP = """
+DROP TABLE IF EXISTS entries;
+DROP TABLE IF EXISTS files;
+"""
+
+_FIELDS = (
+    "resource_id",
+    "profile",
+    "account",
+    "region",
+    "policy",
+    "resource_type",
+    "datafile",
+    "offset",
+)
+
+
+class ResourceIndex:
+    """
+    SQLite index of resource id to profile, account, region, policy, data file and offset.
+    The account id is empty when it was not known, as with offline sweepers.
+    Files are only re-read when their size or modification time changes.
+    """
+
+    def __init__(self, path: Union[PathLike, str] = Path("data", "query", INDEX_FILE)):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(self.path))
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+            self.connection.executescript(_DROP)
+            self.connection.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """ Close the database """
+        self.connection.close()
+
+    def _is_current(self, datafile: Path) -> bool:
+        stat = datafile.stat()
+        row = self.connection.execute(
+            "SELECT mtime_ns, size FROM files WHERE datafile = ?", (str(datafile),)
+        ).fetchone()
+        return row == (stat.st_mtime_ns, stat.st_size)
+
+    def _index_file(self, c7n_config, datafile: Path) -> int:
+        id_expression = compile_key(_get_resourcekey(c7n_config.resource_type)).id
+        account = str(c7n_config.account_id or "")
+        policy = policy_str(c7n_config)
+        stat = datafile.stat()
+        searched = (
+            (offset_, item_, id_expression.search(item_))
+            for offset_, item_ in iter_records(datafile)
+        )
+        entries = (
+            (
+                str(id_),
+                c7n_config.profile,
+                account,
+                item_.get("region", ""),
+                policy,
+                c7n_config.resource_type,
+                str(datafile),
+                offset_,
+            )
+            # Records without an id cannot be looked up
+            for offset_, item_, id_ in searched
+            if id_ is not None
+        )
+        with self.connection:
+            self.connection.execute("DELETE FROM files WHERE datafile = ?", (str(datafile),))
+            self.connection.execute(
+                "INSERT INTO files VALUES (?, ?, ?)",
+                (str(datafile), stat.st_mtime_ns, stat.st_size),
+            )
+            count = self.connection.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", entries
+            ).rowcount
+        _LOGGER.debug("Indexed %s resources in %s", count, datafile)
+        return count
+
+    def update(self, jobs: Iterable[Any], data_path: Union[PathLike, str]) -> Tuple[int, int]:
+        """
+        Index the query data of jobs.
+        Files no longer present, or from a run other than the latest, are removed from the index.
+        Returns the number of files re-indexed and the number of files removed from the index.
+        """
+        current_dir = resolve_data_dir(data_path)
+        indexed = 0
+        for job_ in jobs:
+            datafile = datafile_path(job_, data_path)
+            if not datafile.is_file() or self._is_current(datafile):
+                continue
+            try:
+                self._index_file(job_, datafile)
+            except RuntimeError as err:
+                _LOGGER.warning("Skipping index for %s: %s", job_.get_str, err)
+                continue
+            indexed += 1
+
+        stale = [
+            (row_[0],)
+            for row_ in self.connection.execute("SELECT datafile FROM files")
+            if Path(row_[0]).parent != current_dir or not Path(row_[0]).is_file()
+        ]
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE datafile = ?", stale)
+        _LOGGER.info("Indexed %s files, removed %s files", indexed, len(stale))
+        return indexed, len(stale)
+
+    def lookup(self, resource_id: str) -> List[Dict[str, Any]]:
+        """ Returns where a resource id was found """
+        return [
+            dict(zip(_FIELDS, row_))
+            for row_ in self.connection.execute(
+                f"SELECT {', '.join(_FIELDS)} FROM entries WHERE resource_id = ?",
+                (resource_id,),
+            )
+        ]
+
+    @staticmethod
+    def read(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """ Returns the resource data for a lookup entry """
+        return read_record(entry["datafile"], entry["offset"])
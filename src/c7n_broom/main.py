@@ -1,67 +1,182 @@
 """ Main module for c7n_broom """
 import logging
-from collections import defaultdict, deque
+import os
+from collections import Counter, defaultdict, deque
 from concurrent.futures import ProcessPoolExecutor
 from concurrent.futures.thread import ThreadPoolExecutor
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta
 from functools import partial
 from os import PathLike
 from pathlib import Path
-from typing import Any, Dict, Iterator, Mapping, Optional, Sequence, Set, Union
-
-from vyper import Vyper
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import c7n_broom
-from c7n_broom import C7nCfg
-from c7n_broom.actions.report import get_data_map
+from c7n_broom import C7nCfg, metrics, partition, storage
+from c7n_broom.actions import ratelimit
+from c7n_broom.actions.diff import JobDiff
+from c7n_broom.actions.diff import diff as diff_job
+from c7n_broom.actions.helper import policy_str
+from c7n_broom.actions.report import datafile_path, get_data_map
 from c7n_broom.data import count
 
 
+if TYPE_CHECKING:  # pragma: no cover
+    from vyper import Vyper
+
+
 _LOGGER = logging.getLogger(__name__)
 
 
-def _trun(action: c7n_broom.actions, jobs: Sequence[C7nCfg]):
+def _trun(
+    action: c7n_broom.actions, jobs: Sequence[C7nCfg], max_workers: Optional[int] = None
+):
     """ Multi-threaded actions """
     _LOGGER.debug("Processing %s %s jobs.", len(jobs), action.__class__.__name__)
-    with ThreadPoolExecutor() as executor:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
         executor.map(action, jobs)
 
 
-def _account_batch_run(action: c7n_broom.actions, jobs: Mapping[str, C7nCfg]):
+def _account_batch_run(
+    action: c7n_broom.actions,
+    jobs: Mapping[str, C7nCfg],
+    max_workers: Optional[int] = None,
+    thread_workers: Optional[int] = None,
+):
     """
     Multiprocess actions batched by account
     to get around caching sessions issue
     """
     _LOGGER.debug("Processing %s jobs for %s.", action.__class__.__name__, jobs.keys())
-    exec_ = partial(_trun, action)
-    with ProcessPoolExecutor() as executor:
+    exec_ = partial(_trun, action, max_workers=thread_workers)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
         executor.map(exec_, jobs.values())
 
 
+def _shard_run(
+    action: c7n_broom.actions, jobs: Sequence[C7nCfg], max_workers: Optional[int] = None
+) -> List[Tuple[str, float, bool]]:
+    """
+    Multi-threaded actions for a shard of jobs in a worker process.
+    Each account gets its own threads to get around caching sessions issue.
+    Returns the duration of each job and whether it succeeded.
+    """
+    durations = list()
+    for account_jobs in partition.by_account(jobs).values():
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            durations.extend(executor.map(partial(partition.timed, action), account_jobs))
+    return durations
+
+
+def _sharded_run(
+    action: c7n_broom.actions,
+    shards: Sequence[Sequence[C7nCfg]],
+    thread_workers: Optional[int] = None,
+) -> List[Tuple[str, float, bool]]:
+    """ Multiprocess actions with one process per shard """
+    _LOGGER.debug("Processing %s shards of sizes %s.", len(shards), list(map(len, shards)))
+    exec_ = partial(_shard_run, action, max_workers=thread_workers)
+    with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+        return [duration_ for shard_ in executor.map(exec_, shards) for duration_ in shard_]
+
+
+def _log_outcomes(outcomes_file: Path, offset: int = 0) -> Counter:
+    outcomes = ratelimit.summarize(outcomes_file, offset=offset)
+    _LOGGER.info(
+        "Acted on %s resources, %s failed, in %s calls",
+        outcomes["ok"],
+        outcomes["error"],
+        outcomes["calls"],
+    )
+    return outcomes
+
+
 @dataclass()
-class Sweeper:
+class Sweeper:  # pylint: disable=too-many-instance-attributes
     """ Lets sweep up the cloud """
 
-    settings: Optional[Union[Vyper, Dict[str, Any]]] = None
+    settings: Optional[Union["Vyper", Dict[str, Any]]] = None
     config_file: Union[PathLike, str] = field(default="config", repr=False)
     data_dir: PathLike = Path("data").joinpath("query")
     report_dir: PathLike = Path("data").joinpath("reports")
     skip_unauthed: bool = False
     auth_check: bool = True
+    versioned: bool = False
+    keep_runs: Optional[int] = None
+    lock: bool = False
+    history_file: Optional[Union[PathLike, str]] = None
+    history_keep_runs: Optional[int] = None
+    index: bool = True
+    process_workers: Optional[int] = None
+    thread_workers: Optional[int] = None
+    offline: bool = False
+    sharded: bool = True
+    pushdown: bool = False
+    projection: bool = False
+    resource_keys: Sequence[Union[PathLike, str]] = ()
+    execute_rate: Optional[float] = None
+    execute_burst: Optional[int] = None
+    metrics_port: Optional[int] = None
+    progress: bool = False
     jobs: Sequence[C7nCfg] = field(init=False, repr=False)
+    last_run_id: Optional[str] = field(default=None, init=False)
+    last_metrics: Optional[metrics.Registry] = field(default=None, init=False, repr=False)
 
     def __post_init__(self):
         if not self.settings:
             self.settings = c7n_broom.config.get_config(filename=str(self.config_file))
         broom_settings = self.settings.get("broom") if self.settings.get("broom") else dict()
-        for attrib in ("data_dir", "report_dir", "auth_check", "skip_unauthed"):
-            if broom_settings.get(attrib):
-                setattr(self, attrib, broom_settings.get(attrib))
+        defaults = {field_.name: field_.default for field_ in fields(self)}
+        for attrib in (
+            "data_dir",
+            "report_dir",
+            "auth_check",
+            "skip_unauthed",
+            "versioned",
+            "keep_runs",
+            "lock",
+            "history_file",
+            "history_keep_runs",
+            "index",
+            "process_workers",
+            "thread_workers",
+            "sharded",
+            "pushdown",
+            "projection",
+            "resource_keys",
+            "execute_rate",
+            "execute_burst",
+            "metrics_port",
+            "progress",
+        ):
+            # Arguments which differ from the defaults take precedence over the config file
+            value = broom_settings.get(attrib)
+            if value is not None and getattr(self, attrib) == defaults[attrib]:
+                setattr(self, attrib, value)
+        if isinstance(self.resource_keys, (str, PathLike)):
+            self.resource_keys = (self.resource_keys,)
+        for path_ in self.resource_keys:
+            c7n_broom.resource_keys.registry().load_file(path_)
+        # Offline sweepers only read existing data and never call AWS
         self.jobs = deque(
             c7n_broom.config.create.c7nconfigs(
                 self.settings,
                 skip_unauthed=self.skip_unauthed,
-                skip_auth_check=not self.auth_check,
+                skip_auth_check=self.offline or not self.auth_check,
+                lookup_account_id=not self.offline,
             )
         )
 
@@ -73,33 +188,294 @@ class Sweeper:
     def _filter_by_attrib(self, attribute: str, attribute_val: str):
         return filter(lambda job_: getattr(job_, attribute, False) == attribute_val, self.jobs)
 
-    def _asdict_by_attrib(self, attribute: str):
+    def _asdict_by_attrib(self, attribute: str, jobs=None):
+        if jobs is None:
+            jobs = self.jobs
         rtn = defaultdict(deque)
-        _ = [rtn[str(getattr(job_, attribute))].append(job_) for job_ in self.jobs]
+        _ = [rtn[str(getattr(job_, attribute))].append(job_) for job_ in jobs]
         return rtn
 
-    def _run(self, action):
-        jobmap = self._asdict_by_attrib("account_id")
-        return _account_batch_run(action, jobmap) if len(jobmap) > 1 else _trun(action, self.jobs)
+    def _run(self, action, jobs=None, by_account: bool = False):
+        """ by_account: Run all jobs of an account in one process """
+        if jobs is None:
+            jobs = self.jobs
+        jobmap = self._asdict_by_attrib("account_id", jobs)
+        if len(jobmap) > 1 and self.sharded and not by_account:
+            return self._sharded_run(action, jobs)
+        if len(jobmap) > 1:
+            return _account_batch_run(
+                action,
+                jobmap,
+                max_workers=self.process_workers,
+                thread_workers=self.thread_workers,
+            )
+        return _trun(action, jobs, max_workers=self.thread_workers)
+
+    def _tracked_run(self, action, jobs, by_account: bool = False):
+        """
+        _run with live metrics of the jobs, when metrics_port or progress are set.
+        The metrics are kept in last_metrics.
+        """
+        if self.metrics_port is None and not self.progress:
+            return self._run(action, jobs, by_account=by_account)
+        with metrics.live(port=self.metrics_port, progress=self.progress) as (registry, queue):
+            self.last_metrics = registry
+            registry.queue(jobs)
+            return self._run(metrics.Tracked(action, queue), jobs, by_account=by_account)
+
+    def _sharded_run(self, action, jobs):
+        """
+        Run jobs in shards balanced by historical durations across the worker processes,
+        and record the new durations.
+        """
+        stats = partition.JobStats(
+            Path(self.data_dir).joinpath(partition.STATS_FILE), data_path=self.data_dir
+        )
+        shards = partition.partition(
+            jobs, self.process_workers or os.cpu_count() or 1, cost=stats.estimate
+        )
+        _LOGGER.info(
+            "Running %s jobs in %s shards, estimated makespan %.0fs",
+            len(jobs),
+            len(shards),
+            partition.makespan(shards, stats.estimate),
+        )
+        stats.record(_sharded_run(action, shards, thread_workers=self.thread_workers))
+        stats.save()
 
     def get_account_jobs(self, account: str, use_profile: bool = True) -> Iterator[C7nCfg]:
         """ Get an iterator of only jobs for an account """
         attrib = "profile" if use_profile else "account_id"
         return self._filter_by_attrib(attribute=attrib, attribute_val=account)
 
-    def query(self, telemetry=False):
-        """ Run without actions. Dryrun true. """
+    def select(
+        self,
+        accounts: Optional[Iterable[str]] = None,
+        regions: Optional[Iterable[str]] = None,
+        policies: Optional[Iterable[str]] = None,
+    ) -> "Sweeper":
+        """
+        Narrow jobs to accounts (profile or account id), regions and policy names.
+        Returns self.
+        """
+        jobs = self.jobs
+        if accounts:
+            selected = set(
+                id(job_)
+                for account_ in accounts
+                for use_profile in (True, False)
+                for job_ in self.get_account_jobs(account_, use_profile=use_profile)
+            )
+            jobs = [job_ for job_ in jobs if id(job_) in selected]
+        if policies:
+            policies = set(policies)
+            jobs = [
+                job_
+                for job_ in jobs
+                if policies.intersection(Path(cfg_).stem for cfg_ in job_.configs)
+            ]
+        if regions:
+            regions = set(regions)
+            for job_ in jobs:
+                job_.regions = job_.regions.intersection(regions) if job_.regions else regions
+            jobs = [job_ for job_ in jobs if job_.regions]
+        self.jobs = deque(jobs)
+        _LOGGER.info("Selected %s jobs", len(self.jobs))
+        return self
+
+    def _resume_run_id(self, resume: Union[bool, str]) -> str:
+        """ Returns the run to resume, the newest run which was never promoted by default """
+        if not self.versioned:
+            raise RuntimeError("Only versioned sweeps can be resumed.")
+        if isinstance(resume, str):
+            return resume
+        latest = storage.latest_run_dir(self.data_dir)
+        unfinished = [
+            run_ for run_ in storage.list_runs(self.data_dir) if not latest or run_ > latest.name
+        ]
+        if not unfinished:
+            raise RuntimeError(f"No unfinished run to resume in {self.data_dir}.")
+        return unfinished[-1]
+
+    def _pending_jobs(
+        self,
+        data_dir: Path,
+        resume: Union[bool, str] = False,
+        skip_fresh: Optional[timedelta] = None,
+    ) -> List[C7nCfg]:
+        """
+        Returns the jobs left to run in data_dir.
+        Fresh data of versioned sweeps is carried over to data_dir, so the run is complete.
+        """
+        jobs = list(self.jobs)
+        if resume:
+            jobs = [job_ for job_ in jobs if not datafile_path(job_, data_dir).is_file()]
+        if skip_fresh is None:
+            return jobs
+        cutoff = (datetime.now() - skip_fresh).timestamp()
+
+        def is_fresh(job_):
+            datafile = datafile_path(job_, self.data_dir)
+            return datafile.is_file() and datafile.stat().st_mtime >= cutoff
+
+        fresh = [job_ for job_ in jobs if is_fresh(job_)]
+        if self.versioned:
+            for job_ in fresh:
+                storage.link_or_copy(
+                    datafile_path(job_, self.data_dir), datafile_path(job_, data_dir)
+                )
+        fresh_ids = set(map(id, fresh))
+        return [job_ for job_ in jobs if id(job_) not in fresh_ids]
+
+    def _promote(self, run_id: str) -> bool:
+        """
+        Promote a versioned run to latest when every job wrote its data,
+        and remove runs beyond the newest keep_runs.
+        Returns whether the run was promoted.
+        """
+        data_dir = storage.run_dir(self.data_dir, run_id)
+        missing = [
+            job_.get_str for job_ in self.jobs if not datafile_path(job_, data_dir).is_file()
+        ]
+        if missing:
+            _LOGGER.warning(
+                "Not promoting run %s, %s jobs wrote no data: %s",
+                run_id,
+                len(missing),
+                ", ".join(missing),
+            )
+            return False
+        storage.promote_run(self.data_dir, run_id)
+        if self.keep_runs:
+            storage.prune_runs(self.data_dir, int(self.keep_runs))
+        return True
+
+    def _sweep(
+        self,
+        func,
+        telemetry,
+        resume: Union[bool, str] = False,
+        skip_fresh: Optional[timedelta] = None,
+        by_account: bool = False,
+        **kwargs,
+    ) -> bool:
+        """
+        Run func for all jobs.
+        Versioned sweeps write to a new run directory which is promoted to latest when every job
+        wrote its data, otherwise the run can be resumed.
+        resume: Continue a versioned run, skipping jobs which already wrote data.
+        skip_fresh: Skip jobs with data newer than this.
+        by_account: Run all jobs of an account in one process.
+        kwargs: Passed to func.
+        Returns whether the run is complete, versioned runs only once promoted.
+        """
+        run_id = self._resume_run_id(resume) if resume else storage.new_run_id()
+        data_dir = storage.run_dir(self.data_dir, run_id) if self.versioned else self.data_dir
+        Path(data_dir).mkdir(parents=True, exist_ok=True)
+
+        jobs = self._pending_jobs(Path(data_dir), resume=resume, skip_fresh=skip_fresh)
+        _LOGGER.info("Running %s of %s jobs in %s", len(jobs), len(self.jobs), data_dir)
         action = partial(
-            c7n_broom.actions.query, data_dir=self.data_dir, telemetry_disabled=not telemetry,
+            func,
+            data_dir=data_dir,
+            telemetry_disabled=not telemetry,
+            lock=self.lock,
+            pushdown=self.pushdown,
+            projection=self.projection,
+            quiet=self.progress,
+            **kwargs,
+        )
+        if jobs:
+            self._tracked_run(action, jobs, by_account=by_account)
+        self.last_run_id = run_id
+        return self._promote(run_id) if self.versioned else True
+
+    def query(
+        self,
+        telemetry=False,
+        resume: Union[bool, str] = False,
+        skip_fresh: Optional[timedelta] = None,
+    ) -> bool:
+        """
+        Run without actions. Dryrun true.
+        The index and history are only updated with complete runs.
+        Returns whether the run is complete.
+        """
+        complete = self._sweep(
+            c7n_broom.actions.query, telemetry, resume=resume, skip_fresh=skip_fresh
+        )
+        if not complete:
+            _LOGGER.warning("Not indexing or recording incomplete run %s", self.last_run_id)
+            return False
+        if self.index:
+            self.update_index()
+        if self.history_file:
+            self.record_history(run_id=self.last_run_id)
+        return True
+
+    def execute(
+        self,
+        telemetry=False,
+        resume: Union[bool, str] = False,
+        skip_fresh: Optional[timedelta] = None,
+    ) -> bool:
+        """
+        Run actions. Dryrun false.
+        All jobs of an account run in one process, so mutating calls are limited to
+        execute_rate per second per account and region.
+        The outcome of each call is appended to outcomes.jsonl in the run directory.
+        Returns whether the run is complete.
+        """
+        # Unversioned sweeps append to the outcomes of earlier runs
+        outcomes_file = Path(self.data_dir).joinpath(ratelimit.OUTCOMES_FILE)
+        offset = outcomes_file.stat().st_size if outcomes_file.is_file() else 0
+        complete = self._sweep(
+            c7n_broom.actions.execute,
+            telemetry,
+            resume=resume,
+            skip_fresh=skip_fresh,
+            by_account=True,
+            rate=self.execute_rate,
+            burst=self.execute_burst,
         )
-        return self._run(action)
+        if self.versioned:
+            outcomes_file = storage.run_dir(self.data_dir, self.last_run_id).joinpath(
+                ratelimit.OUTCOMES_FILE
+            )
+            offset = 0
+        _log_outcomes(outcomes_file, offset)
+        return complete
 
-    def execute(self, telemetry=False):
-        """ Run actions. Dryrun false. """
+    def execute_reviewed(self, telemetry=False, revalidate: bool = False) -> Counter:
+        """
+        Run actions on the resources in the latest query data only. Dryrun false.
+        Only those resources are described again, so the cost scales with the resources found
+        rather than the size of the accounts.
+        revalidate: Apply the filters of the policies again, skipping resources which no longer
+        match.
+        Mutating calls are limited as with execute, outcomes are appended to outcomes.jsonl
+        next to the query data.
+        Returns the count of outcomes by status and of calls, see ratelimit.summarize.
+        """
+        data_dir = storage.resolve_data_dir(self.data_dir)
+        jobs = [job_ for job_ in self.jobs if datafile_path(job_, data_dir).is_file()]
+        _LOGGER.info(
+            "Running %s of %s jobs with query data in %s", len(jobs), len(self.jobs), data_dir
+        )
+        outcomes_file = data_dir.joinpath(ratelimit.OUTCOMES_FILE)
+        offset = outcomes_file.stat().st_size if outcomes_file.is_file() else 0
         action = partial(
-            c7n_broom.actions.execute, data_dir=self.data_dir, telemetry_disabled=not telemetry,
+            c7n_broom.actions.execute_reviewed,
+            data_dir=data_dir,
+            telemetry_disabled=not telemetry,
+            revalidate=revalidate,
+            rate=self.execute_rate,
+            burst=self.execute_burst,
+            quiet=self.progress,
         )
-        return self._run(action)
+        if jobs:
+            self._tracked_run(action, jobs, by_account=True)
+        return _log_outcomes(outcomes_file, offset)
 
     def gen_reports(self, fmt="md", report_dir=None):
         """ Generate reports. Markdown by default. """
@@ -115,9 +491,125 @@ class Sweeper:
         _LOGGER.info("%s report file written", len(filelist))
         return filelist
 
-    def gen_html(self, html_dir: PathLike = "public"):
-        """ Generate HTML report """
-        return self.gen_reports("html", report_dir=html_dir)
+    def gen_html(self, html_dir: PathLike = "public", full: bool = False):
+        """
+        Generate the HTML dashboard, see c7n_broom.dashboard.
+        Only pages of jobs whose query data changed are written again, unless full.
+        """
+        filelist = deque(
+            map(
+                str,
+                c7n_broom.dashboard.build(
+                    self.jobs, data_path=self.data_dir, output_path=html_dir, full=full
+                ),
+            )
+        )
+        _LOGGER.info("%s dashboard pages written", len(filelist))
+        return filelist
+
+    @property
+    def index_file(self) -> Path:
+        """ Path of the resource index for data_dir """
+        return Path(self.data_dir).joinpath(c7n_broom.index.INDEX_FILE)
+
+    def update_index(self) -> Tuple[int, int]:
+        """
+        Index resource ids in the query data of all jobs. Only changed files are re-read.
+        Returns the number of files re-indexed and the number of files removed from the index.
+        """
+        with c7n_broom.index.ResourceIndex(self.index_file) as index:
+            return index.update(self.jobs, data_path=self.data_dir)
+
+    def lookup(self, resource_id: str) -> Sequence[Dict[str, Any]]:
+        """ Returns the account, region, policy, data file and offset a resource was found in """
+        with c7n_broom.index.ResourceIndex(self.index_file) as index:
+            return index.lookup(resource_id)
+
+    def record_history(self, run_id: Optional[str] = None) -> int:
+        """
+        Store the current query data in the history database.
+        Returns the number of rows stored.
+        """
+        if not self.history_file:
+            raise RuntimeError("history_file is not set.")
+        if not run_id:
+            run_id = storage.new_run_id()
+        data_dir = storage.run_dir(self.data_dir, run_id)
+        if not data_dir.is_dir():
+            data_dir = self.data_dir
+
+        total = 0
+        with c7n_broom.history.History(self.history_file) as history:
+            for job_ in self.jobs:
+                try:
+                    rows = get_data_map(job_, data_path=data_dir)
+                except RuntimeError as err:
+                    _LOGGER.warning("Skipping history for %s: %s", job_.get_str, err)
+                    continue
+                total += history.ingest(
+                    run_id,
+                    account=str(job_.account_id or job_.profile),
+                    resource_type=str(job_.resource_type),
+                    policy=policy_str(job_),
+                    rows=rows,
+                )
+            if self.history_keep_runs:
+                history.compact(keep_runs=int(self.history_keep_runs))
+        _LOGGER.info("%s rows stored in history for run %s", total, run_id)
+        return total
+
+    def _diff_paths(self, base: Optional[str], head: Optional[str]) -> Tuple[Path, Path]:
+        """
+        Resolve base and head to data directories.
+        Either may be a run id or a path. Defaults to the latest run and the run before it.
+        """
+        runs = storage.list_runs(self.data_dir)
+        if head is None:
+            latest = storage.latest_run_dir(self.data_dir)
+            head = latest.name if latest else (runs[-1] if runs else None)
+        if base is None:
+            previous = [run_ for run_ in runs if head is not None and run_ < head]
+            if not previous:
+                raise RuntimeError(f"No previous run to compare against in {self.data_dir}.")
+            base = previous[-1]
+
+        def to_path(run):
+            return storage.run_dir(self.data_dir, run) if run in runs else Path(run)
+
+        return to_path(base), to_path(head)
+
+    def diff(self, base: Optional[str] = None, head: Optional[str] = None) -> Dict[str, JobDiff]:
+        """
+        Compare query data between two runs for all jobs.
+        Defaults to comparing the latest versioned run with the run before it.
+        """
+        base_path, head_path = self._diff_paths(base, head)
+        _LOGGER.info("Comparing %s to %s", base_path, head_path)
+        rtn = dict()
+        for job_ in self.jobs:
+            try:
+                rtn[job_.get_str] = diff_job(job_, base_path, head_path)
+            except RuntimeError as err:
+                _LOGGER.warning("Skipping diff for %s: %s", job_.get_str, err)
+        return rtn
+
+    def gen_diff_reports(
+        self, base: Optional[str] = None, head: Optional[str] = None, fmt="md", report_dir=None
+    ):
+        """ Generate reports of only the changes between two runs. Markdown by default. """
+        if not report_dir:
+            report_dir = self.report_dir
+        base_path, head_path = self._diff_paths(base, head)
+        writer = partial(
+            c7n_broom.actions.write_diff,
+            base_path=base_path,
+            head_path=head_path,
+            fmt=fmt,
+            output_path=report_dir,
+        )
+        filelist = deque(map(str, filter(None, map(writer, self.jobs))))
+        _LOGGER.info("%s diff report file written", len(filelist))
+        return filelist
 
     def counts(self, grouped=False):
         """ Return count of resources from all jobs """
@@ -0,0 +1,469 @@
+"""
+Live metrics of sweeps.
+Jobs in worker processes send events to a registry in the main process,
+which is shown as a progress line and served in Prometheus text format.
+"""
+import functools
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+from c7n_broom import sessions
+from c7n_broom.actions.helper import account_profile_policy_str
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the job duration histogram buckets
+LATENCY_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+# Seconds between API counts sent by a worker, and between progress lines
+FLUSH_INTERVAL = 1.0
+PROGRESS_INTERVAL = 1.0
+# Seconds between progress lines when not writing to a terminal
+LOG_INTERVAL = 30.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """ Counts of observations per bucket, with their sum """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last count is of observations above every bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """ Add an observation """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        """ Yields the upper bound and the count of observations up to it, of every bucket """
+        total = 0
+        for bound_, count_ in zip((*map(_format_value, self.buckets), "+Inf"), self.counts):
+            total += count_
+            yield bound_, total
+
+
+class Registry:  # pylint: disable=too-many-instance-attributes
+    """
+    Metrics of the jobs of a sweep, updated from events of the jobs.
+    Events are tuples of kind, account, job and a value:
+    * start: a job started
+    * done, failed: a job finished, its duration in seconds
+    * api: API calls, counts by account, service and error code
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.jobs: Counter = Counter()
+        self.running: Dict[str, float] = dict()
+        self.latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.api_calls: Counter = Counter()
+        self.api_errors: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def queue(self, jobs: Iterable[Any]):
+        """ Count jobs as queued """
+        with self._lock:
+            self.jobs["total"] += sum(1 for _ in jobs)
+
+    def handle(self, event: Tuple[str, str, str, Any]):
+        """ Update the metrics with an event """
+        kind, account, job, value = event
+        with self._lock:
+            if kind == "start":
+                self.jobs["started"] += 1
+                self.running[job] = self.clock()
+            elif kind in ("done", "failed"):
+                self.jobs[kind] += 1
+                self.running.pop(job, None)
+                self.latency[account].observe(value)
+            elif kind == "api":
+                for (account_, service_, code_), count_ in value.items():
+                    self.api_calls[(account_, service_)] += count_
+                    if code_:
+                        self.api_errors[(account_, service_, code_)] += count_
+            else:
+                _LOGGER.warning("Unknown metrics event %s", kind)
+
+    def states(self) -> Dict[str, int]:
+        """ Number of jobs by state """
+        with self._lock:
+            started = self.jobs["started"]
+            return {
+                "queued": max(self.jobs["total"] - started, 0),
+                "running": started - self.jobs["done"] - self.jobs["failed"],
+                "done": self.jobs["done"],
+                "failed": self.jobs["failed"],
+            }
+
+    def throughput(self) -> float:
+        """ Jobs finished per minute since the registry was created """
+        elapsed = self.clock() - self.started
+        with self._lock:
+            finished = self.jobs["done"] + self.jobs["failed"]
+        return finished * 60 / elapsed if elapsed > 0 else 0.0
+
+    def longest_running(self) -> Optional[Tuple[str, float]]:
+        """ The job running the longest and its seconds running, None if none are """
+        now = self.clock()
+        with self._lock:
+            if not self.running:
+                return None
+            job, started = min(self.running.items(), key=lambda item_: item_[1])
+        return job, now - started
+
+    def hot_accounts(self, count: int = 5) -> List[Tuple[str, float]]:
+        """ Accounts with the most seconds spent in finished jobs """
+        with self._lock:
+            totals = [(account_, hist_.sum) for account_, hist_ in self.latency.items()]
+        return sorted(totals, key=lambda item_: -item_[1])[:count]
+
+    def progress(self) -> str:
+        """ One line summary of the sweep """
+        states = self.states()
+        with self._lock:
+            calls, errors = sum(self.api_calls.values()), sum(self.api_errors.values())
+        parts = [
+            f"{states['done'] + states['failed']}/{sum(states.values())} jobs"
+            f" ({states['failed']} failed, {states['running']} running,"
+            f" {states['queued']} queued)",
+            f"{self.throughput():.1f} jobs/min",
+            f"{calls} API calls, {errors} errors",
+        ]
+        longest = self.longest_running()
+        if longest:
+            parts.append(f"longest {longest[0]} {longest[1]:.0f}s")
+        return " | ".join(parts)
+
+    def to_prometheus(self) -> str:
+        """ Metrics in Prometheus text format """
+        lines = list()
+
+        def metric(name: str, kind: str, description: str, samples: Iterable[Tuple[Any, Any]]):
+            lines.append(f"# HELP c7n_broom_{name} {description}")
+            lines.append(f"# TYPE c7n_broom_{name} {kind}")
+            for labels_, value_ in samples:
+                lines.append(f"c7n_broom_{name}{_labels(labels_)} {_format_value(value_)}")
+
+        metric(
+            "jobs",
+            "gauge",
+            "Jobs of the sweep by state",
+            ((dict(state=state_), count_) for state_, count_ in self.states().items()),
+        )
+        metric(
+            "jobs_per_minute",
+            "gauge",
+            "Jobs finished per minute since the sweep started",
+            [(dict(), self.throughput())],
+        )
+        longest = self.longest_running()
+        metric(
+            "longest_running_seconds",
+            "gauge",
+            "Seconds the longest running job has been running",
+            [(dict(job=longest[0]), longest[1])] if longest else [(dict(), 0)],
+        )
+        with self._lock:
+            latency = sorted(self.latency.items())
+            api_calls = sorted(self.api_calls.items())
+            api_errors = sorted(self.api_errors.items())
+        name = "job_duration_seconds"
+        lines.append(f"# HELP c7n_broom_{name} Duration of finished jobs per account")
+        lines.append(f"# TYPE c7n_broom_{name} histogram")
+        for account_, hist_ in latency:
+            for bound_, count_ in hist_.cumulative():
+                lines.append(
+                    f"c7n_broom_{name}_bucket{_labels(dict(account=account_, le=bound_))}"
+                    f" {count_}"
+                )
+            lines.append(f"c7n_broom_{name}_sum{_labels(dict(account=account_))} {hist_.sum}")
+            lines.append(
+                f"c7n_broom_{name}_count{_labels(dict(account=account_))} {hist_.count}"
+            )
+        metric(
+            "api_calls_total",
+            "counter",
+            "API calls per account and service",
+            ((dict(account=key_[0], service=key_[1]), val_) for key_, val_ in api_calls),
+        )
+        metric(
+            "api_errors_total",
+            "counter",
+            "API errors per account, service and error code",
+            (
+                (dict(account=key_[0], service=key_[1], code=key_[2]), val_)
+                for key_, val_ in api_errors
+            ),
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    escaped = map(
+        lambda item_: '{}="{}"'.format(
+            item_[0],
+            str(item_[1]).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        ),
+        labels.items(),
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Reporter:
+    """
+    Sends the events of jobs in a worker process to the queue of a registry.
+    API calls are counted locally and sent at most every FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self, queue, clock: Callable[[], float] = time.monotonic):
+        self.queue = queue
+        self.clock = clock
+        self._api: Counter = Counter()
+        self._flushed = clock()
+        self._lock = threading.Lock()
+
+    def send(self, kind: str, account: str, job: str = "", value: Any = None):
+        """ Send an event """
+        self.queue.put((kind, account, job, value))
+
+    def count_call(self, account: str, service: str, error: Optional[str] = None):
+        """ Count an API call, and its error code """
+        with self._lock:
+            self._api[(account, service, error or "")] += 1
+            due = self.clock() - self._flushed >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        """ Send the API calls counted since the last flush """
+        with self._lock:
+            counts, self._api = self._api, Counter()
+            self._flushed = self.clock()
+        if counts:
+            self.send("api", "", value=dict(counts))
+
+
+# Reporter of the jobs running in this process
+_REPORTER: Optional[Reporter] = None
+_ACTIVATE_LOCK = threading.Lock()
+
+
+def _activate(queue) -> Reporter:
+    """ Returns the reporter to queue, counting the API calls of sessions c7n creates """
+    global _REPORTER  # pylint: disable=global-statement
+    with _ACTIVATE_LOCK:
+        if _REPORTER is None or _REPORTER.queue is not queue:
+            if _REPORTER is not None:
+                _REPORTER.flush()
+            _REPORTER = Reporter(queue)
+        sessions.register(__name__, _attach)
+        return _REPORTER
+
+
+def _deactivate():
+    """ Stop reporting from this process """
+    global _REPORTER  # pylint: disable=global-statement
+    with _ACTIVATE_LOCK:
+        sessions.unregister(__name__)
+        if _REPORTER is not None:
+            _REPORTER.flush()
+        _REPORTER = None
+
+
+def _attach(session, profile: str):
+    """ Register handlers counting the API calls of a boto3 session, once per session """
+    account = sessions.account(profile)
+    for event_, handler_ in (
+        ("after-call.*.*", functools.partial(_after_call, account)),
+        ("after-call-error.*.*", functools.partial(_after_call_error, account)),
+    ):
+        session.events.register(event_, handler_, unique_id=f"{__name__}.{event_}")
+    return session
+
+
+def _after_call(account, model, parsed, **_):
+    reporter = _REPORTER
+    if reporter is not None:
+        error = (parsed or dict()).get("Error") or dict()
+        reporter.count_call(account(), model.service_model.service_name, error.get("Code"))
+
+
+def _after_call_error(account, model, exception, **_):
+    reporter = _REPORTER
+    if reporter is not None:
+        reporter.count_call(
+            account(), model.service_model.service_name, type(exception).__name__
+        )
+
+
+class Tracked:  # pylint: disable=too-few-public-methods
+    """
+    Wraps an action, reporting its jobs and their API calls to the queue of a registry.
+    A class rather than a closure, so that process pools can pickle it.
+    """
+
+    def __init__(self, action: Callable[[Any], Any], queue):
+        self.action = action
+        self.queue = queue
+
+    def __call__(self, job):
+        reporter = _activate(self.queue)
+        account = str(job.account_id or job.profile)
+        sessions.set_account(job.profile, account)
+        job_str = account_profile_policy_str(job)
+        reporter.send("start", account, job_str)
+        start = time.perf_counter()
+        try:
+            rtn = self.action(job)
+        except (Exception, SystemExit):
+            # c7n exits when a policy fails
+            reporter.flush()
+            reporter.send("failed", account, job_str, time.perf_counter() - start)
+            raise
+        reporter.flush()
+        reporter.send("done", account, job_str, time.perf_counter() - start)
+        return rtn
+
+
+class Progress:
+    """ Writes the progress of a registry to a stream, in place on terminals """
+
+    def __init__(
+        self,
+        registry: Registry,
+        stream: Optional[TextIO] = None,
+        interval: float = PROGRESS_INTERVAL,
+    ):
+        self.registry = registry
+        self.stream = stream or sys.stderr
+        self.tty = self.stream.isatty()
+        self.interval = interval if self.tty else max(interval, LOG_INTERVAL)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def render(self):
+        """ Write the progress line """
+        line = self.registry.progress()
+        self.stream.write(f"\r\033[K{line}" if self.tty else f"{line}\n")
+        self.stream.flush()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.render()
+
+    def start(self) -> "Progress":
+        """ Write progress every interval until stopped """
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop and write the final progress """
+        self._stop.set()
+        self._thread.join()
+        self.render()
+        if self.tty:
+            self.stream.write("\n")
+
+
+def serve(registry: Registry, port: int = 0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve the metrics of registry in Prometheus text format on host and port,
+    from a daemon thread. Port 0 picks a free port, see server_address.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        """ GET /metrics """
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """ Respond with the metrics, or 404 for other paths """
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            _LOGGER.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _LOGGER.info("Serving metrics on http://%s:%s/metrics", *server.server_address[:2])
+    return server
+
+
+def _collect(registry: Registry, queue):
+    for event_ in iter(queue.get, None):
+        registry.handle(event_)
+
+
+@contextmanager
+def live(
+    registry: Optional[Registry] = None,
+    port: Optional[int] = None,
+    progress: bool = False,
+    stream: Optional[TextIO] = None,
+) -> Iterator[Tuple[Registry, Any]]:
+    """
+    Collect the events of jobs from any process into registry while in the context.
+    Yields the registry and the queue to pass to Tracked.
+    port: Serve the metrics in Prometheus text format on this port.
+    progress: Write progress to stream, stderr by default.
+    """
+    from multiprocessing import Manager  # pylint: disable=import-outside-toplevel
+
+    registry = registry or Registry()
+    with Manager() as manager:
+        queue = manager.Queue()
+        collector = threading.Thread(target=_collect, args=(registry, queue), daemon=True)
+        collector.start()
+        server = serve(registry, port) if port is not None else None
+        display = Progress(registry, stream).start() if progress else None
+        try:
+            yield registry, queue
+        finally:
+            _deactivate()
+            queue.put(None)
+            collector.join()
+            if display:
+                display.stop()
+            if server:
+                server.shutdown()
+                server.server_close()
+            _LOGGER.info("%s", registry.progress())
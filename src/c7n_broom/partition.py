@@ -0,0 +1,128 @@
+""" Partition jobs into balanced shards for worker processes """
+import heapq
+import json
+import logging
+import time
+from collections import defaultdict
+from os import PathLike
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from c7n_broom.actions.report import datafile_path
+from c7n_broom.storage import atomic_write_text
+
+
+_LOGGER = logging.getLogger(__name__)
+
+STATS_FILE = "job_stats.json"
+
+# Estimated seconds per region to run a policy, relative to its resource type.
+# Used until a job has recorded durations.
+DEFAULT_COST = 10.0
+RESOURCE_TYPE_COSTS = {
+    "ami": 20.0,
+    "asg": 10.0,
+    "ebs": 15.0,
+    "ebs-snapshot": 40.0,
+    "ec2": 15.0,
+    "launch-config": 10.0,
+    "rds": 10.0,
+    "rds-cluster-snapshot": 15.0,
+    "rds-snapshot": 20.0,
+}
+# Estimated seconds per byte of previous query data for a job without recorded durations.
+COST_PER_BYTE = 1e-6
+# Weight of the newest duration in the moving average.
+SMOOTHING = 0.5
+
+
+def heuristic_cost(job, data_path: Optional[Union[PathLike, str]] = None) -> float:
+    """
+    Estimate the cost of a job from its resource type, number of regions
+    and the size of its previous query data.
+    """
+    cost = RESOURCE_TYPE_COSTS.get(job.resource_type, DEFAULT_COST) * max(len(job.regions), 1)
+    if data_path is not None:
+        datafile = datafile_path(job, data_path)
+        if datafile.is_file():
+            cost += datafile.stat().st_size * COST_PER_BYTE
+    return cost
+
+
+class JobStats:
+    """ Historical job durations, stored as JSON """
+
+    def __init__(self, path: Union[PathLike, str], data_path=None):
+        self.path = Path(path)
+        self.data_path = data_path
+        self.durations: Dict[str, float] = dict()
+        if self.path.is_file():
+            try:
+                self.durations = json.loads(self.path.read_text())
+            except ValueError:
+                _LOGGER.warning("Ignoring unreadable job stats %s", self.path)
+
+    def estimate(self, job) -> float:
+        """ Returns the expected duration of a job in seconds """
+        duration = self.durations.get(job.get_str)
+        return duration if duration is not None else heuristic_cost(job, self.data_path)
+
+    def record(self, durations: Iterable[Tuple[str, float, bool]]):
+        """
+        Add measured durations to the moving averages.
+        Durations of failed jobs are left out, they are no measure of a full run.
+        """
+        for job_str, duration, succeeded in durations:
+            if not succeeded:
+                continue
+            previous = self.durations.get(job_str, duration)
+            self.durations[job_str] = SMOOTHING * duration + (1 - SMOOTHING) * previous
+
+    def save(self):
+        """ Write stats to path """
+        atomic_write_text(self.path, json.dumps(self.durations, indent=2, sort_keys=True))
+
+
+def partition(
+    jobs: Iterable[Any], workers: int, cost: Callable[[Any], float]
+) -> List[List[Any]]:
+    """
+    Pack jobs into at most workers shards with balanced total cost,
+    assigning the most expensive jobs first to the least loaded shard.
+    """
+    ranked = sorted(jobs, key=cost, reverse=True)
+    shards: List[List[Any]] = [list() for _ in range(max(min(workers, len(ranked)), 1))]
+    loads = [(0.0, idx_) for idx_ in range(len(shards))]
+    for job_ in ranked:
+        load, idx_ = heapq.heappop(loads)
+        shards[idx_].append(job_)
+        heapq.heappush(loads, (load + cost(job_), idx_))
+    return [shard_ for shard_ in shards if shard_]
+
+
+def makespan(shards: Sequence[Sequence[Any]], cost: Callable[[Any], float]) -> float:
+    """ Returns the cost of the most expensive shard """
+    return max((sum(map(cost, shard_)) for shard_ in shards), default=0.0)
+
+
+def timed(action: Callable[[Any], Any], job) -> Tuple[str, float, bool]:
+    """
+    Run action for job and return its duration and whether it succeeded.
+    Errors are logged, not raised.
+    c7n exits when a policy fails, which is logged as a failed job as well.
+    """
+    start = time.perf_counter()
+    try:
+        action(job)
+    except (Exception, SystemExit):  # pylint: disable=broad-except
+        _LOGGER.exception("Job failed %s", job.get_str)
+        return job.get_str, time.perf_counter() - start, False
+    return job.get_str, time.perf_counter() - start, True
+
+
+def by_account(jobs: Iterable[Any]) -> Dict[str, List[Any]]:
+    """ Group jobs by account, keeping accounts in separate thread pools """
+    rtn = defaultdict(list)
+    for job_ in jobs:
+        rtn[str(job_.account_id)].append(job_)
+    return rtn
@@ -0,0 +1,303 @@
+"""
+Registry of descriptions of resources used in report generation.
+Loaded from resource_keys.yml, plugins of the c7n_broom.resource_keys entry point group
+and user definition files, falling back to the metadata of c7n resources.
+"""
+import dataclasses
+import keyword
+import logging
+import os
+import threading
+from collections import UserDict
+from dataclasses import asdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterator, Mapping, NamedTuple, Optional, Tuple
+
+import jmespath
+import yaml
+from jmespath.exceptions import JMESPathError
+
+from c7n_broom.rows import row_factory
+
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULTS_FILE = Path(__file__).with_name("resource_keys.yml")
+ENTRY_POINT_GROUP = "c7n_broom.resource_keys"
+# Definition files loaded after the defaults and plugins, separated by os.pathsep
+ENV_VAR = "C7N_BROOM_RESOURCE_KEYS"
+SKIP = "SKIP"
+# Fields kept in projected query data besides those of the resource key
+PROJECTED_FIELDS = ("policy", "region")
+
+
+class ResourceKeyDict(UserDict):  # pylint: disable=too-many-ancestors
+    """ Custom dict for ResourceKey """
+
+    def __str__(self) -> str:
+        """ Formatted to be passed into jmespath """
+        return ", ".join(map(lambda item: f"{item[0]}: {item[1]}", self.items()))
+
+
+@dataclasses.dataclass(eq=True, frozen=True)
+class ResourceKey:  # pylint: disable=too-many-instance-attributes
+    """ Data structure for descriptions of resources used in report generation """
+
+    id: str  # pylint: disable=invalid-name
+    name: str = SKIP
+    type: str = SKIP
+    size: str = SKIP
+    region: str = "region"
+    date: str = SKIP
+    tags: str = "Tags"
+    extras: Tuple[Tuple[str, str], ...] = dataclasses.field(default_factory=tuple)
+
+    @property
+    def data(self) -> ResourceKeyDict:
+        """ Return an "expanded" version of the resource key """
+        rtn_data = dict(filter(lambda item_: item_[1] != SKIP, asdict(self).items()))
+        rtn_data.update(rtn_data.pop("extras"))
+        return ResourceKeyDict(rtn_data)
+
+    @classmethod
+    def from_data(cls, data: Mapping[str, Any]) -> "ResourceKey":
+        """
+        From a definition mapping fields to jmespath expressions, extras may be a mapping.
+        Raises ValueError if the definition is invalid.
+        """
+        if not isinstance(data, Mapping):
+            raise ValueError(f"expected a mapping, got {type(data).__name__}")
+        unknown = set(data).difference(field_.name for field_ in dataclasses.fields(cls))
+        if unknown:
+            raise ValueError(f"unknown fields {', '.join(sorted(unknown))}")
+        if not data.get("id") or data["id"] == SKIP:
+            raise ValueError("id is required")
+        extras = data.get("extras") or dict()
+        if isinstance(extras, Mapping):
+            extras = extras.items()
+        resource_key = cls(
+            **{key_: value_ for key_, value_ in data.items() if key_ != "extras"},
+            extras=tuple((str(key_), value_) for key_, value_ in extras),
+        )
+        for field_, expression_ in resource_key.data.items():
+            # Fields are the attributes of rows, see c7n_broom.rows
+            if not field_.isidentifier() or keyword.iskeyword(field_) or field_.startswith("_"):
+                raise ValueError(f"{field_} is not a valid field name")
+            if not isinstance(expression_, str):
+                raise ValueError(f"{field_} is not an expression")
+            try:
+                jmespath.compile(expression_)
+            except JMESPathError as err:
+                raise ValueError(f"{field_}: {err}") from None
+        return resource_key
+
+
+class CompiledKey(NamedTuple):
+    """ Expressions of a resource key compiled once for reports, counts, diffs and indexing """
+
+    id: Any  # pylint: disable=invalid-name
+    item: Any
+    to_row: Callable[[Dict[str, Any]], Any]
+    fields: Optional[FrozenSet[str]]
+    sort_key: Optional[Callable[[Any], Any]]
+
+
+def _root_field(node: Dict[str, Any]) -> Optional[str]:
+    """ Returns the top level field a jmespath expression reads from, if it reads one """
+    if node["type"] == "field":
+        return node["value"]
+    if node["type"] in ("subexpression", "index_expression", "projection") and node["children"]:
+        return _root_field(node["children"][0])
+    return None
+
+
+def _projected_fields(resource_key: ResourceKey) -> Optional[FrozenSet[str]]:
+    fields = set(PROJECTED_FIELDS)
+    for expression_ in resource_key.data.values():
+        field_ = _root_field(jmespath.compile(expression_).parsed)
+        if field_ is None:
+            return None
+        fields.add(field_)
+    return frozenset(fields)
+
+
+def _date_key(row) -> Tuple[bool, Any]:
+    """ Sort by date, resources without one last """
+    return (row.date is None, 0 if row.date is None else row.date)
+
+
+@lru_cache(maxsize=None)
+def compile_key(resource_key: ResourceKey) -> CompiledKey:
+    """ Returns the compiled expressions of resource_key """
+    data = resource_key.data
+    return CompiledKey(
+        id=jmespath.compile(resource_key.id),
+        item=jmespath.compile(f"{{{data}}}"),
+        to_row=row_factory(resource_key),
+        fields=_projected_fields(resource_key),
+        sort_key=_date_key if "date" in data else None,
+    )
+
+
+def _expression(field: str) -> str:
+    """ A c7n metadata field as a jmespath expression, quoted if it is not one """
+    try:
+        jmespath.compile(field)
+    except JMESPathError:
+        return '"{}"'.format(field.replace('"', '\\"'))
+    return field
+
+
+def from_c7n(resource_type: str) -> Optional[ResourceKey]:
+    """ Returns a resource key from the metadata of the AWS c7n resource, if it exists """
+    # pylint: disable=import-outside-toplevel
+    from c7n.provider import get_resource_class
+    from c7n.resources import load_resources
+
+    name = f"aws.{resource_type}"
+    try:
+        load_resources((name,))
+        info = get_resource_class(name).resource_type
+    except (KeyError, ValueError):
+        return None
+    if not getattr(info, "id", None):
+        return None
+    name_field = getattr(info, "name", None)
+    date_field = getattr(info, "date", None)
+    return ResourceKey(
+        id=_expression(info.id),
+        name=_expression(name_field) if name_field and name_field != info.id else SKIP,
+        date=_expression(date_field) if date_field else SKIP,
+    )
+
+
+def _entry_points():
+    try:
+        from importlib import metadata  # pylint: disable=import-outside-toplevel
+    except ImportError:  # Python 3.7
+        import importlib_metadata as metadata  # pylint: disable=import-outside-toplevel
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return entry_points.select(group=ENTRY_POINT_GROUP)
+    return entry_points.get(ENTRY_POINT_GROUP, ())
+
+
+def normalize_type(resource_type: str) -> str:
+    """ Resource type without the provider, aws.ebs-snapshot and ebs_snapshot are ebs-snapshot """
+    resource_type = resource_type.replace("_", "-")
+    return resource_type[len("aws.") :] if resource_type.startswith("aws.") else resource_type
+
+
+class ResourceKeyRegistry:
+    """
+    Resource keys by c7n resource type.
+    Definitions are validated and compiled when loaded, later definitions of a type win.
+    """
+
+    def __init__(self, c7n_fallback: bool = True):
+        self.c7n_fallback = c7n_fallback
+        self._keys: Dict[str, ResourceKey] = dict()
+        self._missing = set()
+
+    def __contains__(self, resource_type: str) -> bool:
+        return self.get(resource_type) is not None
+
+    def __getitem__(self, resource_type: str) -> ResourceKey:
+        resource_key = self.get(resource_type)
+        if resource_key is None:
+            raise KeyError(resource_type)
+        return resource_key
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self._keys))
+
+    def register(self, resource_type: str, resource_key: ResourceKey) -> ResourceKey:
+        """ Add or replace the resource key of resource_type """
+        resource_type = normalize_type(resource_type)
+        compile_key(resource_key)
+        self._keys[resource_type] = resource_key
+        self._missing.discard(resource_type)
+        return resource_key
+
+    def load_data(self, data: Mapping[str, Any], source: str = "") -> None:
+        """ Load definitions mapping resource types to resource keys """
+        if not isinstance(data, Mapping):
+            raise ValueError(f"Invalid resource keys {source}: expected a mapping")
+        loaded = dict()
+        for resource_type_, definition_ in data.items():
+            if isinstance(definition_, ResourceKey):
+                loaded[resource_type_] = definition_
+                continue
+            try:
+                loaded[resource_type_] = ResourceKey.from_data(definition_)
+            except (TypeError, ValueError) as err:
+                raise ValueError(
+                    f"Invalid resource key {resource_type_} {source}: {err}"
+                ) from None
+        for resource_type_, resource_key_ in loaded.items():
+            self.register(resource_type_, resource_key_)
+        _LOGGER.debug("Loaded %s resource keys %s", len(loaded), source)
+
+    def load_file(self, path: os.PathLike) -> None:
+        """ Load definitions from a YAML or JSON file """
+        path = Path(path).expanduser()
+        self.load_data(yaml.safe_load(path.read_text()) or dict(), source=str(path))
+
+    def load_entry_points(self) -> None:
+        """
+        Load plugins of the c7n_broom.resource_keys entry point group.
+        An entry point is a mapping of definitions, the path of a definition file
+        or a callable returning either.
+        """
+        for entry_point_ in _entry_points():
+            try:
+                value = entry_point_.load()
+                if callable(value):
+                    value = value()
+                if isinstance(value, (str, os.PathLike)):
+                    self.load_file(value)
+                else:
+                    self.load_data(value, source=entry_point_.name)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.warning("Skipping resource keys of %s", entry_point_.name, exc_info=True)
+
+    def get(self, resource_type: str) -> Optional[ResourceKey]:
+        """ Returns the resource key of resource_type, from c7n if it is not defined """
+        resource_type = normalize_type(resource_type)
+        resource_key = self._keys.get(resource_type)
+        if resource_key or not self.c7n_fallback or resource_type in self._missing:
+            return resource_key
+        resource_key = from_c7n(resource_type)
+        if resource_key is None:
+            self._missing.add(resource_type)
+            return None
+        _LOGGER.debug("Resource key of %s from c7n: %s", resource_type, resource_key.data)
+        return self.register(resource_type, resource_key)
+
+    def compiled(self, resource_type: str) -> CompiledKey:
+        """ Returns the compiled expressions of resource_type, raises KeyError if undefined """
+        return compile_key(self[resource_type])
+
+
+_REGISTRY: Optional[ResourceKeyRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def registry() -> ResourceKeyRegistry:
+    """
+    Returns the default registry, loading the definitions on first use.
+    Jobs in thread pools share it, it is only published once loaded.
+    """
+    global _REGISTRY  # pylint: disable=global-statement
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                loading = ResourceKeyRegistry()
+                loading.load_file(DEFAULTS_FILE)
+                loading.load_entry_points()
+                for path_ in filter(None, os.environ.get(ENV_VAR, "").split(os.pathsep)):
+                    loading.load_file(path_)
+                _REGISTRY = loading
+    return _REGISTRY
@@ -0,0 +1,115 @@
+""" Compact rows of query data for reports and counts """
+import sys
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import jmespath
+
+
+# Fields with few distinct values, interned so rows share one copy of each
+INTERNED_FIELDS = frozenset(("region", "type"))
+# Distinct sets of tags shared between rows
+TAGS_CACHE_SIZE = 4096
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Tags(tuple):
+    """ Tags of a resource as (key, value) pairs, with interned strings """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_data(cls, tags) -> "Tags":
+        """
+        From a list of Key/Value dicts, as returned by AWS, or a dict.
+        Resources with the same tags share one Tags.
+        """
+        if not tags:
+            return EMPTY_TAGS
+        if isinstance(tags, dict):
+            pairs = tuple(tags.items())
+        else:
+            pairs = tuple((tag_["Key"], tag_["Value"]) for tag_ in tags)
+        return _shared_tags(pairs)
+
+    def get(self, key: str, default=None):
+        """ Returns the value of tag key """
+        return next((value_ for key_, value_ in self if key_ == key), default)
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            return super().__getitem__(key)
+        for key_, value_ in self:
+            if key_ == key:
+                return value_
+        raise KeyError(key)
+
+    def __str__(self):
+        return str(dict(self))
+
+
+EMPTY_TAGS = Tags()
+
+
+@lru_cache(maxsize=TAGS_CACHE_SIZE)
+def _shared_tags(pairs: Tuple[Tuple[str, str], ...]) -> Tags:
+    return Tags((_intern(key_), _intern(value_)) for key_, value_ in pairs)
+
+
+class RowMixin:
+    """ Mapping style access to the fields of a row, as used with dicts of query data """
+
+    __slots__ = ()
+    _fields: Tuple[str, ...]
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return super().__getitem__(key)  # type: ignore
+
+    def get(self, key: str, default=None):
+        """ Returns the value of field key """
+        return getattr(self, key, default)
+
+    def keys(self) -> Tuple[str, ...]:
+        """ Field names """
+        return self._fields
+
+    def as_dict(self) -> Dict[str, Any]:
+        """ Returns a dict of the row """
+        return dict(zip(self._fields, self))
+
+
+@lru_cache(maxsize=None)
+def row_type(fields: Tuple[str, ...]) -> type:
+    """ Returns a tuple type with __slots__ and the named fields """
+    return type("Row", (RowMixin, namedtuple("Row", fields)), {"__slots__": ()})
+
+
+@lru_cache(maxsize=None)
+def row_factory(resource_key) -> Callable[[Dict[str, Any]], Any]:
+    """ Returns a function creating a row of the fields of resource_key from a resource """
+    data = resource_key.data
+    fields = tuple(data.keys())
+    expression = jmespath.compile(f"[{', '.join(data.values())}]")
+    # Row types are created with type(), pylint does not see the members of their namedtuple
+    make = row_type(fields)._make  # pylint: disable=no-member
+    converters: Tuple[Optional[Callable[[Any], Any]], ...] = tuple(
+        Tags.from_data if field_ == "tags" else (_intern if field_ in INTERNED_FIELDS else None)
+        for field_ in fields
+    )
+
+    def to_row(item: Dict[str, Any]):
+        return make(
+            convert_(value_) if convert_ else value_
+            for convert_, value_ in zip(converters, expression.search(item))
+        )
+
+    return to_row
@@ -0,0 +1,60 @@
+"""
+Hooks on the boto3 sessions c7n creates.
+c7n's SessionFactory is wrapped once per process, so that modules can register handlers
+on the events of every session it creates or updates.
+"""
+import functools
+import threading
+from typing import Any, Callable, Dict
+
+
+# Account ids by profile, accounts without one are named by profile
+ACCOUNTS: Dict[str, str] = dict()
+_HOOKS: Dict[str, Callable[[Any, str], Any]] = dict()
+_LOCK = threading.Lock()
+
+
+def set_account(profile: str, account_id: str):
+    """ Name the account of sessions of profile """
+    ACCOUNTS[profile] = account_id
+
+
+def account(profile: str) -> Callable[[], str]:
+    """ Returns a callable of the account of profile, resolved when called """
+    return functools.partial(ACCOUNTS.get, profile, profile)
+
+
+def register(name: str, attach: Callable[[Any, str], Any]):
+    """
+    Call attach with every session c7n creates or updates in this process, and its profile,
+    until unregistered. Registering a name again replaces its hook.
+    c7n updates cached sessions for every policy, attach should only register handlers once.
+    """
+    # pylint: disable=import-outside-toplevel
+    from c7n.credentials import SessionFactory
+
+    with _LOCK:
+        _HOOKS[name] = attach
+        if not getattr(SessionFactory.update, "hooked", False):
+            SessionFactory.update = _hooked(SessionFactory.update)
+
+
+def unregister(name: str):
+    """ Stop calling the hook of name for new sessions """
+    with _LOCK:
+        _HOOKS.pop(name, None)
+
+
+def _hooked(update):
+    @functools.wraps(update)
+    def wrapper(factory, session):
+        session = update(factory, session)
+        profile = factory.profile or factory.assume_role or ""
+        with _LOCK:
+            hooks = list(_HOOKS.values())
+        for attach_ in hooks:
+            attach_(session, profile)
+        return session
+
+    wrapper.hooked = True  # type: ignore
+    return wrapper
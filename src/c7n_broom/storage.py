@@ -0,0 +1,239 @@
+""" Safe file storage for query data and reports """
+import codecs
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager, suppress
+from datetime import datetime, timezone
+from os import PathLike
+from pathlib import Path
+from typing import IO, Any, Iterator, Optional, Sequence, Tuple, Union
+
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+_LOGGER = logging.getLogger(__name__)
+
+LATEST = "latest"
+RUNS = "runs"
+_DELIMITER = re.compile(r"[ \t\r\n]*[,\]]")
+
+
+@contextmanager
+def atomic_open(
+    path: Union[PathLike, str], mode: str = "wt", encoding: Optional[str] = None
+) -> Iterator[IO]:
+    """
+    Open a temporary file next to path and rename it over path on success.
+    Readers only ever see the previous or the complete new file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd_, tmpname = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd_, mode, encoding=encoding) as file_:
+            yield file_
+            file_.flush()
+            os.fsync(file_.fileno())
+        # mkstemp creates files readable only by the owner
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmpname, 0o666 & ~umask)
+        os.replace(tmpname, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmpname)
+        raise
+
+
+def atomic_write_text(path: Union[PathLike, str], data: str) -> Path:
+    """ Atomically write text to path """
+    with atomic_open(path, mode="wt") as file_:
+        file_.write(data)
+    return Path(path)
+
+
+@contextmanager
+def file_lock(path: Union[PathLike, str], enabled: bool = True) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock for path.
+    The lock is taken on a sibling ".lock" file so path itself can be replaced.
+    """
+    if not enabled:
+        yield
+        return
+    if fcntl is None:
+        _LOGGER.warning("File locking is not supported on this platform.")
+        yield
+        return
+
+    lockfile = Path(path).with_name(f"{Path(path).name}.lock")
+    lockfile.parent.mkdir(parents=True, exist_ok=True)
+    with lockfile.open(mode="a") as lock_fd:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
+
+def _is_delimited(buffer: str, end: int) -> bool:
+    """ Whether the item of a JSON array ending at end is followed by a comma or the array end """
+    return bool(_DELIMITER.match(buffer, end))
+
+
+def iter_records(
+    path: Union[PathLike, str], chunk_size: int = 1 << 20
+) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield (offset, item) for each item of a JSON array file without loading the whole file.
+    Offsets are byte positions, see read_record.
+    """
+    decoder = json.JSONDecoder()
+    whitespace = " \t\r\n,"
+    with Path(path).open(mode="rb") as file_:
+        text = codecs.getincrementaldecoder("utf-8")()
+        # Byte offset of buffer[mark]
+        buffer, pos, mark, mark_offset = "", 0, 0, 0
+        started, eof = False, False
+
+        def read_more():
+            nonlocal buffer, pos, mark, mark_offset, eof
+            chunk = file_.read(chunk_size)
+            eof = not chunk
+            mark_offset += len(buffer[mark:pos].encode("utf-8"))
+            buffer, pos, mark = buffer[pos:] + text.decode(chunk, final=eof), 0, 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in whitespace:
+                pos += 1
+            if pos == len(buffer):
+                if eof:
+                    return
+                read_more()
+                continue
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"Expected a JSON array in {path}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read_more()
+                continue
+            if not _is_delimited(buffer, end) and not eof:
+                # A number may continue in the next chunk
+                read_more()
+                continue
+            mark_offset += len(buffer[mark:pos].encode("utf-8"))
+            mark = pos
+            yield mark_offset, item
+            pos = end
+
+
+def read_record(path: Union[PathLike, str], offset: int) -> Any:
+    """ Read the item of a JSON array file starting at byte offset """
+    with Path(path).open(mode="rb") as file_:
+        file_.seek(offset)
+        text = codecs.getincrementaldecoder("utf-8")()
+        decoder = json.JSONDecoder()
+        buffer = ""
+        while True:
+            chunk = file_.read(1 << 16)
+            buffer += text.decode(chunk, final=not chunk)
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                continue
+            # A number may continue in the next chunk
+            if _is_delimited(buffer, end) or not chunk:
+                return item
+
+
+def link_or_copy(src: Union[PathLike, str], dst: Union[PathLike, str]) -> Path:
+    """ Hard link src to dst, copying when linking is not possible """
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    with suppress(FileNotFoundError):
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def new_run_id() -> str:
+    """ Returns a sortable id for a new run """
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def run_dir(data_dir: Union[PathLike, str], run_id: str) -> Path:
+    """ Returns the directory for a run """
+    return Path(data_dir).joinpath(RUNS, run_id)
+
+
+def list_runs(data_dir: Union[PathLike, str]) -> Sequence[str]:
+    """ Returns run ids oldest first """
+    runs = Path(data_dir).joinpath(RUNS)
+    if not runs.is_dir():
+        return list()
+    return sorted(path_.name for path_ in runs.iterdir() if path_.is_dir())
+
+
+def latest_run_dir(data_dir: Union[PathLike, str]) -> Optional[Path]:
+    """ Returns the directory of the latest completed run if there is one """
+    pointer = Path(data_dir).joinpath(LATEST)
+    return pointer.resolve() if pointer.is_dir() else None
+
+
+def resolve_data_dir(data_dir: Union[PathLike, str]) -> Path:
+    """ Returns the latest run directory for versioned layouts, otherwise data_dir """
+    latest = latest_run_dir(data_dir)
+    return latest if latest else Path(data_dir)
+
+
+def promote_run(data_dir: Union[PathLike, str], run_id: str) -> Path:
+    """ Atomically point "latest" at a completed run """
+    pointer = Path(data_dir).joinpath(LATEST)
+    target = Path(RUNS).joinpath(run_id)
+    if not Path(data_dir).joinpath(target).is_dir():
+        raise FileNotFoundError(f"Run does not exist {run_id}")
+
+    tmp_pointer = pointer.with_name(f".{LATEST}.{os.getpid()}.tmp")
+    with suppress(FileNotFoundError):
+        tmp_pointer.unlink()
+    tmp_pointer.symlink_to(target, target_is_directory=True)
+    os.replace(tmp_pointer, pointer)
+    _LOGGER.info("Promoted run %s in %s", run_id, data_dir)
+    return pointer
+
+
+def prune_runs(data_dir: Union[PathLike, str], keep_runs: int) -> Sequence[str]:
+    """ Remove runs beyond the newest keep_runs, never the latest completed one """
+    latest = latest_run_dir(data_dir)
+    expired = [
+        run_
+        for run_ in list_runs(data_dir)[:-keep_runs]
+        if not latest or run_ != latest.name
+    ]
+    for run_ in expired:
+        shutil.rmtree(run_dir(data_dir, run_), ignore_errors=True)
+    if expired:
+        _LOGGER.info("Removed %s runs from %s", len(expired), data_dir)
+    return expired
@@ -0,0 +1,57 @@
+""" Testing c7n_broom.actions.diff """
+# pylint: disable=missing-function-docstring
+import json
+from types import SimpleNamespace
+
+from c7n_broom.actions import diff
+
+
+JOB = SimpleNamespace(
+    profile="prod", configs=("unattached.yml",), resource_type="ebs", get_str="prod:unattached"
+)
+
+
+def _volume(id_, size=1):
+    return {
+        "VolumeId": id_,
+        "VolumeType": "gp2",
+        "Size": size,
+        "CreateTime": "2020-01-01",
+        "region": "us-east-1",
+        "Tags": [{"Key": "Owner", "Value": "me"}],
+    }
+
+
+def _write(path, *volumes):
+    path.mkdir(parents=True)
+    path.joinpath("prod:unattached.json").write_text(json.dumps(volumes, indent=2))
+
+
+def test_010_diff(tmp_path):
+    _write(tmp_path.joinpath("base"), _volume("vol-1"), _volume("vol-2"), _volume("vol-3"))
+    _write(
+        tmp_path.joinpath("head"), _volume("vol-2", size=2), _volume("vol-3"), _volume("vol-4")
+    )
+
+    rtn = diff.diff(JOB, tmp_path.joinpath("base"), tmp_path.joinpath("head"))
+    assert [row_["id"] for row_ in rtn.added] == ["vol-4"]
+    assert [row_["id"] for row_ in rtn.removed] == ["vol-1"]
+    assert [row_["id"] for row_ in rtn.changed] == ["vol-2"]
+    assert rtn.added[0]["tags"] == {"Owner": "me"}
+
+
+def test_020_write(tmp_path):
+    _write(tmp_path.joinpath("base"), _volume("vol-1"))
+    _write(tmp_path.joinpath("head"), _volume("vol-1"), _volume("vol-2"))
+
+    reportfile = diff.write(
+        JOB,
+        tmp_path.joinpath("base"),
+        tmp_path.joinpath("head"),
+        fmt="json",
+        output_path=tmp_path,
+    )
+    assert [row_["id"] for row_ in json.loads(reportfile.read_text())["added"]] == ["vol-2"]
+    assert not diff.write(
+        JOB, tmp_path.joinpath("base"), tmp_path.joinpath("base"), output_path=tmp_path
+    )
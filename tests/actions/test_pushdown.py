@@ -0,0 +1,117 @@
+""" Testing c7n_broom.actions.pushdown and projection """
+# pylint: disable=missing-function-docstring
+import json
+from types import SimpleNamespace
+
+import pytest
+import yaml
+
+from c7n_broom.actions import pushdown
+from c7n_broom.actions.main import _write_data
+from c7n_broom.actions.report import project
+from c7n_broom.config import C7nCfg
+
+
+@pytest.mark.parametrize(
+    "filters,expected",
+    [
+        pytest.param(
+            [{"State": "available"}, {"tag:Owner": "absent"}],
+            [{"Name": "status", "Values": ["available"]}],
+            id="shorthand",
+        ),
+        pytest.param(
+            [{"and": [{"type": "value", "key": "VolumeType", "op": "in", "value": ["gp2"]}]}],
+            [{"Name": "volume-type", "Values": ["gp2"]}],
+            id="and-in",
+        ),
+        pytest.param(
+            [{"tag:Owner": "present"}, {"tag:Team": "ops"}, {"Encrypted": False}],
+            [
+                {"Name": "tag-key", "Values": ["Owner"]},
+                {"Name": "tag:Team", "Values": ["ops"]},
+                {"Name": "encrypted", "Values": ["false"]},
+            ],
+            id="tags-bool",
+        ),
+        pytest.param(
+            [
+                {"type": "value", "key": "CreateTime", "value_type": "age", "value": 30},
+                {"type": "value", "key": "State", "op": "ne", "value": "in-use"},
+                {"or": [{"State": "available"}, {"State": "error"}]},
+                {"State": "not-a-state"},
+            ],
+            None,
+            id="unsupported",
+        ),
+    ],
+)
+def test_010_pushdown_policy(filters, expected):
+    policy = {"name": "unattached", "resource": "ebs", "filters": filters}
+    rtn = pushdown.pushdown_policy(policy)
+    if expected is None:
+        assert rtn is policy
+    else:
+        assert rtn["query"] == [{"Filters": expected}]
+        assert rtn["filters"] == filters
+        assert "query" not in policy
+
+
+def test_020_pushdown_policy_query():
+    policy = {"name": "stopped", "resource": "ec2", "query": [], "filters": [{"State.Name": "x"}]}
+    assert pushdown.pushdown_policy(policy) is policy
+
+
+def test_030_pushdown_config(tmp_path):
+    policy_file = tmp_path.joinpath("unattached.yml")
+    policy = {"name": "unattached", "resource": "ebs", "filters": [{"State": "available"}]}
+    policy_file.write_text(yaml.safe_dump({"policies": [policy]}))
+    c7n_config = C7nCfg(profile="prod", account_id="111", configs=(policy_file,))
+    rtn = pushdown.pushdown_config(c7n_config, tmp_path.joinpath("derived"))
+    assert rtn is not c7n_config
+    assert rtn.get_str == c7n_config.get_str
+    assert c7n_config.configs == (policy_file,)
+    derived = yaml.safe_load(tmp_path.joinpath("derived", "unattached.yml").read_text())
+    assert derived["policies"][0]["query"] == [
+        {"Filters": [{"Name": "status", "Values": ["available"]}]}
+    ]
+
+
+def test_040_project():
+    job = SimpleNamespace(resource_type="ebs")
+    volume = {
+        "VolumeId": "vol-1",
+        "Size": 1,
+        "Attachments": [],
+        "region": "us-east-1",
+        "Tags": [{"Key": "Owner", "Value": "me"}],
+    }
+    assert project(job, [volume]) == [
+        {"VolumeId": "vol-1", "Size": 1, "region": "us-east-1", "Tags": volume["Tags"]}
+    ]
+    assert project(SimpleNamespace(resource_type="unknown"), [volume]) == [volume]
+
+
+def test_050_pushdown_empty_filter():
+    policy = {"name": "unattached", "resource": "ebs", "filters": [{}, {"State": "available"}]}
+    assert pushdown.pushdown_policy(policy)["query"] == [
+        {"Filters": [{"Name": "status", "Values": ["available"]}]}
+    ]
+
+
+def test_060_write_projected_data(tmp_path, monkeypatch):
+    import c7n.commands  # pylint: disable=import-outside-toplevel
+
+    volumes = [{"VolumeId": f"vol-{idx_}", "Size": idx_, "Attachments": []} for idx_ in range(3)]
+    monkeypatch.setattr(c7n.commands, "report", lambda options: json.dump(volumes, options.raw))
+    datafile = tmp_path.joinpath("prod:unattached.json")
+    job = C7nCfg(profile="prod", resource_type="ebs")
+    _write_data(job, datafile, report_minutes=5, lock=False, projection=True)
+    assert json.loads(datafile.read_text()) == [
+        {"VolumeId": f"vol-{idx_}", "Size": idx_} for idx_ in range(3)
+    ]
+    assert list(tmp_path.iterdir()) == [datafile]
+
+    monkeypatch.setattr(c7n.commands, "report", lambda options: None)
+    _write_data(job, datafile, report_minutes=5, lock=False, projection=True)
+    assert json.loads(datafile.read_text()) == []
@@ -0,0 +1,139 @@
+""" Testing c7n_broom.actions.ratelimit """
+# pylint: disable=missing-function-docstring,redefined-outer-name
+import json
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from c7n_broom import sessions
+from c7n_broom.actions import ratelimit
+
+
+class FakeClock:
+    """ Clock only advanced by sleeping """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+def _session():
+    return boto3.Session(
+        aws_access_key_id="testing", aws_secret_access_key="testing", region_name="us-east-1"
+    )
+
+
+def _call_times(session, clock):
+    """ Records the time of each call reaching the stub """
+    times = list()
+    session.events.register(
+        "after-call.*.*", lambda model, **_: times.append((model.name, clock()))
+    )
+    return times
+
+
+def test_010_token_bucket(clock):
+    bucket = ratelimit.TokenBucket(2, burst=2, clock=clock, sleep=clock.sleep)
+    waits = [bucket.acquire() for _ in range(6)]
+    assert waits == [0, 0, 0.5, 0.5, 0.5, 0.5]
+    assert clock.now == 2.0
+    clock.sleep(10)
+    assert bucket.acquire() == 0 and bucket.tokens == 1
+
+
+def test_020_resource_ids():
+    params = {"InstanceIds": ["i-1", "i-2"], "DryRun": False}
+    assert ratelimit.resource_ids(params) == ["i-1", "i-2"]
+    assert ratelimit.resource_ids({"DBSnapshotIdentifier": "snap"}) == ["snap"]
+    assert ratelimit.is_mutating("DeleteSnapshot") and not ratelimit.is_mutating("ListTags")
+    assert not ratelimit.is_mutating("AssumeRole", "sts")
+
+
+def test_030_rate_limited_session(tmp_path, clock, monkeypatch):
+    monkeypatch.setitem(sessions.ACCOUNTS, "prod", "111")
+    outcomes = tmp_path.joinpath(ratelimit.OUTCOMES_FILE)
+    limiter = ratelimit.RateLimiter(5, outcomes=outcomes, clock=clock, sleep=clock.sleep)
+    session = limiter.attach(limiter.attach(_session(), "prod"), "prod")
+    times = _call_times(session, clock)
+    client = session.client("ec2")
+    with Stubber(client) as stubber:
+        for idx_ in range(20):
+            stubber.add_response("describe_snapshots", {"Snapshots": []})
+            if idx_ == 3:
+                stubber.add_client_error("delete_snapshot", "InvalidSnapshot.InUse")
+            else:
+                stubber.add_response("delete_snapshot", {}, {"SnapshotId": f"snap-{idx_}"})
+        for idx_ in range(20):
+            client.describe_snapshots()
+            try:
+                client.delete_snapshot(SnapshotId=f"snap-{idx_}")
+            except ClientError:
+                pass
+
+    deletes = [time_ for name_, time_ in times if name_ == "DeleteSnapshot"]
+    assert len(deletes) == 20
+    # No more than the rate in any second, reads are not limited
+    deletes = [round(time_, 6) for time_ in deletes]
+    assert all(
+        sum(start_ <= time_ < start_ + 1 for time_ in deletes) <= 5 for start_ in deletes
+    )
+    assert deletes[-1] == pytest.approx(19 / 5)
+    assert limiter.counts[("111", "us-east-1")] == {"calls": 20, "errors": 1}
+
+    records = list(map(json.loads, outcomes.read_text().splitlines()))
+    assert [record_["ids"] for record_ in records] == [[f"snap-{idx_}"] for idx_ in range(20)]
+    assert records[3]["status"] == "error" and records[3]["error"] == "InvalidSnapshot.InUse"
+    assert {(record_["account"], record_["operation"]) for record_ in records} == {
+        ("111", "ec2.DeleteSnapshot")
+    }
+    assert ratelimit.summarize(outcomes) == {"ok": 19, "error": 1, "calls": 20}
+
+
+def test_040_install(tmp_path):
+    from c7n.credentials import SessionFactory  # pylint: disable=import-outside-toplevel
+
+    outcomes = tmp_path.joinpath(ratelimit.OUTCOMES_FILE)
+    limiter = ratelimit.install(outcomes=outcomes)
+    try:
+        assert ratelimit.install(outcomes=outcomes) is limiter
+        client = SessionFactory("us-west-2")().client(
+            "ec2", aws_access_key_id="testing", aws_secret_access_key="testing"
+        )
+        with Stubber(client) as stubber:
+            stubber.add_response("terminate_instances", {})
+            client.terminate_instances(InstanceIds=["i-1", "i-2"])
+    finally:
+        ratelimit.uninstall()
+    assert limiter.counts[("", "us-west-2")] == {"calls": 1}
+    assert ratelimit.summarize(outcomes) == {"ok": 2, "calls": 1}
+    assert not ratelimit.summarize(outcomes, offset=outcomes.stat().st_size)
+
+
+def test_050_replaced_limiter(tmp_path, clock):
+    limiters = [
+        ratelimit.RateLimiter(
+            5, outcomes=tmp_path.joinpath(f"{idx_}.jsonl"), clock=clock, sleep=clock.sleep
+        )
+        for idx_ in range(2)
+    ]
+    session = limiters[1].attach(limiters[0].attach(_session(), "prod"), "prod")
+    client = session.client("ec2")
+    with Stubber(client) as stubber:
+        stubber.add_response("delete_snapshot", {}, {"SnapshotId": "snap-1"})
+        client.delete_snapshot(SnapshotId="snap-1")
+    # Only the limiter attached last limits and records the call
+    assert not limiters[0].counts and not tmp_path.joinpath("0.jsonl").exists()
+    assert limiters[1].counts[("prod", "us-east-1")] == {"calls": 1}
+    assert ratelimit.summarize(tmp_path.joinpath("1.jsonl")) == {"ok": 1, "calls": 1}
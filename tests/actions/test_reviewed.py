@@ -0,0 +1,127 @@
+""" Testing c7n_broom.actions.execute_reviewed """
+# pylint: disable=missing-function-docstring,redefined-outer-name
+import json
+
+import pytest
+import yaml
+
+from c7n_broom.actions import execute_reviewed, ratelimit
+from c7n_broom.actions.helper import account_profile_policy_str
+from c7n_broom.config import C7nCfg
+
+
+moto = pytest.importorskip("moto")
+
+REGION = "us-east-1"
+POLICY = {
+    "name": "unattached",
+    "resource": "ebs",
+    "filters": [{"State": "available"}, {"tag:Keep": "absent"}],
+    "actions": ["delete"],
+}
+
+
+@pytest.fixture()
+def ec2(prod_profile):
+    with moto.mock_aws():
+        import boto3  # pylint: disable=import-outside-toplevel
+
+        yield boto3.Session(profile_name=prod_profile, region_name=REGION).client("ec2")
+    ratelimit.uninstall()
+
+
+def _job(tmp_path, policy):
+    policy_file = tmp_path.joinpath(f"{policy['name']}.yml")
+    policy_file.write_text(yaml.safe_dump({"policies": [policy]}))
+    return C7nCfg(
+        profile="prod",
+        account_id="123456789012",
+        configs=(policy_file,),
+        regions={REGION},
+        output_dir=str(tmp_path.joinpath("output")),
+        cache_period=0,
+    )
+
+
+@pytest.fixture()
+def job(tmp_path):
+    return _job(tmp_path, POLICY)
+
+
+def _volumes(ec2):
+    return {volume_["VolumeId"] for volume_ in ec2.describe_volumes()["Volumes"]}
+
+
+def _review(ec2, job, data_dir, volume_ids):
+    """ Query data of job flagging volume_ids, and one which no longer exists """
+    records = [
+        dict(volume_, policy="unattached", region=REGION)
+        for volume_ in ec2.describe_volumes(VolumeIds=volume_ids)["Volumes"]
+    ]
+    records.append(dict(VolumeId="vol-00000000000000000", policy="unattached", region=REGION))
+    _write_review(job, data_dir, records)
+
+
+def _write_review(job, data_dir, records):
+    data_dir.mkdir(exist_ok=True)
+    data_dir.joinpath(account_profile_policy_str(job)).with_suffix(".json").write_text(
+        json.dumps(records, default=str)
+    )
+
+
+@pytest.mark.parametrize("revalidate", [False, True])
+def test_010_execute_reviewed(tmp_path, ec2, job, revalidate):
+    volume_ids = [
+        ec2.create_volume(AvailabilityZone=f"{REGION}a", Size=1)["VolumeId"] for _ in range(3)
+    ]
+    data_dir = tmp_path.joinpath("data")
+    _review(ec2, job, data_dir, volume_ids[:2])
+    # Changed after review
+    ec2.create_tags(Resources=[volume_ids[1]], Tags=[{"Key": "Keep", "Value": "yes"}])
+
+    assert execute_reviewed(job, data_dir=data_dir, revalidate=revalidate)
+    remaining = _volumes(ec2)
+    assert volume_ids[0] not in remaining
+    # Matching resources which were not reviewed are left alone
+    assert volume_ids[2] in remaining
+    assert (volume_ids[1] in remaining) is revalidate
+    deleted = ratelimit.summarize(data_dir.joinpath(ratelimit.OUTCOMES_FILE))
+    assert deleted["ok"] == (1 if revalidate else 2)
+
+
+def test_020_execute_reviewed_no_data(tmp_path, ec2, job):
+    ec2.create_volume(AvailabilityZone=f"{REGION}a", Size=1)
+    assert execute_reviewed(job, data_dir=tmp_path.joinpath("data")) is None
+    assert len(_volumes(ec2)) == 1
+
+
+def test_030_execute_reviewed_instances(tmp_path, ec2):
+    """ c7n drops the whole batch when one instance id does not exist """
+    job = _job(
+        tmp_path,
+        {
+            "name": "running",
+            "resource": "ec2",
+            "filters": [{"State.Name": "running"}],
+            "actions": ["stop"],
+        },
+    )
+    image_id = ec2.describe_images(Owners=["amazon"])["Images"][0]["ImageId"]
+    instance_ids = [
+        instance_["InstanceId"]
+        for instance_ in ec2.run_instances(ImageId=image_id, MinCount=3, MaxCount=3)["Instances"]
+    ]
+    records = [
+        dict(InstanceId=id_, policy="running", region=REGION)
+        for id_ in (instance_ids[0], "i-00000000000000000", instance_ids[1])
+    ]
+    data_dir = tmp_path.joinpath("data")
+    _write_review(job, data_dir, records)
+
+    assert execute_reviewed(job, data_dir=data_dir)
+    states = {
+        instance_["InstanceId"]: instance_["State"]["Name"]
+        for reservation_ in ec2.describe_instances()["Reservations"]
+        for instance_ in reservation_["Instances"]
+    }
+    assert states == dict(zip(instance_ids, ("stopped", "stopped", "running")))
@@ -47,3 +47,38 @@ def test_100_c7nconfigs(configs, name, policies):  # pylint: disable=redefined-o
     _, c7nconfigs = configs
     c7n_configs = list(filter(lambda c7nconfig: c7nconfig.profile == name, c7nconfigs))
     assert len(c7n_configs) == len(policies)
+
+
+def test_030_filter_policies_memoized():
+    merge = c7n_broom.config.create.policies._merge_policies
+    merge.cache_clear()
+    defaults = {"include": ["b", "a", "c"], "exclude": ["c"]}
+    filter_policies = c7n_broom.config.create.policies.filter_policies
+    for _ in range(3):
+        assert list(filter_policies(None, defaults)) == ["a", "b"]
+    assert set(filter_policies({"exclude": ["a"]}, defaults)) == {"b"}
+    # pylint cannot tell the lru_cache wrapper from the function it wraps
+    assert merge.cache_info().misses == 2  # pylint: disable=no-value-for-parameter
+
+
+def test_110_c7nconfigs_shared_settings(tmp_path):
+    tmp_path.joinpath("policy.yml").write_text("policies:\n- name: policy\n  resource: ebs\n")
+    settings = {
+        "global": {
+            "policies": {"include": ["policy"], "path": str(tmp_path)},
+            "c7n": {"days": 2},
+        },
+        "accounts": {"prod": {"c7n": {"account_id": "111"}}, "dev": None},
+    }
+    for _ in range(2):
+        jobs = list(
+            c7n_broom.config.create.c7nconfigs(
+                settings, skip_auth_check=True, lookup_account_id=False
+            )
+        )
+        assert {(job_.profile, job_.account_id) for job_ in jobs} == {
+            ("prod", "111"),
+            ("dev", None),
+        }
+        assert {(job_.resource_type, job_.days) for job_ in jobs} == {("ebs", 2)}
+    assert settings["accounts"] == {"prod": {"c7n": {"account_id": "111"}}, "dev": None}
@@ -0,0 +1,30 @@
+""" Testing c7n_broom.config.main """
+# pylint: disable=missing-function-docstring
+import os
+
+import c7n_broom
+
+
+def test_010_get_config_memoized(tmp_path):
+    config_file = tmp_path.joinpath("config.yaml")
+    config_file.write_text("accounts:\n  prod:\n")
+    config = c7n_broom.config.get_config("config", path=tmp_path)
+    assert c7n_broom.config.get_config("config", path=tmp_path) is config
+
+    config_file.write_text("accounts:\n  prod:\n  dev:\n")
+    os.utime(config_file, ns=(0, 0))
+    assert set(c7n_broom.config.get_config("config", path=tmp_path).get("accounts")) == {
+        "prod",
+        "dev",
+    }
+
+
+def test_020_policy_resources(tmp_path):
+    policy_file = tmp_path.joinpath("policy.yml")
+    assert c7n_broom.config.policy_resources(policy_file) == frozenset()
+    policy_file.write_text("policies:\n- name: a\n  resource: ebs\n- name: b\n  resource: ami\n")
+    assert c7n_broom.config.policy_resources(policy_file) == {"ebs", "ami"}
+
+    policy_file.write_text("policies:\n- name: a\n  resource: ebs\n")
+    os.utime(policy_file, ns=(0, 0))
+    assert c7n_broom.config.policy_resources(str(policy_file)) == {"ebs"}
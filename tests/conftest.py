@@ -1,7 +1,24 @@
 """ config pytest """
+import pytest
+
 import c7n_broom
 
 
 def pytest_report_header():
     """Additional report header"""
     return f"version: {c7n_broom.__version__}"
+
+
+@pytest.fixture()
+def prod_profile(tmp_path, monkeypatch):
+    """ Credentials of a prod profile, with c7n's sessions cached only while in use """
+    from c7n.utils import reset_session_cache  # pylint: disable=import-outside-toplevel
+
+    tmp_path.joinpath("credentials").write_text(
+        "[prod]\naws_access_key_id = testing\naws_secret_access_key = testing\n"
+    )
+    monkeypatch.setenv("AWS_SHARED_CREDENTIALS_FILE", str(tmp_path.joinpath("credentials")))
+    monkeypatch.setenv("AWS_CONFIG_FILE", str(tmp_path.joinpath("config")))
+    reset_session_cache()
+    yield "prod"
+    reset_session_cache()
@@ -0,0 +1,41 @@
+""" Testing c7n_broom.cli """
+# pylint: disable=missing-function-docstring
+from collections import Counter
+
+import pytest
+
+from c7n_broom import cli
+
+
+def test_010_parser():
+    args = cli.get_parser().parse_args(
+        ["--workers", "4", "--account", "prod", "--account", "dev", "query", "--resume"]
+    )
+    assert args.workers == 4
+    assert args.account == ["prod", "dev"]
+    assert args.resume is True
+    assert args.func is cli._query  # pylint: disable=protected-access
+    args = cli.get_parser().parse_args(["query", "--progress", "--metrics-port", "9464"])
+    assert args.progress and args.metrics_port == 9464
+
+
+def test_020_execute_requires_yes(capsys):
+    assert cli.main(["execute"]) == 2
+    assert "--yes" in capsys.readouterr().err
+
+
+def test_030_command_required():
+    with pytest.raises(SystemExit):
+        cli.get_parser().parse_args([])
+
+
+def test_040_execute_reviewed_outcomes(tmp_path, capsys, monkeypatch):
+    from c7n_broom.main import Sweeper  # pylint: disable=import-outside-toplevel
+
+    tmp_path.joinpath("config.yaml").write_text("broom:\n  auth_check: false\n")
+    monkeypatch.chdir(tmp_path)
+    outcomes = Counter(ok=3, error=1, calls=4)
+    monkeypatch.setattr(Sweeper, "execute_reviewed", lambda *_, **__: outcomes)
+    assert cli.main(["execute", "--yes", "--reviewed"]) == 0
+    out = capsys.readouterr().out
+    assert "acted on 3 resources, 1 failed" in out and "run" not in out
@@ -0,0 +1,91 @@
+""" Testing c7n_broom.dashboard """
+# pylint: disable=missing-function-docstring,protected-access
+import json
+import re
+from types import SimpleNamespace
+
+from c7n_broom import dashboard
+from c7n_broom.actions.report import datafile_path
+
+
+def _job(profile, policy, resource_type="ebs"):
+    return SimpleNamespace(
+        profile=profile, account_id=None, configs=(f"{policy}.yml",), resource_type=resource_type
+    )
+
+
+def _write_volumes(job, data_path, count, region="us-east-1"):
+    volumes = [
+        {
+            "VolumeId": f"vol-{job.profile}-{idx_}",
+            "VolumeType": "gp2",
+            "Size": 10,
+            "CreateTime": f"2020-01-{idx_ + 1:02}",
+            "region": region,
+            "Tags": [{"Key": "Owner", "Value": "<script>"}],
+        }
+        for idx_ in range(count)
+    ]
+    datafile_path(job, data_path).write_text(json.dumps(volumes))
+
+
+def test_010_build(tmp_path):
+    data_path = tmp_path.joinpath("data")
+    data_path.mkdir()
+    public = tmp_path.joinpath("public")
+    prod, dev = _job("prod", "unattached"), _job("dev", "unattached")
+    gone = _job("old", "x", resource_type="ami")
+    _write_volumes(prod, data_path, 5)
+    _write_volumes(dev, data_path, 1, region="eu-west-1")
+    _write_volumes(gone, data_path, 1)
+
+    written = dashboard.build([prod, dev, gone], data_path, public, page_size=2)
+    prod_dir, dev_dir = dashboard._slug("prod:unattached"), dashboard._slug("dev:unattached")
+    assert len(written) == 3 + 1 + 1 + 2 + 1
+    index = public.joinpath("index.html").read_text()
+    assert '<a href="ebs/index.html">ebs</a>' in index
+    # Jobs, accounts, resources and size per resource type
+    cells = re.findall(r"<td[^>]*>\s*(\d+)</td>", index)
+    assert cells == ["1", "1", "1", "0", "2", "2", "6", "60"]
+    type_page = public.joinpath("ebs", "index.html").read_text()
+    assert f'<a href="{prod_dir}/1.html">unattached</a>' in type_page
+    assert "eu-west-1: 1" in type_page
+    pages = sorted(path_.name for path_ in public.joinpath("ebs", prod_dir).iterdir())
+    assert pages == ["1.html", "2.html", "3.html"]
+    page = public.joinpath("ebs", prod_dir, "2.html").read_text()
+    assert "vol-prod-2" in page and "vol-prod-4" not in page and "<script>" not in page
+    manifest = json.loads(public.joinpath(dashboard.MANIFEST_FILE).read_text())
+    assert manifest["prod:unattached"]["count"] == 5
+    assert manifest["prod:unattached"]["size"] == 50
+    assert str(tmp_path) not in json.dumps(manifest)
+
+    # Unchanged jobs are not written again, removed jobs and resource types are dropped
+    written = dashboard.build([prod, dev], data_path, public, page_size=2)
+    assert sorted(path_.name for path_ in written) == ["index.html", "index.html"]
+    assert not public.joinpath("ami").exists()
+    assert "ami/index.html" not in public.joinpath("index.html").read_text()
+
+    _write_volumes(dev, data_path, 3, region="eu-west-1")
+    written = dashboard.build([prod, dev], data_path, public, page_size=2)
+    assert {path_.parent.name for path_ in written} == {dev_dir, "ebs", "public"}
+    assert "eu-west-1: 3" in public.joinpath("ebs", "index.html").read_text()
+    assert len(dashboard.build([prod, dev], data_path, public, page_size=2, full=True)) == 7
+
+
+def test_020_distinct_job_pages(tmp_path):
+    data_path = tmp_path.joinpath("data")
+    data_path.mkdir()
+    public = tmp_path.joinpath("public")
+    first, second = _job("a", "b_c"), _job("a_b", "c")
+    _write_volumes(first, data_path, 1)
+    _write_volumes(second, data_path, 2)
+
+    dashboard.build([first, second], data_path, public)
+    first_page = public.joinpath("ebs", dashboard._slug("a:b_c"), "1.html").read_text()
+    second_page = public.joinpath("ebs", dashboard._slug("a_b:c"), "1.html").read_text()
+    assert "vol-a-0" in first_page and "vol-a_b-1" in second_page
+
+    # Removing one job leaves the pages of the other
+    dashboard.build([second], data_path, public)
+    assert public.joinpath("ebs", dashboard._slug("a_b:c"), "1.html").is_file()
+    assert not public.joinpath("ebs", dashboard._slug("a:b_c")).exists()
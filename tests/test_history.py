@@ -0,0 +1,58 @@
+""" Testing c7n_broom.history """
+# pylint: disable=missing-function-docstring,redefined-outer-name
+from datetime import timedelta
+
+import pytest
+
+from c7n_broom.history import History
+
+
+def _rows(*ids, region="us-east-1"):
+    return [
+        {"id": id_, "region": region, "date": "2020-01-01", "tags": {"Owner": "me"}}
+        for id_ in ids
+    ]
+
+
+@pytest.fixture()
+def history(tmp_path):
+    with History(tmp_path.joinpath("history.sqlite")) as history_:
+        history_.ingest("run1", "prod", "ebs", "unattached", _rows("vol-1", "vol-2"))
+        history_.ingest("run1", "dev", "ebs", "unattached", _rows("vol-3"))
+        history_.ingest("run2", "prod", "ebs", "unattached", _rows("vol-2", "vol-4", "vol-5"))
+        yield history_
+
+
+def test_010_runs(history):
+    assert history.runs() == ["run1", "run2"]
+
+
+def test_020_ingest_replaces(history):
+    history.ingest("run2", "prod", "ebs", "unattached", _rows("vol-2"))
+    assert history.trend(account="prod") == [
+        {"run_id": "run1", "count": 2},
+        {"run_id": "run2", "count": 1},
+    ]
+
+
+def test_030_counts(history):
+    assert history.counts(by=("account",), run_id="run1") == [
+        {"account": "dev", "count": 1},
+        {"account": "prod", "count": 2},
+    ]
+    with pytest.raises(ValueError):
+        history.counts(by=("tags",))
+
+
+def test_040_diff(history):
+    assert history.diff("run1", "run2", account="prod") == {
+        "added": ["vol-4", "vol-5"],
+        "removed": ["vol-1"],
+    }
+
+
+def test_050_compact(history):
+    assert history.compact(keep_runs=1) == ["run1"]
+    assert history.runs() == ["run2"]
+    assert history.trend() == [{"run_id": "run2", "count": 3}]
+    assert history.compact(max_age=timedelta(0)) == ["run2"]
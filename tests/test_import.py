@@ -0,0 +1,51 @@
+""" Import time budget for c7n_broom """
+# pylint: disable=missing-function-docstring
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+# Seconds for "import c7n_broom", measured in a fresh interpreter
+IMPORT_BUDGET = 0.1
+HEAVY_MODULES = ("c7n", "botocore", "boto3", "boto_remora", "pkg_resources")
+
+_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _measure(statement):
+    output = subprocess.run(
+        [sys.executable, "-c", _SCRIPT.format(statement=statement)],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    return json.loads(output)
+
+
+def test_010_import_budget():
+    elapsed = min(_measure("import c7n_broom")["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET
+
+
+@pytest.mark.parametrize(
+    "statement",
+    [
+        pytest.param("import c7n_broom", id="package"),
+        pytest.param("import c7n_broom; c7n_broom.__version__", id="version"),
+        pytest.param("from c7n_broom import cli; cli.get_parser()", id="cli"),
+        pytest.param(
+            "from c7n_broom import Sweeper, data; from c7n_broom.actions import report",
+            id="report",
+        ),
+    ],
+)
+def test_020_no_heavy_imports(statement):
+    modules = set(_measure(statement)["modules"])
+    assert not modules.intersection(HEAVY_MODULES)
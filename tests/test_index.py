@@ -0,0 +1,76 @@
+""" Testing c7n_broom.index """
+# pylint: disable=missing-function-docstring
+import json
+import os
+from types import SimpleNamespace
+
+from c7n_broom import cli
+from c7n_broom.index import INDEX_FILE, ResourceIndex
+
+
+JOBS = [
+    SimpleNamespace(
+        profile=profile_,
+        account_id=account_,
+        configs=("old-snapshots.yml",),
+        resource_type="ebs-snapshot",
+        get_str=f"{profile_}:old-snapshots",
+    )
+    for profile_, account_ in (("prod", "111"), ("dev", "222"))
+]
+
+
+def _write(data_dir, profile, *ids):
+    data_dir.joinpath(f"{profile}:old-snapshots.json").write_text(
+        json.dumps([{"SnapshotId": id_, "region": "us-east-1"} for id_ in ids], indent=2)
+    )
+
+
+def _offline(jobs):
+    return [SimpleNamespace(**dict(vars(job_), account_id=None)) for job_ in jobs]
+
+
+def test_010_update_lookup(tmp_path):
+    _write(tmp_path, "prod", "snap-1", "snap-2", None)
+    _write(tmp_path, "dev", "snap-3")
+    with ResourceIndex(tmp_path.joinpath(INDEX_FILE)) as index:
+        assert index.update(JOBS, tmp_path) == (2, 0)
+        assert index.update(JOBS, tmp_path) == (0, 0)
+        entries = index.lookup("snap-2")
+        assert [
+            (entry_["profile"], entry_["account"], entry_["policy"]) for entry_ in entries
+        ] == [("prod", "111", "old-snapshots")]
+        # Records without an id are not indexed
+        assert not index.lookup("None")
+        assert index.read(entries[0]) == {"SnapshotId": "snap-2", "region": "us-east-1"}
+
+        _write(tmp_path, "prod", "snap-1")
+        os.utime(tmp_path.joinpath("prod:old-snapshots.json"), ns=(1, 1))
+        assert index.update(JOBS, tmp_path) == (1, 0)
+        assert not index.lookup("snap-2")
+
+        # Offline sweepers index by the same profile without an account id
+        _write(tmp_path, "dev", "snap-3", "snap-4")
+        assert index.update(_offline(JOBS), tmp_path) == (1, 0)
+        assert [(entry_["profile"], entry_["account"]) for entry_ in index.lookup("snap-4")] == [
+            ("dev", "")
+        ]
+
+        tmp_path.joinpath("dev:old-snapshots.json").unlink()
+        assert index.update(JOBS, tmp_path) == (0, 1)
+        assert not index.lookup("snap-3")
+
+
+def test_020_cli_lookup(tmp_path, capsys, monkeypatch):
+    data_dir = tmp_path.joinpath("query")
+    data_dir.mkdir()
+    _write(data_dir, "prod", "snap-1")
+    with ResourceIndex(data_dir.joinpath(INDEX_FILE)) as index:
+        index.update(JOBS, data_dir)
+    tmp_path.joinpath("config.yaml").write_text(f"broom:\n  data_dir: {data_dir}\n")
+    monkeypatch.chdir(tmp_path)
+    # The data directory of the config file
+    assert cli.main(["lookup", "--json", "snap-1"]) == 0
+    assert json.loads(capsys.readouterr().out)["account"] == "111"
+    assert cli.main(["--data-dir", str(tmp_path), "lookup", "snap-1"]) == 1
+    assert cli.main(["--data-dir", str(data_dir), "lookup", "snap-0"]) == 1
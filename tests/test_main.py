@@ -0,0 +1,84 @@
+""" Testing c7n_broom.main """
+# pylint: disable=missing-function-docstring,protected-access,redefined-outer-name
+from functools import partial
+
+import pytest
+
+import c7n_broom
+from c7n_broom import Sweeper, storage
+from c7n_broom.actions.report import datafile_path
+
+
+SETTINGS = {
+    "global": {"policies": {"include": ["old-snapshots", "unattached"]}},
+    "accounts": {"prod": {"c7n": {"account_id": "111"}}, "dev": {"c7n": {"account_id": "222"}}},
+    "broom": {"auth_check": False, "index": False, "data_dir": "config-data"},
+}
+
+
+@pytest.fixture()
+def sweeper():
+    return Sweeper(settings=SETTINGS)
+
+
+def test_010_settings(sweeper):  # pylint: disable=redefined-outer-name
+    assert sweeper.auth_check is False
+    assert sweeper.index is False
+    assert sweeper.data_dir == "config-data"
+    assert Sweeper(settings=SETTINGS, data_dir="arg-data").data_dir == "arg-data"
+
+
+def test_020_select_accounts(sweeper):  # pylint: disable=redefined-outer-name
+    assert len(sweeper.jobs) == 4
+    sweeper.select(accounts=["prod", "222"])
+    assert len(sweeper.jobs) == 4
+    sweeper.select(accounts=["prod"])
+    assert {job_.profile for job_ in sweeper.jobs} == {"prod"}
+
+
+def test_030_select_policies_regions(sweeper):  # pylint: disable=redefined-outer-name
+    sweeper.select(policies=["unattached"], regions=["us-west-2"])
+    assert {job_.get_str for job_ in sweeper.jobs} == {"prod:unattached", "dev:unattached"}
+    assert all(job_.regions == {"us-west-2"} for job_ in sweeper.jobs)
+    sweeper.select(regions=["eu-west-1"])
+    assert not sweeper.jobs
+
+
+def _write_data(job, data_dir, only=None, **_):
+    if only is None or only in job.get_str:
+        datafile_path(job, data_dir).write_text("[]")
+
+
+def test_040_promote_complete_runs(tmp_path):
+    sweeper = Sweeper(settings=SETTINGS, data_dir=tmp_path, versioned=True)
+    sweeper.select(accounts=["prod"])
+    # A failed job wrote no data
+    sweeper._sweep(_write_data, telemetry=False, only="unattached")
+    assert storage.latest_run_dir(tmp_path) is None
+
+    sweeper._sweep(_write_data, telemetry=False, resume=True)
+    assert storage.latest_run_dir(tmp_path).name == sweeper.last_run_id
+
+
+def test_050_incomplete_query(tmp_path, monkeypatch):
+    history_file = tmp_path.joinpath("history.sqlite")
+    sweeper = Sweeper(
+        settings=SETTINGS,
+        data_dir=tmp_path,
+        versioned=True,
+        keep_runs=1,
+        history_file=history_file,
+    )
+    sweeper.select(accounts=["prod"])
+    for job_ in sweeper.jobs:
+        job_.resource_type = "ebs"
+    monkeypatch.setattr(c7n_broom.actions, "query", partial(_write_data, only="unattached"))
+    assert not sweeper.query()
+    assert not history_file.exists()
+
+    monkeypatch.setattr(c7n_broom.actions, "query", _write_data)
+    assert sweeper.query()
+    # The incomplete run is pruned
+    assert storage.list_runs(tmp_path) == [sweeper.last_run_id]
+    with c7n_broom.history.History(history_file) as history:
+        assert history.runs() == [sweeper.last_run_id]
@@ -0,0 +1,131 @@
+""" Testing c7n_broom.metrics """
+# pylint: disable=missing-function-docstring
+import io
+import sys
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from botocore.stub import Stubber
+
+from c7n_broom import metrics
+
+
+class FakeClock:
+    """ Clock only advanced by tests """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def _job(profile, account_id=None):
+    return SimpleNamespace(profile=profile, account_id=account_id, configs=("unattached.yml",))
+
+
+def _sleep_or_fail(job):
+    if job.profile == "bad":
+        raise RuntimeError("failed")
+    if job.profile == "exits":
+        # As c7n does when a policy fails
+        sys.exit(2)
+    time.sleep(0.01)
+
+
+def _stubbed_calls(job):
+    from c7n.credentials import SessionFactory  # pylint: disable=import-outside-toplevel
+
+    client = SessionFactory("us-east-1", profile=job.profile)().client("ec2")
+    with Stubber(client) as stubber:
+        stubber.add_response("describe_volumes", {"Volumes": []})
+        stubber.add_client_error("delete_volume", "VolumeInUse")
+        client.describe_volumes()
+        with pytest.raises(Exception):
+            client.delete_volume(VolumeId="vol-1")
+
+
+def _wait_for(registry, finished):
+    for _ in range(100):
+        states = registry.states()
+        if states["done"] + states["failed"] >= finished:
+            return
+        time.sleep(0.05)
+
+
+def test_010_registry():
+    clock = FakeClock()
+    registry = metrics.Registry(clock=clock)
+    registry.queue(["a", "b", "c"])
+    registry.handle(("start", "111", "111:prod:a", None))
+    registry.handle(("start", "111", "111:prod:b", None))
+    clock.advance(60.0)
+    registry.handle(("done", "111", "111:prod:a", 2.5))
+    registry.handle(("api", "", "", {("111", "ec2", ""): 9, ("111", "ec2", "Throttling"): 1}))
+    assert registry.states() == {"queued": 1, "running": 1, "done": 1, "failed": 0}
+    assert registry.longest_running() == ("111:prod:b", 60.0)
+    assert registry.progress() == (
+        "1/3 jobs (0 failed, 1 running, 1 queued) | 1.0 jobs/min | 10 API calls, 1 errors"
+        " | longest 111:prod:b 60s"
+    )
+
+    registry.handle(("failed", 'a"b', "111:prod:b", 3600.5))
+    text = registry.to_prometheus()
+    assert 'c7n_broom_jobs{state="failed"} 1\n' in text
+    assert 'c7n_broom_job_duration_seconds_bucket{account="111",le="1"} 0\n' in text
+    assert 'c7n_broom_job_duration_seconds_bucket{account="111",le="5"} 1\n' in text
+    assert 'c7n_broom_job_duration_seconds_bucket{account="111",le="+Inf"} 1\n' in text
+    assert 'c7n_broom_job_duration_seconds_bucket{account="a\\"b",le="3600"} 0\n' in text
+    assert 'c7n_broom_job_duration_seconds_count{account="a\\"b"} 1\n' in text
+    assert 'c7n_broom_api_calls_total{account="111",service="ec2"} 10\n' in text
+    assert (
+        'c7n_broom_api_errors_total{account="111",service="ec2",code="Throttling"} 1\n' in text
+    )
+    assert registry.hot_accounts(1) == [('a"b', 3600.5)]
+
+
+def test_020_serve():
+    registry = metrics.Registry()
+    registry.queue(["a"])
+    server = metrics.serve(registry, port=0)
+    try:
+        url = "http://{}:{}/metrics".format(*server.server_address[:2])
+        with urllib.request.urlopen(url) as response:
+            assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+            assert 'c7n_broom_jobs{state="queued"} 1' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_030_live_processes():
+    jobs = [_job("prod", "111"), _job("bad"), _job("dev", "222"), _job("exits")]
+    stream = io.StringIO()
+    with metrics.live(progress=True, stream=stream) as (registry, queue):
+        registry.queue(jobs)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            results = [
+                executor.submit(metrics.Tracked(_sleep_or_fail, queue), job_) for job_ in jobs
+            ]
+        assert isinstance(results[1].exception(), RuntimeError)
+        assert isinstance(results[3].exception(), SystemExit)
+        _wait_for(registry, len(jobs))
+    assert registry.states() == {"queued": 0, "running": 0, "done": 2, "failed": 2}
+    assert set(registry.latency) == {"111", "bad", "222", "exits"}
+    assert stream.getvalue().startswith("4/4 jobs (2 failed, 0 running, 0 queued)")
+
+
+def test_040_api_calls(prod_profile):
+    with metrics.live() as (registry, queue):
+        metrics.Tracked(_stubbed_calls, queue)(_job(prod_profile, "111"))
+        _wait_for(registry, 1)
+    assert registry.api_calls == {("111", "ec2"): 2}
+    assert registry.api_errors == {("111", "ec2", "VolumeInUse"): 1}
+    # Sessions are no longer counted outside of live
+    _stubbed_calls(_job(prod_profile, "111"))
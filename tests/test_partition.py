@@ -0,0 +1,68 @@
+""" Testing c7n_broom.partition """
+# pylint: disable=missing-function-docstring,protected-access
+import sys
+from types import SimpleNamespace
+
+from c7n_broom import main, partition
+
+
+def _job(name, account="111", resource_type="ebs", regions=("us-east-1",)):
+    return SimpleNamespace(
+        get_str=name, account_id=account, resource_type=resource_type, regions=set(regions)
+    )
+
+
+def test_010_partition_balanced():
+    costs = {"a": 4, "b": 2, "c": 4, "d": 2, "e": 2, "f": 2}
+    jobs = [_job(name_) for name_ in costs]
+    shards = partition.partition(jobs, 2, cost=lambda job_: costs[job_.get_str])
+    assert sorted(job_.get_str for shard_ in shards for job_ in shard_) == sorted(costs)
+    assert partition.makespan(shards, lambda job_: costs[job_.get_str]) == 8
+
+
+def test_020_partition_more_workers_than_jobs():
+    jobs = [_job("a"), _job("b")]
+    assert len(partition.partition(jobs, 8, cost=lambda _: 1)) == 2
+    assert partition.partition([], 8, cost=lambda _: 1) == []
+
+
+def test_030_heuristic_cost():
+    snapshots = _job("a", resource_type="ebs-snapshot", regions=("us-east-1", "us-west-2"))
+    expected = 2 * partition.RESOURCE_TYPE_COSTS["ebs-snapshot"]
+    assert partition.heuristic_cost(snapshots) == expected
+    assert partition.heuristic_cost(_job("b", resource_type="unknown", regions=())) == (
+        partition.DEFAULT_COST
+    )
+
+
+def test_040_job_stats(tmp_path):
+    stats = partition.JobStats(tmp_path.joinpath(partition.STATS_FILE))
+    job = _job("prod:unattached")
+    assert stats.estimate(job) == partition.heuristic_cost(job)
+    stats.record([("prod:unattached", 10.0, True)])
+    stats.record([("prod:unattached", 20.0, True), ("prod:unattached", 0.1, False)])
+    stats.save()
+    assert partition.JobStats(stats.path).estimate(job) == 15.0
+
+
+def test_050_timed():
+    def fail(_):
+        raise RuntimeError("failed")
+
+    job_str, duration, succeeded = partition.timed(fail, _job("a"))
+    assert job_str == "a"
+    assert duration >= 0 and not succeeded
+    assert partition.timed(lambda _: None, _job("b"))[2]
+
+
+def _exit_like_c7n(job):
+    if job.get_str == "bad":
+        sys.exit(2)
+
+
+def test_060_sharded_run_policy_exits():
+    durations = main._sharded_run(_exit_like_c7n, [[_job("good")], [_job("bad", account="222")]])
+    assert sorted((job_str, succeeded) for job_str, _, succeeded in durations) == [
+        ("bad", False),
+        ("good", True),
+    ]
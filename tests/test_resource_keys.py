@@ -0,0 +1,104 @@
+""" Testing c7n_broom.resource_keys """
+# pylint: disable=missing-function-docstring
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import yaml
+
+from c7n_broom import resource_keys
+from c7n_broom.actions import report
+from c7n_broom.actions.report import _get_resourcekey
+from c7n_broom.resource_keys import ResourceKey, ResourceKeyRegistry
+
+
+def test_010_defaults():
+    registry = resource_keys.registry()
+    for resource_type_ in ("ebs-snapshot", "ebs_snapshot", "aws.ebs-snapshot"):
+        assert registry[resource_type_] == ResourceKey(
+            id="SnapshotId", name="VolumeId", size="VolumeSize", date="StartTime"
+        )
+    assert "launch-config" in registry
+    assert registry["security-group"].data["vpc"] == "VpcId"
+    compiled = registry.compiled("ebs")
+    assert compiled is registry.compiled("ebs")
+    assert compiled.id.search({"VolumeId": "vol-1"}) == "vol-1"
+    assert compiled.fields == frozenset(
+        ("VolumeId", "VolumeType", "Size", "CreateTime", "Tags", "region", "policy")
+    )
+    rows = sorted(
+        map(compiled.to_row, ({"CreateTime": "2020-01-02"}, {}, {"CreateTime": "2020-01-01"})),
+        key=compiled.sort_key,
+    )
+    assert [row_.date for row_ in rows] == ["2020-01-01", "2020-01-02", None]
+
+
+def test_020_load_file(tmp_path):
+    registry = ResourceKeyRegistry(c7n_fallback=False)
+    path = tmp_path.joinpath("keys.yml")
+    path.write_text(
+        yaml.safe_dump(
+            {
+                "ebs": {"id": "VolumeId", "size": "Size"},
+                "dynamodb-table": {"id": "TableName", "extras": {"items": "ItemCount"}},
+            }
+        )
+    )
+    registry.load_file(path)
+    assert registry["ebs"].data == dict(id="VolumeId", size="Size", region="region", tags="Tags")
+    assert registry.compiled("aws.dynamodb-table").to_row(
+        {"TableName": "users", "ItemCount": 3}
+    ).as_dict() == {"id": "users", "region": None, "tags": (), "items": 3}
+    json_path = tmp_path.joinpath("keys.json")
+    json_path.write_text(json.dumps({"ebs": {"id": "VolumeArn"}}))
+    registry.load_file(json_path)
+    assert registry["ebs"].id == "VolumeArn"
+    assert list(registry) == ["dynamodb-table", "ebs"]
+    assert registry.get("unknown") is None
+
+
+@pytest.mark.parametrize(
+    "definition,message",
+    [
+        pytest.param({"name": "Name"}, "id is required", id="no-id"),
+        pytest.param({"id": "Id", "colour": "Red"}, "unknown fields colour", id="unknown"),
+        pytest.param({"id": "Id", "date": "Created["}, "date", id="expression"),
+        pytest.param(["Id"], "expected a mapping", id="not-mapping"),
+        pytest.param(
+            {"id": "Id", "extras": {"Tags.Owner": "Tags"}},
+            "Tags.Owner is not a valid field name",
+            id="field-name",
+        ),
+    ],
+)
+def test_030_invalid(definition, message):
+    registry = ResourceKeyRegistry(c7n_fallback=False)
+    with pytest.raises(ValueError, match=f"Invalid resource key ebs .*{message}"):
+        registry.load_data({"ebs": definition})
+    assert "ebs" not in registry
+
+
+def test_040_c7n_fallback():
+    registry = ResourceKeyRegistry()
+    assert registry["aws.dynamodb-table"] == ResourceKey(id="TableName", date="CreationDateTime")
+    assert "dynamodb-table" in list(registry)
+    assert registry.get("not-a-resource") is None
+    assert _get_resourcekey("iam_role").id == "RoleName"
+    with pytest.raises(RuntimeError):
+        _get_resourcekey("not-a-resource")
+    assert resource_keys.from_c7n("rds").name == "Endpoint.Address"
+
+
+def test_050_resource_keys_enum():
+    registry = resource_keys.registry()
+    assert report.ResourceKeys.ebs_snapshot.value == registry["ebs-snapshot"]
+    assert report.ResourceKeys.test.value.id == "key"
+    assert ("ami", registry["ami"]) in report.ResourceKeys.key_values()
+
+
+def test_060_registry_threads(monkeypatch):
+    monkeypatch.setattr(resource_keys, "_REGISTRY", None)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        registries = list(executor.map(lambda _: resource_keys.registry(), range(32)))
+    assert all(registry_ is registries[0] for registry_ in registries)
+    assert "ebs" in registries[0]
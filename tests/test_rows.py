@@ -0,0 +1,65 @@
+""" Testing c7n_broom.rows """
+# pylint: disable=missing-function-docstring
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from c7n_broom import rows
+from c7n_broom.actions.report import datafile_path, get_data_map
+from c7n_broom.data import count
+from c7n_broom.resource_keys import registry
+
+
+def _volume(id_, date, region="us-east-1", tags=None):
+    return {
+        "VolumeId": id_,
+        "VolumeType": "gp2",
+        "Size": 1,
+        "CreateTime": date,
+        "region": region,
+        "Tags": tags or list(),
+        "Attachments": list(),
+    }
+
+
+def test_010_tags():
+    data = [{"Key": "Owner", "Value": "me"}, {"Key": "Team", "Value": "ops"}]
+    tags = rows.Tags.from_data(data)
+    assert dict(tags) == {"Owner": "me", "Team": "ops"}
+    assert tags["Owner"] == "me" and tags.get("Missing") is None
+    assert str(tags) == str({"Owner": "me", "Team": "ops"})
+    # Shared between resources with the same tags
+    assert rows.Tags.from_data(list(data)) is tags
+    assert rows.Tags.from_data({"Owner": "me", "Team": "ops"}) is tags
+    assert rows.Tags.from_data(None) is rows.EMPTY_TAGS
+    with pytest.raises(KeyError):
+        _ = tags["Missing"]
+
+
+def test_020_row_factory():
+    to_row = rows.row_factory(registry()["ebs"])
+    row = to_row(_volume("vol-1", "2020-01-01", tags=[{"Key": "Owner", "Value": "me"}]))
+    assert not hasattr(row, "__dict__")
+    assert row.keys() == ("id", "type", "size", "region", "date", "tags")
+    assert row["id"] == row.id == row[0] == "vol-1"
+    assert row.get("name") is None
+    assert row.as_dict()["tags"] == rows.Tags.from_data({"Owner": "me"})
+    assert to_row(_volume("vol-2", "2020-01-01")).region is row.region
+
+
+def test_030_get_data_map(tmp_path):
+    job = SimpleNamespace(profile="prod", configs=("unattached.yml",), resource_type="ebs")
+    datafile_path(job, tmp_path).write_text(
+        json.dumps(
+            [
+                _volume("vol-2", "2020-01-02", region="eu-west-1"),
+                _volume("vol-1", "2020-01-01"),
+                _volume("vol-3", "2020-01-03"),
+            ]
+        )
+    )
+    data = get_data_map(job, data_path=tmp_path)
+    assert [row_.id for row_ in data] == ["vol-1", "vol-2", "vol-3"]
+    assert count(data) == {"eu-west-1": {"gp2": 1}, "us-east-1": {"gp2": 2}}
+    assert count([row_.as_dict() for row_ in data]) == count(data)
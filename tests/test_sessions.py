@@ -0,0 +1,24 @@
+""" Testing c7n_broom.sessions """
+# pylint: disable=missing-function-docstring
+import boto3
+
+from c7n_broom import sessions
+
+
+def test_010_hooks(monkeypatch):
+    from c7n.credentials import SessionFactory  # pylint: disable=import-outside-toplevel
+
+    monkeypatch.setitem(sessions.ACCOUNTS, "prod", "111")
+    attached = list()
+    sessions.register("first", lambda session, profile: attached.append(("first", profile)))
+    sessions.register("second", lambda session, profile: attached.append(("second", profile)))
+    try:
+        update = SessionFactory.update
+        sessions.register("second", lambda session, profile: attached.append(("again", profile)))
+        assert SessionFactory.update is update
+        SessionFactory("us-east-1", profile="prod").update(boto3.Session())
+    finally:
+        sessions.unregister("first")
+        sessions.unregister("second")
+    assert attached == [("first", "prod"), ("again", "prod")]
+    assert sessions.account("prod")() == "111" and sessions.account("dev")() == "dev"
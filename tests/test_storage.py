@@ -0,0 +1,74 @@
+""" Testing c7n_broom.storage """
+# pylint: disable=missing-function-docstring
+import json
+
+import pytest
+
+from c7n_broom import storage
+
+
+def test_010_atomic_open(tmp_path):
+    datafile = tmp_path.joinpath("data.json")
+    datafile.write_text("old")
+    with storage.atomic_open(datafile) as file_:
+        file_.write("new")
+        assert datafile.read_text() == "old"
+    assert datafile.read_text() == "new"
+    assert [path_.name for path_ in tmp_path.iterdir()] == ["data.json"]
+
+
+def test_020_atomic_open_error(tmp_path):
+    datafile = tmp_path.joinpath("data.json")
+    datafile.write_text("old")
+    with pytest.raises(RuntimeError):
+        with storage.atomic_open(datafile) as file_:
+            file_.write("partial")
+            raise RuntimeError("failed")
+    assert datafile.read_text() == "old"
+    assert [path_.name for path_ in tmp_path.iterdir()] == ["data.json"]
+
+
+def test_030_file_lock(tmp_path):
+    datafile = tmp_path.joinpath("data.json")
+    with storage.file_lock(datafile):
+        storage.atomic_write_text(datafile, "[]")
+    assert datafile.read_text() == "[]"
+
+
+def test_040_promote_run(tmp_path):
+    assert storage.resolve_data_dir(tmp_path) == tmp_path
+    for run_id in ("20200101T000000000000Z", "20200102T000000000000Z"):
+        storage.run_dir(tmp_path, run_id).mkdir(parents=True)
+        storage.promote_run(tmp_path, run_id)
+        assert storage.resolve_data_dir(tmp_path) == storage.run_dir(tmp_path, run_id).resolve()
+    assert storage.list_runs(tmp_path) == ["20200101T000000000000Z", "20200102T000000000000Z"]
+    with pytest.raises(FileNotFoundError):
+        storage.promote_run(tmp_path, "missing")
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_050_iter_records(tmp_path, chunk_size):
+    datafile = tmp_path.joinpath("data.json")
+    tags = [{"Key": "k", "Value": "]"}]
+    data = [{"id": idx_, "name": "x" * idx_, "tags": tags} for idx_ in range(5)]
+    datafile.write_text(json.dumps(data, indent=2))
+    records = list(storage.iter_records(datafile, chunk_size=chunk_size))
+    assert [item_ for _, item_ in records] == data
+    assert [storage.read_record(datafile, offset_) for offset_, _ in records] == data
+
+
+def test_060_iter_records_empty(tmp_path):
+    datafile = tmp_path.joinpath("data.json")
+    for content in ("", "[]", " [\n]\n"):
+        datafile.write_text(content)
+        assert not list(storage.iter_records(datafile))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 20])
+def test_070_iter_records_unicode_and_scalars(tmp_path, chunk_size):
+    datafile = tmp_path.joinpath("data.json")
+    data = [{"Owner": "Zoë"}, 123456, "日本", 1.5e10, {"Owner": "Éric"}, 42]
+    datafile.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    records = list(storage.iter_records(datafile, chunk_size=chunk_size))
+    assert [item_ for _, item_ in records] == data
+    assert [storage.read_record(datafile, offset_) for offset_, _ in records] == data